@@ -2,6 +2,9 @@
 
 # Script to safely process all .tdr files with tdx -dd command
 # Usage: ./process_tdr_files_safe.sh
+#
+# Without tdx (and much faster, all files in parallel):
+#   python ../../tdr_export.py --rename .
 
 echo "Starting to process .tdr files safely..."
 
@@ -1,84 +1,161 @@
+"""Ion backflow in a GEM (Ar/CO2 80/20) from microscopic avalanches.
+
+Without options the script runs a few avalanches and plots the field, the
+mesh and the drift lines, as before. With --batch nothing is drawn and the
+events are split into chunks over a process pool: every worker loads the
+field map and the gas once, every chunk seeds Garfield's random engine from
+(--seed, chunk number), so the results do not depend on the number of
+workers. The per-event avalanche size (ne, ni), ions drifted and back-flowing
+ions are appended to a compact binary results file as chunks finish;
+rerunning the command (also with more --events) skips the chunks already in
+it.
+
+Results file: char magic[8] = "GEMBF1\\0\\0"; uint64 header_bytes; JSON header
+padded with spaces to header_bytes; then little-endian records
+{uint32 event, int32 ne, int32 ni, int32 ions, int32 bf} in completion order.
+
+Usage:
+    python3 gem.py
+    python3 gem.py --batch --events 10000 --workers 8 --seed 1 -o gem_bf.bin
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
 import ROOT
 import Garfield
 import ctypes
-
-# Load the field map.
-fm = ROOT.Garfield.ComponentAnsys123()
-fm.Initialise("ELIST.lis", "NLIST.lis", "MPLIST.lis", "PRNSOL.lis", "mm")
-fm.EnableMirrorPeriodicityX()
-fm.EnableMirrorPeriodicityY()
-fm.PrintRange()
+import numpy as np
 
 # Dimensions of the GEM [cm]
 pitch = 0.014
 
-fieldView = ROOT.Garfield.ViewField(fm)
-cF = ROOT.TCanvas('cF', '', 600, 600)
-fieldView.SetCanvas(cF)
-# Set the normal vector of the viewing plane (xz plane).
-fieldView.SetPlaneXZ()
-# Set the plot limits in the current viewing plane.
-fieldView.SetArea(-0.5 * pitch, -0.02, 0.5 * pitch, 0.02)
-fieldView.SetVoltageRange(-160., 160.)
-fieldView.GetCanvas().SetLeftMargin(0.16)
-fieldView.PlotContour()
-
-# Setup the gas.
-gas = ROOT.Garfield.MediumMagboltz("ar", 80., "co2", 20.)
-gas.SetTemperature(293.15)
-gas.SetPressure(760.)
-gas.Initialise(True)
-
-# Set the Penning transfer efficiency.
-rPenning = 0.51
-gas.EnablePenningTransfer(rPenning, 0., "ar")
-# Load the ion mobilities.
-gas.LoadIonMobility('IonMobility_Ar+_Ar.txt')
- 
-fm.SetGas(gas)
-fm.PrintMaterials()
-
-# Assemble the sensor.
-sensor = ROOT.Garfield.Sensor(fm)
-sensor.SetArea(-5 * pitch, -5 * pitch, -0.01, 5 * pitch,  5 * pitch, 0.025)
-
-aval = ROOT.Garfield.AvalancheMicroscopic(sensor)
-
-drift = ROOT.Garfield.AvalancheMC(sensor)
-drift.SetDistanceSteps(2.e-4)
-
-driftView = ROOT.Garfield.ViewDrift()
-plotDrift = True
-if plotDrift:
-  aval.EnablePlotting(driftView)
-  drift.EnablePlotting(driftView)
-
-# Count the total number of ions and the back-flowing ions.
-nTotal = 0
-nBF = 0
-nEvents = 10
-for i in range(nEvents):
-  # print i, '/', nEvents
-  # Randomize the initial position. 
+# Start of the primary electron and the z above which an ion counts as back-flowing [cm]
+z0 = 0.02
+e0 = 0.1
+zBF = 0.005
+
+MAGIC = b'GEMBF1\0\0'
+HEADER_PAGE = 4096
+RECORD = np.dtype([('event', '<u4'), ('ne', '<i4'), ('ni', '<i4'), ('ions', '<i4'), ('bf', '<i4')])
+
+
+def load_fieldmap():
+  # Load the field map.
+  fm = ROOT.Garfield.ComponentAnsys123()
+  fm.Initialise("ELIST.lis", "NLIST.lis", "MPLIST.lis", "PRNSOL.lis", "mm")
+  fm.EnableMirrorPeriodicityX()
+  fm.EnableMirrorPeriodicityY()
+  return fm
+
+
+def make_gas():
+  # Setup the gas.
+  gas = ROOT.Garfield.MediumMagboltz("ar", 80., "co2", 20.)
+  gas.SetTemperature(293.15)
+  gas.SetPressure(760.)
+  gas.Initialise(True)
+
+  # Set the Penning transfer efficiency.
+  rPenning = 0.51
+  gas.EnablePenningTransfer(rPenning, 0., "ar")
+  # Load the ion mobilities.
+  gas.LoadIonMobility('IonMobility_Ar+_Ar.txt')
+  return gas
+
+
+def setup(fm, gas, driftView=None):
+  """Sensor and transport of one process; returns (sensor, aval, drift)."""
+  fm.SetGas(gas)
+
+  # Assemble the sensor.
+  sensor = ROOT.Garfield.Sensor(fm)
+  sensor.SetArea(-5 * pitch, -5 * pitch, -0.01, 5 * pitch,  5 * pitch, 0.025)
+
+  aval = ROOT.Garfield.AvalancheMicroscopic(sensor)
+
+  drift = ROOT.Garfield.AvalancheMC(sensor)
+  drift.SetDistanceSteps(2.e-4)
+
+  if driftView is not None:
+    aval.EnablePlotting(driftView)
+    drift.EnablePlotting(driftView)
+  return sensor, aval, drift
+
+
+def simulate_event(aval, drift):
+  """One avalanche from a random point above the GEM; returns (ne, ni, ions, bf)."""
+  # Randomize the initial position.
   x0 = -0.5 * pitch + ROOT.Garfield.RndmUniform() * pitch
   y0 = -0.5 * pitch + ROOT.Garfield.RndmUniform() * pitch
-  z0 = 0.02
   t0 = 0.
-  e0 = 0.1
   aval.AvalancheElectron(x0, y0, z0, t0, e0, 0., 0., 0.)
   ne, ni = aval.GetAvalancheSize()
+  ions = 0
+  bf = 0
   for electron in aval.GetElectrons():
     p0 = electron.path[0]
     drift.DriftIon(p0.x, p0.y, p0.z, p0.t)
-    nTotal += 1
+    ions += 1
     endpoint = drift.GetIons().front().path.back()
-    if endpoint.z > 0.005: nBF += 1
+    if endpoint.z > zBF: bf += 1
+  return ne, ni, ions, bf
+
+
+def backflow(records):
+  """Back-flowing fraction of the ions and its standard error.
+
+  The ions of one avalanche are not independent, so the error is that of a
+  ratio of per-event sums (events as the independent samples); the binomial
+  error over the ions is returned as well for comparison.
+  """
+  ions = records['ions'].astype(float)
+  bf = records['bf'].astype(float)
+  n = len(records)
+  if n == 0 or ions.sum() == 0:
+    return float('nan'), float('nan'), float('nan')
+  ratio = bf.sum() / ions.sum()
+  error = np.sqrt(n / max(n - 1, 1) * np.sum((bf - ratio * ions) ** 2)) / ions.sum()
+  binomial = np.sqrt(ratio * (1 - ratio) / ions.sum())
+  return ratio, error, binomial
+
+
+def interactive(nEvents):
+  """The original single-process run with field, mesh and drift line plots."""
+  fm = load_fieldmap()
+  fm.PrintRange()
+
+  fieldView = ROOT.Garfield.ViewField(fm)
+  cF = ROOT.TCanvas('cF', '', 600, 600)
+  fieldView.SetCanvas(cF)
+  # Set the normal vector of the viewing plane (xz plane).
+  fieldView.SetPlaneXZ()
+  # Set the plot limits in the current viewing plane.
+  fieldView.SetArea(-0.5 * pitch, -0.02, 0.5 * pitch, 0.02)
+  fieldView.SetVoltageRange(-160., 160.)
+  fieldView.GetCanvas().SetLeftMargin(0.16)
+  fieldView.PlotContour()
+
+  gas = make_gas()
+  driftView = ROOT.Garfield.ViewDrift()
+  sensor, aval, drift = setup(fm, gas, driftView)
+  fm.PrintMaterials()
 
-print('Ratio of back-flowing ions:', float(nBF) / float(nTotal))
-cD = ROOT.TCanvas('cD', '', 600, 600)
-meshView = ROOT.Garfield.ViewFEMesh(fm)
-plotMesh = True 
-if plotDrift:
+  # Count the total number of ions and the back-flowing ions.
+  nTotal = 0
+  nBF = 0
+  for i in range(nEvents):
+    ne, ni, ions, bf = simulate_event(aval, drift)
+    nTotal += ions
+    nBF += bf
+
+  print('Ratio of back-flowing ions:', float(nBF) / float(nTotal))
+  cD = ROOT.TCanvas('cD', '', 600, 600)
+  meshView = ROOT.Garfield.ViewFEMesh(fm)
+  plotMesh = True
   if plotMesh:
     meshView.SetArea(-2 * pitch, -0.02, 2 * pitch, 0.02)
     meshView.SetCanvas(cD)
@@ -95,3 +172,140 @@ if plotDrift:
     driftView.SetPlane(0, -1, 0, 0, 0, 0)
     driftView.SetArea(-2 * pitch, -0.02, 2 * pitch, 0.02)
     driftView.Plot(True)
+
+
+# Garfield objects of a batch worker, built once by _init_worker
+_worker = None
+
+
+def _init_worker():
+  global _worker
+  ROOT.gROOT.SetBatch(True)
+  fm = load_fieldmap()
+  gas = make_gas()
+  sensor, aval, drift = setup(fm, gas)
+  _worker = (fm, gas, sensor, aval, drift)
+
+
+def chunk_seed(seed, chunk):
+  """Nonzero 32-bit seed of one chunk, independent of which worker runs it."""
+  return int(np.random.SeedSequence([seed, chunk]).generate_state(1)[0]) or 1
+
+
+def run_chunk(task):
+  """Simulate events [begin, end) of one chunk; returns (chunk, records, seconds)."""
+  chunk, begin, end, seed = task
+  start = time.perf_counter()
+  aval, drift = _worker[3], _worker[4]
+  ROOT.Garfield.randomEngine.Seed(chunk_seed(seed, chunk))
+  records = np.zeros(end - begin, dtype=RECORD)
+  for i, event in enumerate(range(begin, end)):
+    records[i] = (event,) + tuple(simulate_event(aval, drift))
+  return chunk, records, time.perf_counter() - start
+
+
+def results_header(args):
+  return {'format': 'GEMBF1', 'chunk': args.chunk, 'seed': args.seed,
+          'gas': 'ar 80 co2 20', 'penning': 0.51, 'z0_cm': z0, 'e0_eV': e0, 'z_backflow_cm': zBF,
+          'record': [name for name in RECORD.names]}
+
+
+def read_results(path):
+  """Header and records of a results file; a partly written last record is dropped.
+
+  Events are in completion order and an event can appear twice when its chunk
+  was cut short and rerun (with the same seed, so with the same result).
+  """
+  with open(path, 'rb') as f:
+    if f.read(8) != MAGIC:
+      raise ValueError(f'{path} is not a GEMBF1 results file')
+    header_bytes = int(np.frombuffer(f.read(8), '<u8')[0])
+    header = json.loads(f.read(header_bytes - 16).decode().strip())
+    data = f.read()
+  return header, np.frombuffer(data[:len(data) // RECORD.itemsize * RECORD.itemsize], dtype=RECORD)
+
+
+def open_results(path, header):
+  """Open ``path`` for appending; returns (file, records already in it)."""
+  if os.path.exists(path):
+    existing, records = read_results(path)
+    if existing != header:
+      raise ValueError(f'{path} was written with other settings; remove it or choose another --output')
+    f = open(path, 'r+b')
+    f.seek(8)
+    header_bytes = int(np.frombuffer(f.read(8), '<u8')[0])
+    # Drop a record cut short by an interrupted run
+    f.truncate(header_bytes + records.nbytes)
+    f.seek(0, os.SEEK_END)
+    return f, records
+  text = json.dumps(header).encode()
+  header_bytes = (16 + len(text) + HEADER_PAGE - 1) // HEADER_PAGE * HEADER_PAGE
+  f = open(path, 'wb')
+  f.write(MAGIC + np.uint64(header_bytes).tobytes() + text.ljust(header_bytes - 16))
+  f.flush()
+  return f, np.zeros(0, dtype=RECORD)
+
+
+def batch(args):
+  header = results_header(args)
+  try:
+    out, done = open_results(args.output, header)
+  except ValueError as e:
+    print(f"✗ {e}")
+    return 1
+  complete = set(done['event'].tolist())
+  tasks = []
+  for chunk, begin in enumerate(range(0, args.events, args.chunk)):
+    end = min(begin + args.chunk, args.events)
+    if not all(event in complete for event in range(begin, end)):
+      tasks.append((chunk, begin, end, args.seed))
+  workers = max(1, min(args.workers, len(tasks)))
+  print(f"{args.events} event(s) in {-(-args.events // args.chunk)} chunk(s), {len(tasks)} to run "
+        f"on {workers} worker(s) -> {args.output}")
+
+  records = [done]
+  start = time.perf_counter()
+  simulated = 0
+  if tasks:
+    with multiprocessing.get_context('fork').Pool(workers, initializer=_init_worker) as pool:
+      for n, (chunk, chunk_records, seconds) in enumerate(pool.imap_unordered(run_chunk, tasks), 1):
+        out.write(chunk_records.tobytes())
+        out.flush()
+        records.append(chunk_records)
+        simulated += len(chunk_records)
+        if args.verbose or n == len(tasks):
+          elapsed = time.perf_counter() - start
+          print(f"  chunk {chunk}: {len(chunk_records)} event(s) in {seconds:.1f} s "
+                f"({n}/{len(tasks)}, {simulated / elapsed:.2f} events/s)")
+  out.close()
+
+  records = np.concatenate(records)
+  records = records[np.unique(records['event'], return_index=True)[1]]
+  records = records[records['event'] < args.events]
+  ratio, error, binomial = backflow(records)
+  print(f"Ratio of back-flowing ions: {ratio:.5f} ± {error:.5f} "
+        f"(binomial ± {binomial:.5f}; {len(records)} events, {records['ions'].sum()} ions, "
+        f"{records['ne'].mean():.1f} electrons per avalanche)")
+  return 0
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Ion backflow in a GEM from microscopic avalanches')
+  parser.add_argument('--events', type=int, default=10, help='avalanches to simulate')
+  parser.add_argument('--batch', action='store_true',
+                      help='no plots; run the events over a process pool and stream them to --output')
+  parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processes in --batch mode')
+  parser.add_argument('--chunk', type=int, default=50, help='events per chunk (and per seed) in --batch mode')
+  parser.add_argument('--seed', type=int, default=1, help='base seed of the chunks in --batch mode')
+  parser.add_argument('-o', '--output', default='gem_backflow.bin', help='results file in --batch mode')
+  parser.add_argument('-v', '--verbose', action='store_true', help='report every chunk')
+  args = parser.parse_args(argv)
+
+  if not args.batch:
+    interactive(args.events)
+    return 0
+  return batch(args)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -1 +0,0 @@
-#include <AvailabilityMacros.h>
@@ -0,0 +1,191 @@
+"""Adaptive (x, y) beam-position sampling for Diamond_4p sweeps.
+
+Starts from a coarse grid of cells and, round by round, splits a cell into
+four only where its corner points disagree: the distance between two points
+is the larger of the maximum differences of their collected charge vs
+Hcenter and of their pulse shape (induced current summed over Hcenter), each
+relative to the larger of the two. Cells whose corners all agree within
+``--tol``, or that reached ``--min-step``, are kept as they are, so flat
+regions of the cell stay coarse and the grid is refined near the columns.
+
+The points run through ``tpa_sweep.run_sweep`` in the same sweep directory,
+so rerunning the command resumes it: completed points are read back from
+their outputs and the refinement is recomputed deterministically. The final
+cells and point distances are written to ``<out>/adaptive.json``.
+
+Usage:
+    python3 tpa_adaptive.py --x 2.5 32.5 3 --y 2.5 32.5 3 --tol 0.05 --min-step 1.875
+    python3 tpa_adaptive.py --x 2.5 32.5 3 --y 2.5 32.5 3 --max-tasks 60 -o TPA_results_adaptive
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from tpa_signals import collected_charge, read
+from tpa_sweep import add_run_arguments, grid, make_task, prepare_run, run_sweep
+
+ROUND_DIGITS = 6
+
+
+def features(path):
+    """Collected charge vs Hcenter and summed pulse shape of one output."""
+    signals = read(path)
+    return collected_charge(signals), signals.signal[:, :, 0].sum(axis=0)
+
+
+def _relative_difference(a, b):
+    scale = max(np.abs(a).max(), np.abs(b).max())
+    return float(np.abs(a - b).max() / scale) if scale > 0 else 0.0
+
+
+def distance(fa, fb):
+    return max(_relative_difference(fa[0], fb[0]), _relative_difference(fa[1], fb[1]))
+
+
+def _point(x, y):
+    return round(x, ROUND_DIGITS), round(y, ROUND_DIGITS)
+
+
+def initial_cells(xs, ys):
+    return [(x0, x1, y0, y1) for x0, x1 in zip(xs, xs[1:]) for y0, y1 in zip(ys, ys[1:])]
+
+
+def corners(cell):
+    x0, x1, y0, y1 = cell
+    return [_point(x0, y0), _point(x1, y0), _point(x0, y1), _point(x1, y1)]
+
+
+def split(cell):
+    x0, x1, y0, y1 = cell
+    xm, ym = round((x0 + x1) / 2, ROUND_DIGITS), round((y0 + y1) / 2, ROUND_DIGITS)
+    return [(x0, xm, y0, ym), (xm, x1, y0, ym), (x0, xm, ym, y1), (xm, x1, ym, y1)]
+
+
+class AdaptiveSweep:
+    """Refinement state for one (time_step, conductivity) combination."""
+
+    def __init__(self, xs, ys, time_step, conductivity, tol, min_step, fmt='text'):
+        self.time_step = time_step
+        self.conductivity = conductivity
+        self.format = fmt
+        self.tol = tol
+        self.min_step = min_step
+        self.active = initial_cells(xs, ys)
+        self.final = []
+        self.features = {}
+        self.spread = {}
+        self.parents = {}
+
+    def task(self, point):
+        return make_task(point[0], point[1], self.time_step, self.conductivity, self.format)
+
+    def points(self):
+        return sorted({p for cell in self.active for p in corners(cell)})
+
+    def refine(self, manifest):
+        """Split the active cells that exceed ``tol``; returns the number of cells split."""
+        next_active, nsplit = [], 0
+        for cell in self.active:
+            feats = []
+            for point in corners(cell):
+                task = self.task(point)
+                if not manifest.is_complete(task):
+                    break
+                if point not in self.features:
+                    self.features[point] = features(manifest.output_path(task))
+                feats.append(self.features[point])
+            else:
+                spread = max(distance(a, b) for a, b in itertools.combinations(feats, 2))
+                self.spread[cell] = spread
+                if spread > self.tol and (cell[1] - cell[0]) / 2 >= self.min_step \
+                        and (cell[3] - cell[2]) / 2 >= self.min_step:
+                    for child in split(cell):
+                        self.parents[child] = cell
+                        next_active.append(child)
+                    nsplit += 1
+                else:
+                    self.final.append(cell)
+                continue
+            print(f"  ⚠️  cell {cell} dropped: corner {point} has no output")
+        self.active = next_active
+        return nsplit
+
+    def stop(self):
+        """Keep the unsimulated children's parents as final cells."""
+        for cell in self.active:
+            parent = self.parents.get(cell, cell)
+            if parent not in self.final:
+                self.final.append(parent)
+        self.active = []
+
+    def summary(self):
+        cells = self.final + self.active
+        return {'time_step': self.time_step, 'conductivity': self.conductivity,
+                'tol': self.tol, 'min_step': self.min_step,
+                'points': sorted({p for cell in cells for p in corners(cell)}),
+                'cells': [{'cell': list(cell), 'spread': self.spread.get(cell)} for cell in sorted(cells)]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Adaptive (x, y) Diamond_4p sweep')
+    parser.add_argument('--x', type=float, nargs=3, metavar=('MIN', 'MAX', 'N'), default=[2.5, 32.5, 3],
+                        help='coarse beam x grid [um]')
+    parser.add_argument('--y', type=float, nargs=3, metavar=('MIN', 'MAX', 'N'), default=[2.5, 32.5, 3],
+                        help='coarse beam y grid [um]')
+    parser.add_argument('--tol', type=float, default=0.05,
+                        help='relative charge/pulse-shape difference that triggers a split')
+    parser.add_argument('--min-step', type=float, default=1.875, help='smallest grid step [um]')
+    parser.add_argument('--max-rounds', type=int, default=10)
+    parser.add_argument('--max-tasks', type=int, help='stop refining once this many points exist')
+    add_run_arguments(parser)
+    parser.set_defaults(out_dir='TPA_results_adaptive')
+    args = parser.parse_args(argv)
+
+    out_dir = os.path.abspath(args.out_dir)
+    exe, jobs, extra_args, info = prepare_run(args)
+    info.update(adaptive={'x': args.x, 'y': args.y, 'tol': args.tol, 'min_step': args.min_step})
+    sweeps = [AdaptiveSweep(grid(*args.x), grid(*args.y), dt, c, args.tol, args.min_step, args.format)
+              for c, dt in itertools.product(args.conductivity, args.time_step)]
+    start = time.perf_counter()
+    failed = 0
+    seen = set()
+    for round_index in range(args.max_rounds + 1):
+        tasks = [sweep.task(p) for sweep in sweeps for p in sweep.points()]
+        if not tasks:
+            break
+        if round_index and args.max_tasks and len(seen | {t['id'] for t in tasks}) > args.max_tasks:
+            print(f"  ⚠️  refining further exceeds --max-tasks {args.max_tasks}, stopping")
+            for sweep in sweeps:
+                sweep.stop()
+            break
+        seen.update(t['id'] for t in tasks)
+        print(f"Round {round_index}: {len(tasks)} point(s) in {sum(len(s.active) for s in sweeps)} active cell(s)")
+        manifest, failed = run_sweep(tasks, out_dir, exe, jobs, extra_args, args.timeout, args.verify, info)
+        if round_index == args.max_rounds:
+            break
+        nsplit = sum(sweep.refine(manifest) for sweep in sweeps)
+        print(f"  → {nsplit} cell(s) above tol={args.tol:g} refined")
+
+    summaries = [sweep.summary() for sweep in sweeps]
+    path = os.path.join(out_dir, 'adaptive.json')
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(summaries, f, indent=1)
+    os.replace(tmp, path)
+    npoints = sum(len(s['points']) for s in summaries)
+    steps = [min(c['cell'][1] - c['cell'][0] for c in s['cells']) for s in summaries if s['cells']]
+    if steps:
+        uniform = len(summaries) * (int(round((args.x[1] - args.x[0]) / min(steps))) + 1) \
+            * (int(round((args.y[1] - args.y[0]) / min(steps))) + 1)
+        print(f"✓ {npoints} point(s) simulated; a uniform grid at the finest step "
+              f"({min(steps):g} μm) needs {uniform} ({time.perf_counter() - start:.0f} s) -> {path}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""Ingest TPA simulation results into one chunked, compressed HDF5 store.
+
+Finds ``TPA_simulation_*.txt`` (and ``.bin``) files under the given result
+directories (e.g. ``Results/TPA_results_<timestamp>/`` from Launch.ipynb or
+a tpa_sweep directory), parses them in parallel with ``tpa_signals.read``
+and appends them to the store. The events of one file are stored as
+consecutive rows, so the pulse of every Hcenter at one beam position is a
+single contiguous read:
+
+    /t                      (nt,)             time bin centers [ns]
+    /signal                 (N, nt, 3)        {total, electron, hole}, gzip, 64-event chunks
+    /events/{file_id, hcenter, carriers, q_total}    (N,)
+    /files/{sweep, path, size, mtime_ns, x0, y0, time_step, conductivity,
+            row_start, nH, valid}                    one row per ingested file
+
+``sweep`` is the name of the result directory, ``time_step`` and
+``conductivity`` come from tpa_sweep file names (``_dt1_c1e-3``) or the
+``--time-step``/``--conductivity`` defaults; legacy
+``TPA_simulation_x…_y….txt`` names carry no time step, so pass
+``--time-step`` for them (otherwise they are stored with NaN and cannot be
+selected by ``time_step``). Files already in the store with the same size
+and mtime are skipped; a file that changed is ingested again (keeping its
+previous time step and conductivity when none is given) and its previous
+rows are marked ``valid = False``.
+
+Usage:
+    python tpa_ingest.py ../Results -o ../Results/tpa_store.h5 -j 8
+    python tpa_ingest.py --list -o ../Results/tpa_store.h5
+
+    from tpa_ingest import TpaStore
+    with TpaStore('../Results/tpa_store.h5') as store:
+        hcenter, t, pulse = store.pulse(17.5, 17.5)   # pulse: (nH, nt, 3)
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import h5py
+import numpy as np
+
+from tpa_signals import read
+
+CHUNK_EVENTS = 64
+INDEX_CHUNK = 1024
+FILE_FIELDS = {'sweep': h5py.string_dtype(), 'path': h5py.string_dtype(), 'size': np.int64,
+               'mtime_ns': np.int64, 'x0': np.float64, 'y0': np.float64, 'time_step': np.float64,
+               'conductivity': h5py.string_dtype(), 'row_start': np.int64, 'nH': np.int64, 'valid': bool}
+EVENT_FIELDS = {'file_id': np.int64, 'hcenter': np.float64, 'carriers': np.float64, 'q_total': np.float64}
+
+_TASK_NAME = re.compile(r'_dt([0-9.eE+-]+)_c([^_/]+)\.(?:txt|bin)$')
+
+
+def find_results(roots):
+    """Result files under ``roots`` (directories or globs); a ``.bin`` wins over its ``.txt``."""
+    found = {}
+    for root in roots:
+        if os.path.isdir(root):
+            paths = glob.glob(os.path.join(root, '**', 'TPA_simulation_*'), recursive=True)
+        else:
+            paths = glob.glob(root)
+        for path in paths:
+            stem, ext = os.path.splitext(os.path.abspath(path))
+            if ext == '.bin' or (ext == '.txt' and stem not in found):
+                found[stem] = stem + ext
+    return sorted(found.values())
+
+
+def parse_file(path, time_step=np.nan, conductivity=''):
+    """Parse one result file into its index row and arrays (runs in a worker)."""
+    st = os.stat(path)
+    signals = read(path)
+    match = _TASK_NAME.search(path)
+    if match:
+        time_step, conductivity = float(match.group(1)), match.group(2)
+    row = {'sweep': os.path.basename(os.path.dirname(path)), 'path': path, 'size': st.st_size,
+           'mtime_ns': st.st_mtime_ns, 'x0': float(signals.x0), 'y0': float(signals.y0),
+           'time_step': time_step, 'conductivity': conductivity, 'nH': len(signals.hcenter)}
+    return row, np.asarray(signals.t), np.asarray(signals.hcenter), np.asarray(signals.carriers), \
+        np.asarray(signals.q_total), np.asarray(signals.signal)
+
+
+class TpaStore:
+    """The HDF5 store; opened read-only unless ``mode`` says otherwise."""
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self._h5 = h5py.File(path, mode)
+        self._valid_rows = None
+
+    def close(self):
+        self._h5.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._h5['files/path'].shape[0] if 'files' in self._h5 else 0
+
+    def _create(self, nt, t):
+        h5 = self._h5
+        h5.create_dataset('t', data=t)
+        h5.create_dataset('signal', shape=(0, nt, 3), maxshape=(None, nt, 3), dtype=np.float64,
+                          chunks=(CHUNK_EVENTS, nt, 3), compression='gzip', compression_opts=4, shuffle=True)
+        for group, fields in (('files', FILE_FIELDS), ('events', EVENT_FIELDS)):
+            for name, dtype in fields.items():
+                h5.create_dataset(f'{group}/{name}', shape=(0,), maxshape=(None,), dtype=dtype,
+                                  chunks=(INDEX_CHUNK,))
+
+    def files(self):
+        """Index of the ingested files as a dict of arrays (strings decoded)."""
+        if 'files' not in self._h5:
+            return {name: np.array([]) for name in FILE_FIELDS}
+        out = {}
+        for name in FILE_FIELDS:
+            dataset = self._h5[f'files/{name}']
+            out[name] = dataset.asstr()[:] if dataset.dtype.kind == 'O' else dataset[:]
+        return out
+
+    def append(self, row, t, hcenter, carriers, q_total, signal):
+        """Append one parsed file; returns its file id.
+
+        A changed file keeps the ``time_step``/``conductivity`` of the row it
+        supersedes when neither its name nor the command line gave one.
+        """
+        h5 = self._h5
+        if 'signal' not in h5:
+            self._create(signal.shape[1], t)
+        if signal.shape[1:] != h5['signal'].shape[1:] or not np.allclose(t, h5['t'][:], rtol=1e-6):
+            raise ValueError(f"{row['path']}: time bins differ from the store")
+        if self._valid_rows is None:
+            index = self.files()
+            self._valid_rows = {}
+            for i in np.flatnonzero(index['valid']):
+                self._valid_rows.setdefault(index['path'][i], []).append(int(i))
+        file_id, row_start, n = len(self), h5['signal'].shape[0], len(hcenter)
+        row = dict(row, row_start=row_start, valid=True)
+        for i in self._valid_rows.pop(row['path'], []):
+            h5['files/valid'][i] = False
+            if np.isnan(row['time_step']):
+                row['time_step'] = float(h5['files/time_step'][i])
+            if not row['conductivity']:
+                row['conductivity'] = h5['files/conductivity'].asstr()[i]
+        self._valid_rows[row['path']] = [file_id]
+        for name in FILE_FIELDS:
+            dataset = h5[f'files/{name}']
+            dataset.resize((file_id + 1,))
+            dataset[file_id] = row[name]
+        for name, values in (('file_id', np.full(n, file_id)), ('hcenter', hcenter),
+                             ('carriers', carriers), ('q_total', q_total)):
+            dataset = h5[f'events/{name}']
+            dataset.resize((row_start + n,))
+            dataset[row_start:] = values
+        h5['signal'].resize((row_start + n,) + signal.shape[1:])
+        h5['signal'][row_start:] = signal
+        return file_id
+
+    def select(self, x=None, y=None, sweep=None, time_step=None, conductivity=None, tol=1e-6):
+        """Ids of the valid files matching every given key."""
+        index = self.files()
+        mask = index['valid'].astype(bool)
+        if x is not None:
+            mask &= np.abs(index['x0'] - x) < tol
+        if y is not None:
+            mask &= np.abs(index['y0'] - y) < tol
+        if sweep is not None:
+            mask &= index['sweep'] == sweep
+        if time_step is not None:
+            mask &= np.abs(index['time_step'] - time_step) < tol
+        if conductivity is not None:
+            mask &= index['conductivity'] == str(conductivity)
+        return np.flatnonzero(mask)
+
+    def read_file(self, file_id):
+        """``(hcenter, signal)`` of one ingested file: one contiguous read."""
+        start = int(self._h5['files/row_start'][file_id])
+        stop = start + int(self._h5['files/nH'][file_id])
+        return self._h5['events/hcenter'][start:stop], self._h5['signal'][start:stop]
+
+    def pulse(self, x, y, **keys):
+        """``(hcenter, t, signal)`` at beam position (x, y) for all Hcenter.
+
+        ``keys`` (sweep, time_step, conductivity) must single out one file;
+        with several matches the most recently ingested one is used.
+        """
+        ids = self.select(x, y, **keys)
+        if not len(ids):
+            raise KeyError(f'no ingested file at x={x}, y={y} {keys or ""}')
+        hcenter, signal = self.read_file(ids[-1])
+        return hcenter, self._h5['t'][:], signal
+
+
+def ingest(store_path, roots, jobs=None, time_step=np.nan, conductivity='', force=False):
+    """Parse the new/changed files under ``roots`` in parallel and append them; returns (added, failed)."""
+    paths = find_results(roots)
+    with TpaStore(store_path, 'a') as store:
+        index = store.files()
+        known = {(p, s, m) for p, s, m, v in zip(index['path'], index['size'], index['mtime_ns'], index['valid'])
+                 if v}
+        todo = []
+        for path in paths:
+            st = os.stat(path)
+            if force or (path, st.st_size, st.st_mtime_ns) not in known:
+                todo.append(path)
+        print(f"{len(paths)} result file(s), {len(paths) - len(todo)} already ingested, "
+              f"parsing {len(todo)} with {jobs or os.cpu_count()} worker(s) -> {store_path}")
+        added = failed = 0
+        no_step = []
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(parse_file, path, time_step, conductivity): path for path in todo}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    parsed = future.result()
+                    file_id = store.append(*parsed)
+                    time_step = store._h5['files/time_step'][file_id]
+                except Exception as e:
+                    failed += 1
+                    print(f"  ✗ {os.path.relpath(path)}: {type(e).__name__}: {e}")
+                    continue
+                added += 1
+                row = parsed[0]
+                print(f"  ✓ [{file_id}] {row['sweep']} x0={row['x0']:g} y0={row['y0']:g} "
+                      f"({row['nH']} events)")
+                if np.isnan(time_step):
+                    no_step.append(path)
+    if no_step:
+        print(f"⚠️ {len(no_step)} file(s) without a time step in the name (e.g. {os.path.relpath(no_step[0])}) "
+              f"stored with time_step = NaN, not selectable by time_step; ingest them with "
+              f"--time-step <ns> --force")
+    return added, failed
+
+
+def print_index(store_path):
+    with TpaStore(store_path) as store:
+        index = store.files()
+        valid = index['valid'].astype(bool)
+        print(f"{store_path}: {valid.sum()} file(s) ({len(valid) - valid.sum()} superseded)")
+        for sweep in sorted(set(index['sweep'][valid])):
+            rows = valid & (index['sweep'] == sweep)
+            steps = index['time_step'][rows]
+            time_steps = [float(v) for v in np.unique(steps[~np.isnan(steps)])]
+            if np.isnan(steps).any():
+                time_steps.append('unset')
+            print(f"  {sweep}: {rows.sum()} position(s), {index['nH'][rows].sum()} events, "
+                  f"time_step {time_steps}, "
+                  f"conductivity {sorted(set(index['conductivity'][rows]))}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ingest TPA_simulation_* results into an HDF5 store')
+    parser.add_argument('roots', nargs='*', help='result directories or globs')
+    parser.add_argument('-o', '--store', default=os.path.join('..', 'Results', 'tpa_store.h5'))
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='parser processes')
+    parser.add_argument('--time-step', type=float, default=np.nan,
+                        help='time step [ns] for files whose name does not carry one')
+    parser.add_argument('--conductivity', default='', help='conductivity for files whose name does not carry one')
+    parser.add_argument('--force', action='store_true', help='ingest files again even if unchanged')
+    parser.add_argument('--list', action='store_true', help='print the store index and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        return print_index(args.store)
+    if not args.roots:
+        parser.error('no result directories given')
+    start = time.perf_counter()
+    added, failed = ingest(args.store, args.roots, args.jobs, args.time_step, args.conductivity, args.force)
+    print(f"Done in {time.perf_counter() - start:.1f} s: {added} ingested, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Phase timing and throughput metrics of Diamond_4p sweeps.
+
+Every Diamond_4p job run by tpa_sweep.py appends JSON lines to
+``<out>/metrics_<task>.jsonl`` (``--metrics``): one ``start`` record, one
+``phase`` record per setup phase (LUT mapping, mesh initialisation, prompt
+and dynamic weighting potentials, sensor setup, the event loop of each
+worker), one ``event`` record per Hcenter with its load/drift/output times
+and carriers drifted per second, and a final ``done`` record with the job's
+wall and CPU seconds (forked workers included) and peak RSS. The sweep
+itself logs its build, staging and job-pool phases to
+``<out>/sweep_metrics.jsonl`` with ``MetricsLog``.
+
+Every record carries ``kind``, ``pid``, ``worker`` (-1 for the job process),
+``time`` (Unix seconds when it was written) and ``rss_mb`` (peak RSS so far);
+records with a duration carry ``wall_s`` and ``cpu_s``.
+
+The command line summarises a sweep directory: time per phase over all
+jobs, event and throughput statistics, the critical path (serial setup, the
+pool slot that finished last, the longest job and its dominant phase,
+worker imbalance) and how busy the cores were.
+
+Usage:
+    python3 tpa_metrics.py TPA_results_sweep
+    python3 tpa_metrics.py TPA_results_sweep --cores 32 --top 10 --json metrics_summary.json
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import resource
+import sys
+import time
+
+JOB_PATTERN = 'metrics_*.jsonl'
+SWEEP_METRICS = 'sweep_metrics.jsonl'
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+
+class MetricsLog:
+    """Appends records in the Diamond_4p ``--metrics`` format to a JSON-lines file."""
+
+    def __init__(self, path, worker=-1):
+        self.path = path
+        self.worker = worker
+
+    def record(self, kind, **fields):
+        record = {'kind': kind, 'pid': os.getpid(), 'worker': self.worker, 'time': time.time(),
+                  'rss_mb': _peak_rss_mb()}
+        record.update(fields)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # One write on an O_APPEND descriptor keeps concurrent writers' lines whole
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, (json.dumps(record) + '\n').encode())
+        finally:
+            os.close(fd)
+        return record
+
+    @contextlib.contextmanager
+    def phase(self, name, **fields):
+        """Record the wall and CPU time of the ``with`` block as a ``phase`` record."""
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield fields
+        finally:
+            self.record('phase', phase=name, wall_s=time.perf_counter() - wall0,
+                        cpu_s=time.process_time() - cpu0, **fields)
+
+
+def load(path):
+    """Records of one metrics file; a truncated last line (killed job) is skipped."""
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def _stats(values):
+    # numpy only for the summary; the sweep scheduler logs without it
+    import numpy as np
+    values = np.asarray(values, dtype=float)
+    if not values.size:
+        return {'n': 0}
+    return {'n': int(values.size), 'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)), 'max': float(values.max()), 'sum': float(values.sum())}
+
+
+def job_summary(name, records):
+    """Timing of one Diamond_4p job from its metrics records."""
+    start = next((r for r in records if r['kind'] == 'start'), None)
+    done = next((r for r in records if r['kind'] == 'done'), None)
+    phases = [r for r in records if r['kind'] == 'phase']
+    events = [r for r in records if r['kind'] == 'event']
+    began = start['time'] - start.get('startup_s', 0.) if start else min(r['time'] for r in records)
+    ended = done['time'] if done else max(r['time'] for r in records)
+    main_phases = {}
+    for r in phases:
+        if r['worker'] < 0 and r['phase'] != 'dynamic_wp_slice':
+            main_phases[r['phase']] = main_phases.get(r['phase'], 0.) + r['wall_s']
+    worker_walls = {r['worker']: r['wall_s'] for r in phases if r['phase'] == 'events' and r['worker'] >= 0}
+    cpu = done['cpu_s'] + done.get('children_cpu_s', 0.) if done else sum(r['cpu_s'] for r in phases)
+    job = {'job': name, 'complete': done is not None, 'start': began, 'end': ended, 'wall_s': ended - began,
+           'cpu_s': cpu, 'phases': main_phases, 'events': len(events),
+           'pairs': sum(r['pairs'] for r in events),
+           'drift_s': sum(r['drift_s'] for r in events),
+           'peak_rss_mb': max([r['rss_mb'] for r in records] + ([done.get('children_rss_mb', 0.)] if done else []))}
+    job['cores_used'] = job['cpu_s'] / job['wall_s'] if job['wall_s'] > 0 else 0.
+    if main_phases:
+        job['dominant_phase'] = max(main_phases, key=main_phases.get)
+    if len(worker_walls) > 1:
+        walls = list(worker_walls.values())
+        job['worker_imbalance'] = max(walls) * len(walls) / sum(walls)
+    return job, phases, events
+
+
+def _lanes(jobs, n_lanes):
+    """Replay the jobs onto ``n_lanes`` pool slots (each job to the slot free earliest)."""
+    lanes = [[] for _ in range(max(1, n_lanes))]
+    for job in sorted(jobs, key=lambda j: j['start']):
+        lane = min(lanes, key=lambda l: l[-1]['end'] if l else float('-inf'))
+        lane.append(job)
+    return [lane for lane in lanes if lane]
+
+
+def _window(jobs, sweep_records):
+    """Seconds the sweep's job pools were running (union of their ``jobs`` phases)."""
+    intervals = [(r['time'] - r['wall_s'], r['time']) for r in sweep_records
+                 if r['kind'] == 'phase' and r['phase'] == 'jobs']
+    if not intervals:
+        intervals = [(min(j['start'] for j in jobs), max(j['end'] for j in jobs))]
+    total, reach = 0., float('-inf')
+    for begin, end in sorted(intervals):
+        begin = max(begin, reach)
+        if end > begin:
+            total += end - begin
+            reach = end
+    return total
+
+
+def summarize(out_dir, cores=None, top=5):
+    """Summary of every metrics file in a sweep directory."""
+    sweep_records = []
+    if os.path.exists(os.path.join(out_dir, SWEEP_METRICS)):
+        sweep_records = load(os.path.join(out_dir, SWEEP_METRICS))
+    jobs, phase_records, event_records = [], [], []
+    for path in sorted(glob.glob(os.path.join(out_dir, JOB_PATTERN))):
+        records = load(path)
+        if not records:
+            continue
+        name = os.path.basename(path)[len('metrics_'):-len('.jsonl')]
+        job, phases, events = job_summary(name, records)
+        jobs.append(job)
+        phase_records += [dict(r, job=name) for r in phases]
+        event_records += [dict(r, job=name) for r in events]
+    if not jobs:
+        raise FileNotFoundError(f'no {JOB_PATTERN} files in {out_dir}')
+
+    sweep = next((r for r in reversed(sweep_records) if r['kind'] == 'sweep'), {})
+    cores = cores or sweep.get('cpu_count') or os.cpu_count() or 1
+    pools = [r['jobs'] for r in sweep_records if r['kind'] == 'phase' and r['phase'] == 'jobs']
+    slots = max(pools, default=None) or sweep.get('jobs') or max(1, cores // max(1, sweep.get('workers', 1)))
+    window = _window(jobs, sweep_records)
+    total_cpu = sum(j['cpu_s'] for j in jobs)
+
+    phases = {}
+    for r in phase_records:
+        key = r['phase'] if r['worker'] < 0 else f"{r['phase']} (worker)"
+        entry = phases.setdefault(key, {'count': 0, 'wall_s': 0., 'cpu_s': 0., 'max_wall_s': 0.})
+        entry['count'] += 1
+        entry['wall_s'] += r['wall_s']
+        entry['cpu_s'] += r['cpu_s']
+        entry['max_wall_s'] = max(entry['max_wall_s'], r['wall_s'])
+    job_wall = sum(j['wall_s'] for j in jobs)
+    for key, entry in phases.items():
+        entry['share'] = entry['wall_s'] / job_wall if job_wall > 0 and '(worker)' not in key else None
+
+    setup = {}
+    for r in sweep_records:
+        if r['kind'] == 'phase' and r['phase'] != 'jobs':
+            setup[r['phase']] = setup.get(r['phase'], 0.) + r['wall_s']
+    lanes = _lanes(jobs, slots)
+    last_lane = max(lanes, key=lambda l: l[-1]['end'])
+    longest = max(jobs, key=lambda j: j['wall_s'])
+    imbalanced = [j for j in jobs if 'worker_imbalance' in j]
+
+    drift_s = sum(j['drift_s'] for j in jobs)
+    pairs = sum(j['pairs'] for j in jobs)
+    slowest = sorted(event_records, key=lambda r: r['wall_s'], reverse=True)[:top]
+    return {
+        'out_dir': out_dir,
+        'jobs': {'count': len(jobs), 'complete': sum(j['complete'] for j in jobs),
+                 'wall_s': _stats([j['wall_s'] for j in jobs]),
+                 'peak_rss_mb': max(j['peak_rss_mb'] for j in jobs)},
+        'phases': phases,
+        'events': {'count': len(event_records),
+                   'wall_s': _stats([r['wall_s'] for r in event_records]),
+                   'drift_share': drift_s / sum(r['wall_s'] for r in event_records) if event_records else None,
+                   'carriers_per_s': _stats([r['carriers_per_s'] for r in event_records]),
+                   'carriers_per_drift_s': 2. * pairs / drift_s if drift_s > 0 else None,
+                   'slowest': [{k: r[k] for k in ('job', 'worker', 'event', 'hcenter_um', 'pairs', 'wall_s')}
+                               for r in slowest]},
+        'critical_path': {'setup_s': setup,
+                          'last_slot': {'jobs': [j['job'] for j in last_lane],
+                                        'busy_s': sum(j['wall_s'] for j in last_lane),
+                                        'end': last_lane[-1]['end']},
+                          'longest_job': {k: longest.get(k) for k in ('job', 'wall_s', 'dominant_phase', 'phases',
+                                                                      'worker_imbalance')},
+                          'worst_worker_imbalance': max((j['worker_imbalance'] for j in imbalanced), default=None),
+                          'lower_bound_s': max(longest['wall_s'], total_cpu / cores)},
+        'utilization': {'cores': cores, 'slots': slots, 'window_s': window, 'cpu_s': total_cpu,
+                        'cores_busy': total_cpu / window if window > 0 else None,
+                        'per_core': total_cpu / (window * cores) if window > 0 else None,
+                        'per_slot': [sum(j['cpu_s'] for j in lane) / window if window > 0 else None
+                                     for lane in lanes],
+                        'job_cores_used': _stats([j['cores_used'] for j in jobs])},
+    }
+
+
+def print_summary(summary):
+    jobs, events, util = summary['jobs'], summary['events'], summary['utilization']
+    print(f"{summary['out_dir']}: {jobs['count']} job(s), {jobs['complete']} complete, "
+          f"wall {jobs['wall_s']['mean']:.1f} s mean / {jobs['wall_s']['max']:.1f} s max, "
+          f"peak RSS {jobs['peak_rss_mb']:.0f} MB")
+    print(f"  {'phase':24s} {'count':>6s} {'wall s':>10s} {'cpu s':>10s} {'max s':>9s} {'share':>6s}")
+    for name, entry in sorted(summary['phases'].items(), key=lambda item: -item[1]['wall_s']):
+        share = f"{100 * entry['share']:5.1f}%" if entry['share'] is not None else '     -'
+        print(f"  {name:24s} {entry['count']:6d} {entry['wall_s']:10.1f} {entry['cpu_s']:10.1f} "
+              f"{entry['max_wall_s']:9.2f} {share}")
+    if events['count']:
+        print(f"  events: {events['count']}, {events['wall_s']['mean']:.3f} s mean / "
+              f"{events['wall_s']['p95']:.3f} s p95 / {events['wall_s']['max']:.3f} s max, "
+              f"{100 * events['drift_share']:.1f}% drifting")
+        print(f"  throughput: {events['carriers_per_drift_s']:.3g} carriers/s overall, "
+              f"{events['carriers_per_s']['p50']:.3g} median per event")
+        for r in events['slowest']:
+            print(f"    {r['wall_s']:8.3f} s  {r['job']} event {r['event']} (Hcenter {r['hcenter_um']:g} um, "
+                  f"{r['pairs']} pairs, worker {r['worker']})")
+    path = summary['critical_path']
+    setup = ', '.join(f'{name} {seconds:.1f} s' for name, seconds in path['setup_s'].items())
+    print("  critical path:")
+    if setup:
+        print(f"    serial setup: {setup}")
+    print(f"    last pool slot: {len(path['last_slot']['jobs'])} job(s), {path['last_slot']['busy_s']:.1f} s busy")
+    longest = path['longest_job']
+    print(f"    longest job: {longest['job']} {longest['wall_s']:.1f} s, dominated by "
+          f"{longest['dominant_phase']} ({longest['phases'].get(longest['dominant_phase'], 0.):.1f} s)")
+    if path['worst_worker_imbalance']:
+        print(f"    worst worker imbalance: slowest worker {path['worst_worker_imbalance']:.2f}x the mean")
+    print(f"    lower bound {path['lower_bound_s']:.1f} s (longest job or CPU / cores) "
+          f"vs {util['window_s']:.1f} s of job pool time")
+    if util['per_core'] is not None:
+        print(f"  utilization: {util['cpu_s']:.1f} CPU s over {util['window_s']:.1f} s on {util['cores']} core(s) "
+              f"= {100 * util['per_core']:.1f}% per core ({util['cores_busy']:.2f} cores busy, "
+              f"{util['slots']} slot(s))")
+        print("    per slot: " + ' '.join(f"{value:.2f}" for value in util['per_slot']) + " cores")
+        if util['per_core'] < 0.5:
+            print("⚠️  Cores are mostly idle: more jobs or --workers would shorten the sweep.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarise the timing metrics of a Diamond_4p sweep')
+    parser.add_argument('out_dir', nargs='?', default='TPA_results_sweep', help='sweep directory')
+    parser.add_argument('--cores', type=int, help='cores available to the sweep (default: as recorded)')
+    parser.add_argument('--top', type=int, default=5, help='slowest events to list')
+    parser.add_argument('--json', help='also write the summary to this file')
+    args = parser.parse_args(argv)
+
+    try:
+        summary = summarize(os.path.abspath(args.out_dir), args.cores, args.top)
+    except FileNotFoundError as e:
+        print(f"✗ {e}")
+        return 1
+    print_summary(summary)
+    if args.json:
+        tmp = f'{args.json}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(summary, f, indent=1)
+        os.replace(tmp, args.json)
+        print(f"✓ Summary written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
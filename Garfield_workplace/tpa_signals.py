@@ -0,0 +1,242 @@
+"""Readers for the Diamond_4p signal outputs.
+
+``read_text`` parses ``TPA_simulation_*.txt``: one block per Hcenter made of
+a header line (Hcenter, beam position, carriers, q_total), a separator and
+one ``t f fe fh`` line per time bin. ``read_binary`` memory-maps the file
+written with ``Diamond_4p --binary``:
+
+    char     magic[8]   "TPASIG1\\0"
+    uint64   header_bytes                  (multiple of 65536, little endian)
+    JSON header padded with spaces         (position, time step, nH, nt, ...)
+    float64  signal[nH][nt][3]             {total, electron, hole}
+    float64  events[nH][3]                 {Hcenter_um, TPA_carriers, q_total_fC}, NaN if not written
+
+Both return arrays laid out ``[Hcenter, time_bin, {total, electron, hole}]``;
+``write_text``/``write_binary`` write ``Signals`` back in the same formats.
+``open_sweep`` maps the binary outputs of a whole sweep next to each other
+in one address range, so the sweep is a single ``(x, y, H, t, component)``
+array backed by the files' page cache, without copying.
+
+Usage:
+    from tpa_signals import open_sweep, read
+    sig = read('TPA_results_sweep/TPA_simulation_x2.5_y2.5_dt1_c1e-3.bin')
+    sig.signal[:, :, 0]           # total induced current, (nH, nt)
+
+    sweep = open_sweep('TPA_results_sweep')
+    sweep.signal[2, 3, 100, :, 0]     # x index 2, y index 3, event 100
+"""
+import ctypes
+import glob
+import json
+import mmap
+import os
+import re
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+COMPONENTS = ('total', 'electron', 'hole')
+SIGNAL_MAGIC = b'TPASIG1\0'
+SIGNAL_HEADER = struct.Struct('<8sQ')
+# Header alignment: a multiple of every page size (16 KiB on Apple silicon) and
+# of the 64 KiB Windows allocation granularity, so the data can be mmapped
+SIGNAL_PAGE = 65536
+MAP_FIXED = 0x10  # Same value on Linux and macOS; not exported by the mmap module
+
+Signals = namedtuple('Signals', 'hcenter carriers q_total x0 y0 t signal')
+
+_HEADER = re.compile(r'Hcenter = (\S+) μm\s+x0 = (\S+) μm\s+y0 = (\S+) μm\s+'
+                     r'TPA_carriers = (\S+) q_total = (\S+) fC')
+
+
+def read_text(path):
+    """Parse a text output into ``Signals`` (``signal`` shaped (nH, nt, 3))."""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    headers = list(_HEADER.finditer(text))
+    if not headers:
+        raise ValueError(f'{path}: no Hcenter blocks found')
+    meta = np.array([[float(v) for v in m.groups()] for m in headers])
+    # Signal lines of all blocks, without their header and separator lines
+    bodies = []
+    for m, following in zip(headers, headers[1:] + [None]):
+        body = text[m.end():following.start() if following else len(text)]
+        bodies.append(body.split('\n', 2)[-1])
+    values = np.array(' '.join(bodies).split(), dtype=np.float64)
+    nh = len(headers)
+    if values.size % (4 * nh):
+        raise ValueError(f'{path}: blocks have different numbers of time bins')
+    values = values.reshape(nh, -1, 4)
+    return Signals(hcenter=meta[:, 0], carriers=meta[:, 3], q_total=meta[:, 4],
+                   x0=meta[0, 1], y0=meta[0, 2], t=values[0, :, 0].copy(),
+                   signal=values[:, :, 1:])
+
+
+def read_header(path):
+    """JSON header of a binary output, plus ``data_offset``/``events_offset`` in bytes."""
+    with open(path, 'rb') as f:
+        magic, header_bytes = SIGNAL_HEADER.unpack(f.read(SIGNAL_HEADER.size))
+        if magic != SIGNAL_MAGIC:
+            raise ValueError(f'{path}: not a binary TPA signal file')
+        header = json.loads(f.read(header_bytes - SIGNAL_HEADER.size).decode())
+    header['data_offset'] = header_bytes
+    header['events_offset'] = header_bytes + header['nH'] * header['nt'] * 3 * 8
+    return header
+
+
+def read_binary(path):
+    """Memory-map a binary output into ``Signals``; ``signal`` is a read-only view of the file."""
+    header = read_header(path)
+    nh, nt = header['nH'], header['nt']
+    signal = np.memmap(path, dtype='<f8', mode='r', offset=header['data_offset'], shape=(nh, nt, 3))
+    events = np.fromfile(path, dtype='<f8', count=nh * 3, offset=header['events_offset']).reshape(nh, 3)
+    return Signals(hcenter=events[:, 0], carriers=events[:, 1], q_total=events[:, 2],
+                   x0=header['x0_um'], y0=header['y0_um'],
+                   t=header['t0_ns'] + header['dt_ns'] * np.arange(nt), signal=signal)
+
+
+def read(path):
+    """``read_binary`` for ``.bin`` files, ``read_text`` otherwise."""
+    return read_binary(path) if str(path).endswith('.bin') else read_text(path)
+
+
+def write_text(path, signals):
+    """Write ``signals`` in the Diamond_4p text layout."""
+    lines = []
+    for j, hcenter in enumerate(signals.hcenter):
+        lines.append(f"Hcenter = {hcenter:g} μm  x0 = {signals.x0:g} μm  y0 = {signals.y0:g} μm  "
+                     f"TPA_carriers = {int(signals.carriers[j])} q_total = {signals.q_total[j]:g} fC\n")
+        lines.append('*' * 44 + '\n')
+        rows = np.column_stack([signals.t, signals.signal[j]])
+        lines.append(''.join('%g  %g  %g  %g\n' % tuple(row) for row in rows.tolist()))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+
+def write_binary(path, signals, header):
+    """Write ``signals`` in the ``--binary`` layout; ``header`` adds to the JSON header."""
+    nh, nt = np.shape(signals.signal)[:2]
+    t = np.asarray(signals.t)
+    header = dict({'format': 'TPASIG1', 'x0_um': float(signals.x0), 'y0_um': float(signals.y0)}, **header,
+                  nH=nh, nt=nt, t0_ns=float(t[0]), dt_ns=float(t[1] - t[0]) if nt > 1 else 0.0,
+                  components=list(COMPONENTS), events=['Hcenter_um', 'TPA_carriers', 'q_total_fC'])
+    text = json.dumps(header).encode()
+    header_bytes = -(-(SIGNAL_HEADER.size + len(text)) // SIGNAL_PAGE) * SIGNAL_PAGE
+    events = np.column_stack([signals.hcenter, signals.carriers, signals.q_total])
+    with open(path, 'wb') as f:
+        f.write(SIGNAL_HEADER.pack(SIGNAL_MAGIC, header_bytes))
+        f.write(text.ljust(header_bytes - SIGNAL_HEADER.size))
+        f.write(np.ascontiguousarray(signals.signal, dtype='<f8').tobytes())
+        f.write(np.ascontiguousarray(events, dtype='<f8').tobytes())
+
+
+def collected_charge(signals, component=0):
+    """Integral of the induced current over the time window, per Hcenter."""
+    dt = signals.t[1] - signals.t[0] if len(signals.t) > 1 else 1.0
+    return signals.signal[:, :, component].sum(axis=1) * dt
+
+
+class _Mapping:
+    """An address range holding file mappings; unmapped when garbage collected."""
+
+    _libc = None
+
+    def __init__(self, size):
+        if _Mapping._libc is None:
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.mmap.restype = ctypes.c_void_p
+            libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int,
+                                  ctypes.c_int, ctypes.c_long]
+            libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+            _Mapping._libc = libc
+        self.size = size
+        # Reserve the range with zero pages; missing points of a sweep read as zeros
+        self.address = self._map(None, size, mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS, -1, 0)
+
+    def _map(self, address, size, flags, fd, offset):
+        result = self._libc.mmap(address, size, mmap.PROT_READ, flags, fd, offset)
+        if result in (None, ctypes.c_void_p(-1).value):
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'mmap failed: {os.strerror(errno)}')
+        return result
+
+    def map_file(self, at, path, offset, size):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._map(self.address + at, size, mmap.MAP_SHARED | MAP_FIXED, fd, offset)
+        finally:
+            os.close(fd)
+
+    def buffer(self):
+        buf = (ctypes.c_char * self.size).from_address(self.address)
+        buf._mapping = self  # Arrays built on the buffer keep the mapping alive
+        return buf
+
+    def __del__(self):
+        if self._libc is not None and getattr(self, 'address', None):
+            self._libc.munmap(self.address, self.size)
+
+
+SweepSignals = namedtuple('SweepSignals', 'x y hcenter t signal events available header paths')
+
+
+def open_sweep(source, time_step=None, conductivity=None):
+    """Map the binary outputs of a sweep into one ``(x, y, H, t, component)`` array.
+
+    ``source`` is a sweep directory or a list of ``.bin`` files; files are
+    placed on the sorted grid of their beam positions. ``signal`` is a view of
+    the files themselves (page aligned, one slot per point), so nothing is
+    read until it is indexed; files whose data does not start on a page
+    boundary of this machine (older outputs with a 4 KiB header on a 16 KiB
+    page system) are copied in instead. Grid points without a file read as zeros and
+    are False in ``available``; ``events`` is ``(x, y, H, 3)`` with NaN for
+    events not written. A directory holding several time steps or
+    conductivities needs ``time_step``/``conductivity`` to select one.
+    """
+    paths = sorted(glob.glob(os.path.join(source, 'TPA_simulation_*.bin'))) \
+        if isinstance(source, (str, os.PathLike)) else list(source)
+    headers = [read_header(p) for p in paths]
+    selected = [(p, h) for p, h in zip(paths, headers)
+                if (time_step is None or h['time_step_ns'] == time_step)
+                and (conductivity is None or h['conductivity'] == str(conductivity))]
+    if not selected:
+        raise ValueError(f'{source}: no binary outputs found')
+    kinds = {(h['time_step_ns'], h['conductivity'], h['nH'], h['nt']) for _, h in selected}
+    if len(kinds) > 1:
+        raise ValueError(f'{source}: outputs differ in (time_step, conductivity, nH, nt): {sorted(kinds)}; '
+                         f'select one with time_step=/conductivity=')
+    header = selected[0][1]
+    nh, nt = header['nH'], header['nt']
+    xs = sorted({h['x0_um'] for _, h in selected})
+    ys = sorted({h['y0_um'] for _, h in selected})
+
+    slab = nh * nt * 3 * 8
+    slot = -(-slab // mmap.PAGESIZE) * mmap.PAGESIZE
+    mapping = _Mapping(slot * len(xs) * len(ys))
+    copies = {}
+    events = np.full((len(xs), len(ys), nh, 3), np.nan)
+    available = np.zeros((len(xs), len(ys)), dtype=bool)
+    grid_paths = np.full((len(xs), len(ys)), '', dtype=object)
+    for path, h in selected:
+        ix, iy = xs.index(h['x0_um']), ys.index(h['y0_um'])
+        if available[ix, iy]:
+            raise ValueError(f'{path}: duplicate point ({h["x0_um"]}, {h["y0_um"]}) with {grid_paths[ix, iy]}')
+        if h['data_offset'] % mmap.ALLOCATIONGRANULARITY:
+            copies[ix, iy] = np.memmap(path, dtype='<f8', mode='r', offset=h['data_offset'], shape=(nh, nt, 3))
+        else:
+            mapping.map_file((ix * len(ys) + iy) * slot, path, h['data_offset'], slab)
+        events[ix, iy] = np.fromfile(path, dtype='<f8', count=nh * 3, offset=h['events_offset']).reshape(nh, 3)
+        available[ix, iy] = True
+        grid_paths[ix, iy] = path
+    signal = np.ndarray((len(xs), len(ys), nh, nt, 3), dtype='<f8', buffer=mapping.buffer(),
+                        strides=(len(ys) * slot, slot, nt * 3 * 8, 3 * 8, 8))
+    if copies:
+        signal = np.array(signal)
+        for (ix, iy), data in copies.items():
+            signal[ix, iy] = data
+    signal.flags.writeable = False
+    hcenter = np.nanmax(events[..., 0], axis=(0, 1)) if available.any() else np.full(nh, np.nan)
+    return SweepSignals(x=np.array(xs), y=np.array(ys), hcenter=hcenter,
+                        t=header['t0_ns'] + header['dt_ns'] * np.arange(nt), signal=signal,
+                        events=events, available=available, header=header, paths=grid_paths)
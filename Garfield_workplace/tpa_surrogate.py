@@ -0,0 +1,440 @@
+"""Deterministic Shockley-Ramo surrogate of Diamond_4p for fast TPA position scans.
+
+Diamond_4p drifts every TPA pair of every Hcenter with AvalancheMC, which
+takes hours per beam position. The surrogate follows one deterministic
+trajectory per LUT z bin and carrier type instead:
+
+* carriers start at (x0, y0, (k + 0.5) μm) and move along the drift field
+  -grad(phi) of nominal.dat with v = mu E / (1 + mu E / v_sat), the
+  low-field mobility and saturation velocity of MediumDiamond
+  (``--mobility``/``--saturation``). All z bins of both carrier types are
+  integrated together with midpoint steps of ``--step`` μm until a carrier
+  leaves the Diamond region or the time window ends; there is no diffusion.
+* the induced current is q v . grad(psi), with psi = <c>_000000_des.dat -
+  gnd.dat as in SetWeightingField, binned like Sensor (2000 bins of 5 ps).
+  With ``--delayed`` the slices at i * time_step
+  (SetDynamicWeightingPotential) add the delayed signal; Diamond_4p does
+  not call Sensor::EnableDelayedSignal, so it is off by default.
+
+Trajectories do not depend on Hcenter, so a beam position costs one batched
+integration and the pulses of all Hcenter follow from the LUT carrier counts
+times the per-bin currents (one matrix product). Outputs are named and laid
+out like tpa_sweep's (``t f fe fh`` text and/or tpa_signals binary), so
+tpa_signals, tpa_ingest and tpa_adaptive read them unchanged.
+
+``validate`` runs the surrogate at the positions of existing Diamond_4p
+outputs and reports the collected-charge ratio, the rms pulse deviation
+relative to the peak and the peak-time shift over their Hcenter.
+
+Usage:
+    python3 tpa_surrogate.py run --x 2.5 32.5 31 --y 2.5 32.5 31 --fieldmap-dir /tmp/DWF_Huazhen_c4
+    python3 tpa_surrogate.py run --x 17.5 17.5 1 --y 17.5 17.5 1 --conductivity 1e-3 1e-2 --format text
+    python3 tpa_surrogate.py validate ../Results/TPA_results_sweep -o validation.json
+
+    from tpa_surrogate import Surrogate
+    model = Surrogate.from_fieldmaps('/tmp/DWF_Huazhen_c4', '1e-3')
+    signals = model.simulate(17.5, 17.5)      # tpa_signals.Signals
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from tpa_ingest import _TASK_NAME, find_results
+from tpa_signals import Signals, collected_charge, read, write_binary, write_text
+from tpa_sweep import FORMATS, expand, grid, output_paths
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIELDMAP_DIR = '/tmp/DWF_Huazhen_c4'
+ELEMENTARY_CHARGE = 1.602176634e-4  # fC
+# Diamond_4p event and signal settings
+HCENTERS = np.arange(-50.0, 551.0)
+THICKNESS = 500.0  # μm
+N_BINS = 2000
+T_STEP = 0.005  # ns
+N_SLICES = 21
+# MediumDiamond transport: low-field mobility [cm2/(V ns)], saturation velocity [cm/ns]
+MOBILITY = {'electron': 4.551e-6, 'hole': 2.750e-6}
+SATURATION = {'electron': 2.6e-2, 'hole': 1.6e-2}
+# Bisection steps that place a carrier leaving the bulk on the boundary
+BOUNDARY_STEPS = 12
+
+
+def _import_wp_query():
+    """wp_query.py (with dfise/field_cache) lives next to this script or one level up."""
+    for path in (HERE, os.path.dirname(HERE)):
+        if os.path.exists(os.path.join(path, 'wp_query.py')) and path not in sys.path:
+            sys.path.append(path)
+    import wp_query
+    return wp_query
+
+
+def read_lut(path):
+    """``(z_um, h_um, lut)`` of ``LUT.bin`` via ``tpa_lut.read_lut_bin`` (Ground_control)."""
+    for folder in (HERE, os.path.join(os.path.dirname(HERE), 'Ground_control')):
+        if os.path.exists(os.path.join(folder, 'tpa_lut.py')) and folder not in sys.path:
+            sys.path.append(folder)
+    from tpa_lut import read_lut_bin
+    return read_lut_bin(path)
+
+
+def pair_counts(lut):
+    """Pairs Diamond_4p drifts per z bin, ``ceil(num_carrier)``, and its ``TPA_carriers`` per Hcenter.
+
+    ``TPA_carriers`` is an unsigned int accumulated bin by bin, so the
+    fractional part of each addition is dropped.
+    """
+    pairs = np.where(lut > 0, np.ceil(lut), 0.0)
+    nesum = np.zeros(lut.shape[1])
+    for row in lut:
+        nesum = np.floor(nesum + np.maximum(row, 0.0))
+    return pairs, nesum
+
+
+class Drift:
+    """Deterministic electron and hole transport in the drift field of a mesh."""
+
+    def __init__(self, mesh, potential, material='Diamond', mobility=None, saturation=None,
+                 step=1.0, t_max=N_BINS * T_STEP):
+        self.mesh = mesh
+        # E = -grad(phi): V/μm -> V/cm, constant within each tetrahedron
+        self.field = -potential.tet_gradient * 1e4
+        regions = [i for i, m in enumerate(mesh.grid.materials) if m == material]
+        self.bulk = np.isin(mesh.tet_region, regions) & np.isfinite(self.field).all(axis=1)
+        self.mobility = dict(MOBILITY, **(mobility or {}))
+        self.saturation = dict(SATURATION, **(saturation or {}))
+        self.step = step
+        self.t_max = t_max
+        self._cache = {}
+
+    @classmethod
+    def from_fieldmaps(cls, fieldmap_dir, cache=True, **kwargs):
+        wp_query = _import_wp_query()
+        mesh = wp_query.Mesh.load(os.path.join(fieldmap_dir, 'nominal.grd'), cache=cache)
+        return cls(mesh, mesh.field(os.path.join(fieldmap_dir, 'nominal.dat'), cache=cache), **kwargs)
+
+    def locate(self, points):
+        """``Mesh.locate`` restricted to the drift region (-1 outside)."""
+        element, weights = self.mesh.locate(points)
+        element[element >= 0] = np.where(self.bulk[element[element >= 0]], element[element >= 0], -1)
+        return element, weights
+
+    def velocity(self, element, charge):
+        """Drift velocity [μm/ns] of carriers of ``charge`` (+1 hole, -1 electron) in ``element``."""
+        e = self.field[element]
+        magnitude = np.linalg.norm(e, axis=1)
+        mu = np.where(charge > 0, self.mobility['hole'], self.mobility['electron'])
+        vsat = np.where(charge > 0, self.saturation['hole'], self.saturation['electron'])
+        speed = mu * magnitude / (1.0 + mu * magnitude / vsat)
+        direction = np.divide(e, magnitude[:, None], out=np.zeros_like(e), where=magnitude[:, None] > 0)
+        return charge[:, None] * direction * (speed * 1e4)[:, None]
+
+    def trajectories(self, starts, charge):
+        """Integrate all carriers at once; returns ``(t, element, weights)`` per step.
+
+        Arrays are (steps + 1, n) and (steps + 1, n, 4); a carrier that
+        stopped keeps its last state, so every column is a full path.
+        """
+        pos = np.array(starts, dtype=np.float64)
+        charge = np.asarray(charge, dtype=np.float64)
+        t = np.zeros(len(pos))
+        element, weights = self.locate(pos)
+        alive = element >= 0
+        history = [(t.copy(), element.copy(), weights.copy())]
+        while alive.any():
+            idx = np.flatnonzero(alive)
+            v0 = self.velocity(element[idx], charge[idx])
+            speed = np.linalg.norm(v0, axis=1)
+            moving = speed > 0
+            dt = np.where(moving, self.step / np.where(moving, speed, 1.0), 0.0)
+            dt = np.minimum(dt, self.t_max - t[idx])
+            mid_element, _ = self.locate(pos[idx] + v0 * (dt / 2)[:, None])
+            v = v0.copy()
+            v[mid_element >= 0] = self.velocity(mid_element[mid_element >= 0], charge[idx][mid_element >= 0])
+            new = pos[idx] + v * dt[:, None]
+            new_element, new_weights = self.locate(new)
+            left = new_element < 0
+            if left.any():
+                # Stop on the boundary: last inside fraction of the step
+                lo, hi = np.zeros(left.sum()), np.ones(left.sum())
+                start, delta = pos[idx][left], (new - pos[idx])[left]
+                for _ in range(BOUNDARY_STEPS):
+                    mid = (lo + hi) / 2
+                    inside = self.locate(start + delta * mid[:, None])[0] >= 0
+                    lo, hi = np.where(inside, mid, lo), np.where(inside, hi, mid)
+                new[left] = start + delta * lo[:, None]
+                dt[left] *= lo
+                new_element[left], new_weights[left] = self.locate(new[left])
+                # Rounding may put the boundary point just outside: keep the old element
+                lost = left & (new_element < 0)
+                new_element[lost], new_weights[lost] = element[idx][lost], weights[idx][lost]
+            pos[idx], t[idx] = new, t[idx] + dt
+            element[idx], weights[idx] = new_element, new_weights
+            alive[idx[left | ~moving | (t[idx] >= self.t_max)]] = False
+            history.append((t.copy(), element.copy(), weights.copy()))
+        t, element, weights = (np.stack(a) for a in zip(*history))
+        return t, element, weights
+
+    def paths(self, x0, y0, z):
+        """Electron then hole trajectories from (x0, y0, z) for every z, cached per position."""
+        key = (float(x0), float(y0), len(z))
+        if key not in self._cache:
+            starts = np.column_stack([np.full(len(z), x0), np.full(len(z), y0), z])
+            charge = np.repeat([-1.0, 1.0], len(z))
+            self._cache = {key: (self.trajectories(np.vstack([starts, starts]), charge), charge)}
+        return self._cache[key]
+
+
+def _bin_charge(t, q, edges):
+    """Induced charge ``q`` (steps, n) at times ``t`` evaluated at the bin ``edges`` (n, bins + 1)."""
+    out = np.empty((q.shape[1], len(edges)))
+    for n in range(q.shape[1]):
+        out[n] = np.interp(edges, t[:, n], q[:, n])
+    return out
+
+
+class Surrogate:
+    """Induced signals of Diamond_4p events for one weighting potential set."""
+
+    def __init__(self, drift, weighting, dynamic=(), time_step=1.0, lut=os.path.join(HERE, 'LUT.bin'),
+                 conductivity=''):
+        self.drift = drift
+        self.weighting = weighting
+        self.dynamic = list(dynamic)
+        self.time_step = time_step
+        self.conductivity = conductivity
+        z, h, values = read_lut(lut) if isinstance(lut, (str, os.PathLike)) else lut
+        columns = [int(np.argmin(np.abs(h - hc))) for hc in HCENTERS]
+        missing = [hc for hc, i in zip(HCENTERS, columns) if abs(h[i] - hc) > 1e-6]
+        if missing:
+            raise ValueError(f'Hcenter {missing[0]:g} μm not found in the LUT')
+        self.z = np.arange(len(z)) + 0.5
+        keep = self.z <= THICKNESS
+        self.z = self.z[keep]
+        self.pairs, self.nesum = pair_counts(np.asarray(values)[keep][:, columns])
+        self.t = (np.arange(N_BINS) + 0.5) * T_STEP
+
+    @classmethod
+    def from_fieldmaps(cls, fieldmap_dir=DEFAULT_FIELDMAP_DIR, conductivity='1e-3', time_step=1.0,
+                       delayed=False, drift=None, cache=True, **kwargs):
+        """Surrogate for ``Diamond_4p --fieldmap-dir fieldmap_dir --conductivity c``; ``drift`` can be shared."""
+        drift = drift or Drift.from_fieldmaps(fieldmap_dir, cache=cache)
+        gnd = os.path.join(fieldmap_dir, 'gnd.dat')
+        slices = [os.path.join(fieldmap_dir, conductivity, f'{conductivity}_{i:06d}_des.dat')
+                  for i in range(N_SLICES if delayed else 1)]
+        fields = [drift.mesh.field(path, reference=gnd, cache=cache) for path in slices]
+        return cls(drift, fields[0], fields[1:], time_step, conductivity=conductivity, **kwargs)
+
+    def currents(self, x0, y0):
+        """Unit-pair currents [fC/ns] of every z bin: ``(electron, hole)``, each (nz, nt)."""
+        (t, element, weights), charge = self.drift.paths(x0, y0, self.z)
+        steps, n = element.shape
+        flat_element, flat_weights = element.ravel(), weights.reshape(-1, 4)
+        psi = np.nan_to_num(self.weighting.at(flat_element, flat_weights)[0].reshape(steps, n))
+        # Ramo: induced charge q (psi(x) - psi(x0)) along the path
+        q = charge * (psi - psi[:1])
+        edges = np.arange(N_BINS + 1) * T_STEP
+        induced = _bin_charge(t, q, edges)
+        if self.dynamic:
+            induced += self._delayed(t, charge, flat_element, flat_weights, psi, edges)
+        current = np.diff(induced, axis=1) * (ELEMENTARY_CHARGE / T_STEP)
+        nz = len(self.z)
+        return current[:nz], current[nz:]
+
+    def _delayed(self, t, charge, element, weights, psi, edges):
+        """Delayed induced charge at ``edges``: sum over steps of q [D(x_i+1, t - t_i) - D(x_i, t - t_i)].
+
+        D(x, tau) = psi(x, tau) - psi(x, 0) is linear in tau between the
+        slices and constant after the last one, so each slice contributes its
+        step increments convolved with its hat function in time.
+        """
+        steps, n = t.shape
+        taus = np.arange(len(self.dynamic) + 1) * self.time_step
+        lag = edges - edges[0]
+        start = np.clip(np.searchsorted(edges, t[:-1], side='right') - 1, 0, len(edges) - 1)
+        rows = np.broadcast_to(np.arange(n), start.shape)
+        size = 2 * len(edges)
+        total = np.zeros((n, len(edges)))
+        for j, field in enumerate(self.dynamic, start=1):
+            d = np.nan_to_num(field.at(element, weights)[0].reshape(steps, n)) - psi
+            impulses = np.zeros((n, len(edges)))
+            np.add.at(impulses, (rows, start), charge * np.diff(d, axis=0))
+            if j < len(self.dynamic):
+                hat = np.interp(lag, taus[j - 1:j + 2], [0.0, 1.0, 0.0])
+            else:
+                hat = np.interp(lag, taus[j - 1:j + 1], [0.0, 1.0])
+            spectrum = np.fft.rfft(impulses, size, axis=1) * np.fft.rfft(hat, size)
+            total += np.fft.irfft(spectrum, size, axis=1)[:, :len(edges)]
+        return total
+
+    def simulate(self, x0, y0):
+        """``Signals`` of all Hcenter at beam position (x0, y0) μm."""
+        electron, hole = self.currents(x0, y0)
+        fe, fh = self.pairs.T @ electron, self.pairs.T @ hole
+        return Signals(hcenter=HCENTERS.copy(), carriers=self.nesum, q_total=self.nesum * ELEMENTARY_CHARGE,
+                       x0=x0, y0=y0, t=self.t, signal=np.stack([fe + fh, fe, fh], axis=-1))
+
+    def header(self):
+        """Binary header fields describing the surrogate run."""
+        drift = self.drift
+        return {'time_step_ns': self.time_step, 'conductivity': self.conductivity, 'macro_carriers': 0,
+                'seed': 0, 'surrogate': {'step_um': drift.step, 'mobility': drift.mobility,
+                                         'saturation': drift.saturation, 'delayed': bool(self.dynamic)}}
+
+
+def write(signals, paths, header):
+    """Write ``signals`` to each of ``paths`` (by suffix) through a temporary file."""
+    for path in paths:
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            if path.endswith('.bin'):
+                write_binary(tmp, signals, header)
+            else:
+                write_text(tmp, signals)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+
+def compare(reference, surrogate):
+    """Per-Hcenter agreement of two ``Signals`` on their common Hcenter values."""
+    common, ri, si = np.intersect1d(np.round(reference.hcenter, 6), np.round(surrogate.hcenter, 6),
+                                    return_indices=True)
+    ref, sur = np.asarray(reference.signal)[ri, :, 0], np.asarray(surrogate.signal)[si, :, 0]
+    if ref.shape != sur.shape:
+        raise ValueError(f'time bins differ: {ref.shape[1]} vs {sur.shape[1]}')
+    q_ref, q_sur = collected_charge(reference)[ri], collected_charge(surrogate)[si]
+    peak = np.abs(ref).max(axis=1)
+    valid = peak > 0
+    rms = np.sqrt(((sur - ref) ** 2).mean(axis=1))[valid] / peak[valid]
+    ratio = q_sur[valid & (q_ref != 0)] / q_ref[valid & (q_ref != 0)]
+    shift = (np.abs(sur).argmax(axis=1) - np.abs(ref).argmax(axis=1))[valid] * (reference.t[1] - reference.t[0])
+    return {'hcenter': common[valid], 'charge_ratio': ratio, 'rms_over_peak': rms, 'peak_shift_ns': shift}
+
+
+def _summary(metrics):
+    out = {'events': int(len(metrics['hcenter']))}
+    for name in ('charge_ratio', 'rms_over_peak', 'peak_shift_ns'):
+        values = metrics[name]
+        if len(values):
+            out[name] = {'median': float(np.median(values)), 'p10': float(np.percentile(values, 10)),
+                         'p90': float(np.percentile(values, 90))}
+    return out
+
+
+def validate(paths, fieldmap_dir, time_step=1.0, conductivity='1e-3', tolerance=0.2, drift=None, **kwargs):
+    """Compare the surrogate with Diamond_4p outputs; returns ``(report, n_outside_tolerance)``."""
+    models, report, failed = {}, [], 0
+    for path in paths:
+        dt, c = time_step, conductivity
+        match = _TASK_NAME.search(path)
+        if match:
+            dt, c = float(match.group(1)), match.group(2)
+        reference = read(path)
+        key = (c, dt)
+        if key not in models:
+            models[key] = Surrogate.from_fieldmaps(fieldmap_dir, c, dt, drift=drift, **kwargs)
+            drift = models[key].drift
+        start = time.perf_counter()
+        surrogate = models[key].simulate(float(reference.x0), float(reference.y0))
+        summary = _summary(compare(reference, surrogate))
+        summary.update(path=path, x0=float(reference.x0), y0=float(reference.y0), time_step=dt,
+                       conductivity=c, seconds=time.perf_counter() - start)
+        report.append(summary)
+        rms = summary.get('rms_over_peak', {}).get('median', np.inf)
+        ratio = summary.get('charge_ratio', {}).get('median', np.nan)
+        ok = rms <= tolerance
+        failed += not ok
+        print(f"  {'✓' if ok else '⚠️'} {os.path.basename(path)}: charge ratio {ratio:.3f}, "
+              f"rms/peak {rms:.3f} (median of {summary['events']} events)")
+    return report, failed
+
+
+def add_model_arguments(parser):
+    parser.add_argument('--fieldmap-dir', default=DEFAULT_FIELDMAP_DIR, help='Diamond_4p --fieldmap-dir')
+    parser.add_argument('--lut', default=os.path.join(HERE, 'LUT.bin'), help='binary charge LUT')
+    parser.add_argument('--step', type=float, default=1.0, help='trajectory step [um] (AvalancheMC: 1 um)')
+    parser.add_argument('--mobility', type=float, nargs=2, metavar=('E', 'H'),
+                        default=[MOBILITY['electron'], MOBILITY['hole']], help='low-field mobility [cm2/(V ns)]')
+    parser.add_argument('--saturation', type=float, nargs=2, metavar=('E', 'H'),
+                        default=[SATURATION['electron'], SATURATION['hole']], help='saturation velocity [cm/ns]')
+    parser.add_argument('--delayed', action='store_true',
+                        help='add the delayed signal of the dynamic weighting potential slices')
+
+
+def _drift(args):
+    return Drift.from_fieldmaps(args.fieldmap_dir, step=args.step,
+                                mobility=dict(zip(('electron', 'hole'), args.mobility)),
+                                saturation=dict(zip(('electron', 'hole'), args.saturation)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Deterministic Ramo surrogate of Diamond_4p')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('run', help='simulate an (x, y, time_step, conductivity) grid')
+    p.add_argument('--x', type=float, nargs=3, metavar=('MIN', 'MAX', 'N'), default=[2.5, 32.5, 7],
+                   help='beam x grid [um]')
+    p.add_argument('--y', type=float, nargs=3, metavar=('MIN', 'MAX', 'N'), default=[2.5, 32.5, 7],
+                   help='beam y grid [um]')
+    p.add_argument('-o', '--out-dir', default='TPA_results_surrogate')
+    p.add_argument('--time-step', type=float, nargs='+', default=[1.0], help='weighting field time step(s) [ns]')
+    p.add_argument('--conductivity', nargs='+', default=['1e-3'], help='weighting potential set(s)')
+    p.add_argument('--format', choices=sorted(FORMATS), default='binary',
+                   help='signal output (binary is much faster to write than text)')
+    p.add_argument('--force', action='store_true', help='simulate points whose output exists')
+    add_model_arguments(p)
+
+    p = sub.add_parser('validate', help='compare with existing Diamond_4p outputs')
+    p.add_argument('results', nargs='+', help='result directories or globs (TPA_simulation_*.txt/.bin)')
+    p.add_argument('--time-step', type=float, default=1.0, help='for files whose name does not carry one')
+    p.add_argument('--conductivity', default='1e-3', help='for files whose name does not carry one')
+    p.add_argument('--tolerance', type=float, default=0.2, help='accepted median rms deviation / peak')
+    p.add_argument('-o', '--report', help='write the per-file summary as JSON')
+    add_model_arguments(p)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    drift = _drift(args)
+    print(f"Drift field loaded ({time.perf_counter() - start:.1f} s)")
+    model_args = {'drift': drift, 'delayed': args.delayed, 'lut': args.lut}
+
+    if args.command == 'validate':
+        paths = find_results(args.results)
+        if not paths:
+            parser.error('no TPA_simulation_* files found')
+        report, failed = validate(paths, args.fieldmap_dir, args.time_step, args.conductivity,
+                                  args.tolerance, **model_args)
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=1)
+        print(f"Done in {time.perf_counter() - start:.1f} s: {len(paths) - failed}/{len(paths)} within "
+              f"tolerance {args.tolerance:g}")
+        return 1 if failed else 0
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    tasks = expand(grid(*args.x), grid(*args.y), args.time_step, args.conductivity, args.format)
+    models, done = {}, 0
+    for task in tasks:
+        paths = output_paths(args.out_dir, task)
+        if not args.force and all(os.path.exists(p) for p in paths):
+            continue
+        key = (task['conductivity'], task['time_step'])
+        if key not in models:
+            models[key] = Surrogate.from_fieldmaps(args.fieldmap_dir, *key, **model_args)
+        signals = models[key].simulate(task['x'], task['y'])
+        write(signals, paths, models[key].header())
+        done += 1
+        print(f"  ✓ {task['id']}")
+    print(f"Done in {time.perf_counter() - start:.1f} s: {done} point(s) simulated, "
+          f"{len(tasks) - done} already present -> {args.out_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
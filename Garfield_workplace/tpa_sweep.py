@@ -0,0 +1,405 @@
+"""Resumable local scheduler for Diamond_4p TPA sweeps.
+
+Expands an (x, y, time_step, conductivity) sweep into tasks and runs them
+through a bounded pool of Diamond_4p processes sized to the machine. Every
+task's status, wall time, return code and output checksum is kept in
+``<out>/manifest.json`` (rewritten atomically after each task), so rerunning
+the same command after an interruption or failures runs only the points that
+are missing. Points finished with other Diamond_4p flags (--macro, --seed,
+--workers, field maps) or by another build are run again. Diamond_4p is
+rebuilt only when the hash of its sources changed.
+
+Outputs are ``<out>/TPA_simulation_<task>.txt`` and/or ``.bin`` (``--format``,
+see tpa_signals.py) with the log of each job in ``<out>/job_<task>.log``; a
+job's outputs are only moved into place once the job has succeeded. Each job
+also records its phase and event timings in ``<out>/metrics_<task>.jsonl``
+and the sweep its build/staging/pool phases in ``<out>/sweep_metrics.jsonl``;
+summarise them with ``python3 tpa_metrics.py <out>``.
+
+Usage:
+    python3 tpa_sweep.py --x 2.5 32.5 7 --y 2.5 32.5 7 --time-step 1.0
+    python3 tpa_sweep.py --x 2.5 32.5 7 --y 2.5 32.5 7 --conductivity 1e-3 1e-2 --workers 4
+    python3 tpa_sweep.py --x 2.5 32.5 7 --y 2.5 32.5 7 --stage-fieldmaps
+    python3 tpa_sweep.py -o TPA_results_sweep --status
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tpa_metrics import SWEEP_METRICS, MetricsLog
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCES = ('Diamond_4p.C', 'CMakeLists.txt')
+EXECUTABLE = 'Diamond_4p'
+MANIFEST = 'manifest.json'
+DONE_MARKER = b'DONE !'
+FORMATS = {'text': ('.txt',), 'binary': ('.bin',), 'both': ('.txt', '.bin')}
+
+# Seconds between checks of a running job, and how long a job may keep running
+# after printing the DONE marker before it is terminated (ROOT sometimes hangs
+# on exit once the output is complete)
+POLL_SECONDS = 1.0
+EXIT_GRACE_SECONDS = 30.0
+
+
+def file_sha256(path, chunk_bytes=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_bytes), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_hash(root=HERE, sources=SOURCES):
+    digest = hashlib.sha256()
+    for name in sources:
+        digest.update(name.encode())
+        digest.update(file_sha256(os.path.join(root, name)).encode())
+    return digest.hexdigest()
+
+
+def _configured(build_dir):
+    """True when ``build_dir`` has a Makefile generated by a cache of this very directory."""
+    cache = os.path.join(build_dir, 'CMakeCache.txt')
+    if not os.path.exists(os.path.join(build_dir, 'Makefile')) or not os.path.exists(cache):
+        return False
+    with open(cache, errors='replace') as f:
+        for line in f:
+            if line.startswith('CMAKE_CACHEFILE_DIR:'):
+                return os.path.realpath(line.split('=', 1)[1].strip()) == os.path.realpath(build_dir)
+    return False
+
+
+def build(root=HERE, jobs=None, force=False):
+    """Configure and build Diamond_4p in ``<root>/build`` unless the sources are unchanged."""
+    build_dir = os.path.join(root, 'build')
+    exe = os.path.join(build_dir, EXECUTABLE)
+    stamp = os.path.join(build_dir, '.source_hash')
+    digest = source_hash(root)
+    if not force and os.path.exists(exe) and os.path.exists(stamp):
+        with open(stamp) as f:
+            if f.read().strip() == digest:
+                print(f"✓ {EXECUTABLE} is up to date, skipping build")
+                return exe, digest
+    print(f"Building {EXECUTABLE}...")
+    os.makedirs(build_dir, exist_ok=True)
+    if not _configured(build_dir):
+        # A cache from another checkout (or machine) makes cmake refuse to run
+        for name in ('CMakeCache.txt', 'CMakeFiles'):
+            path = os.path.join(build_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        subprocess.run(['cmake', '-S', root, '-B', build_dir], check=True)
+    subprocess.run(['make', f'-j{jobs or os.cpu_count()}'], cwd=build_dir, check=True)
+    with open(stamp, 'w') as f:
+        f.write(digest + '\n')
+    print(f"✓ Compilation successful!")
+    return exe, digest
+
+
+def grid(start, stop, n):
+    """``n`` evenly spaced positions from ``start`` to ``stop`` (inclusive)."""
+    n = int(n)
+    if n == 1:
+        return [float(start)]
+    return [round(start + i * (stop - start) / (n - 1), 6) for i in range(n)]
+
+
+def task_id(x, y, time_step, conductivity):
+    return f"x{x:g}_y{y:g}_dt{time_step:g}_c{conductivity}"
+
+
+def make_task(x, y, time_step, conductivity, fmt='text'):
+    return {'id': task_id(x, y, time_step, conductivity), 'x': x, 'y': y,
+            'time_step': time_step, 'conductivity': conductivity, 'format': fmt}
+
+
+def expand(xs, ys, time_steps, conductivities, fmt='text'):
+    """One task per (x, y, time_step, conductivity) combination."""
+    return [make_task(x, y, dt, c, fmt)
+            for c, dt, x, y in itertools.product(conductivities, time_steps, xs, ys)]
+
+
+def output_paths(out_dir, task):
+    """Output files of a task, text first."""
+    return [os.path.join(out_dir, f"TPA_simulation_{task['id']}{suffix}")
+            for suffix in FORMATS[task.get('format', 'text')]]
+
+
+class Manifest:
+    """Per-task records of a sweep directory, stored as JSON."""
+
+    def __init__(self, out_dir, settings=None):
+        self.out_dir = out_dir
+        self.path = os.path.join(out_dir, MANIFEST)
+        self.tasks = {}
+        self.info = {}
+        # Run settings (Diamond_4p flags and source hash) an output must have been made with
+        self.settings = settings
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            self.tasks = data.get('tasks', {})
+            self.info = data.get('info', {})
+
+    def save(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'info': self.info, 'tasks': self.tasks}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def output_path(self, task):
+        """Preferred output to read a task back from (binary when there is one)."""
+        return output_paths(self.out_dir, task)[-1]
+
+    def is_complete(self, task, verify=False):
+        record = self.tasks.get(task['id'])
+        if not record or record.get('status') != 'done':
+            return False
+        if record.get('format', 'text') != task.get('format', 'text'):
+            return False
+        if self.settings is not None and record.get('settings') != self.settings:
+            return False
+        for output in output_paths(self.out_dir, task):
+            expected = record.get('outputs', {}).get(os.path.basename(output), {})
+            if not os.path.exists(output) or os.path.getsize(output) != expected.get('size'):
+                return False
+            if verify and file_sha256(output) != expected.get('sha256'):
+                return False
+        return True
+
+    def counts(self):
+        counts = {}
+        for record in self.tasks.values():
+            counts[record.get('status')] = counts.get(record.get('status'), 0) + 1
+        return counts
+
+
+def _log_has_marker(log_path, tail_bytes=4096):
+    try:
+        with open(log_path, 'rb') as f:
+            f.seek(max(0, os.path.getsize(log_path) - tail_bytes))
+            return DONE_MARKER in f.read()
+    except OSError:
+        return False
+
+
+def _stop(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_task(exe, task, out_dir, extra_args=(), timeout=None, cwd=HERE):
+    """Run one Diamond_4p job; returns the task's manifest record."""
+    outputs = output_paths(out_dir, task)
+    partials = [output + '.partial' for output in outputs]
+    log_path = os.path.join(out_dir, f"job_{task['id']}.log")
+    metrics_path = os.path.join(out_dir, f"metrics_{task['id']}.jsonl")
+    if os.path.exists(metrics_path):
+        os.remove(metrics_path)  # a retry starts a fresh record
+    command = [exe, f"{task['x']:g}", f"{task['y']:g}", f"{task['time_step']:g}",
+               '--conductivity', str(task['conductivity']), '--metrics', metrics_path]
+    for output, partial in zip(outputs, partials):
+        command += ['--binary', partial] if output.endswith('.bin') else ['--output', partial]
+    if not outputs[0].endswith('.txt'):
+        command.append('--no-text')
+    command += list(extra_args)
+    record = dict(task, status='failed', log=os.path.basename(log_path), metrics=os.path.basename(metrics_path),
+                  started=time.strftime('%Y-%m-%d %H:%M:%S'), command=command)
+    start = time.perf_counter()
+    with open(log_path, 'wb') as log:
+        process = subprocess.Popen(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        done_since = None
+        while process.poll() is None:
+            time.sleep(POLL_SECONDS)
+            elapsed = time.perf_counter() - start
+            if done_since is None and _log_has_marker(log_path):
+                done_since = elapsed
+            if done_since is not None and elapsed - done_since > EXIT_GRACE_SECONDS:
+                # Output is complete; the process is stuck tearing down
+                _stop(process)
+                record['terminated_after_done'] = True
+                break
+            if timeout and elapsed > timeout:
+                _stop(process)
+                record['error'] = f'timeout after {timeout:g} s'
+                break
+    record['wall_seconds'] = round(time.perf_counter() - start, 3)
+    record['returncode'] = process.returncode
+    complete = _log_has_marker(log_path) and all(os.path.exists(partial) for partial in partials)
+    if complete and (process.returncode == 0 or record.get('terminated_after_done')):
+        record['outputs'] = {}
+        for output, partial in zip(outputs, partials):
+            os.replace(partial, output)
+            record['outputs'][os.path.basename(output)] = {'size': os.path.getsize(output),
+                                                           'sha256': file_sha256(output)}
+        record['status'] = 'done'
+    elif 'error' not in record:
+        record['error'] = f'exit code {process.returncode}' + ('' if complete else ', no DONE marker/output')
+    return record
+
+
+def run_settings(extra_args, info=None):
+    """Settings a task's outputs depend on besides the task itself."""
+    return {'extra_args': list(extra_args), 'source_hash': (info or {}).get('source_hash')}
+
+
+def run_sweep(tasks, out_dir, exe, jobs, extra_args=(), timeout=None, verify=False, info=None):
+    """Run every task of ``tasks`` that is not complete in the manifest; returns the manifest.
+
+    Tasks done with other Diamond_4p flags or another build count as not
+    complete and are run again, so a sweep directory never mixes settings.
+    """
+    settings = run_settings(extra_args, info)
+    manifest = Manifest(out_dir, settings)
+    manifest.info.update(info or {})
+    todo = [task for task in tasks if not manifest.is_complete(task, verify)]
+    stale = [task for task in todo if manifest.tasks.get(task['id'], {}).get('status') == 'done']
+    print(f"{len(tasks)} task(s), {len(tasks) - len(todo)} complete, running {len(todo)} "
+          f"with {jobs} concurrent job(s) -> {out_dir}")
+    if stale:
+        print(f"⚠️  {len(stale)} finished task(s) were run with other settings or outputs changed; rerunning them")
+    for task in todo:
+        manifest.tasks[task['id']] = dict(task, status='pending')
+    manifest.save()
+
+    failed = 0
+    metrics = MetricsLog(os.path.join(out_dir, SWEEP_METRICS))
+    with metrics.phase('jobs', tasks=len(todo), jobs=jobs) as phase, ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {}
+        for task in todo:
+            futures[pool.submit(run_task, exe, task, out_dir, extra_args, timeout)] = task
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                record = dict(task, status='failed', error=f'{type(e).__name__}: {e}')
+            record['settings'] = settings
+            manifest.tasks[task['id']] = record
+            manifest.save()
+            if record['status'] == 'done':
+                print(f"  ✓ {task['id']} ({record['wall_seconds']:.0f} s)")
+            else:
+                failed += 1
+                print(f"  ✗ {task['id']}: {record.get('error')}")
+        phase['failed'] = failed
+    return manifest, failed
+
+
+def add_run_arguments(parser):
+    """Options shared by the sweep runners (build, pool and Diamond_4p flags)."""
+    parser.add_argument('-o', '--out-dir', default='TPA_results_sweep', help='sweep directory (manifest + outputs)')
+    parser.add_argument('--time-step', type=float, nargs='+', default=[1.0], help='weighting field time step(s) [ns]')
+    parser.add_argument('--conductivity', nargs='+', default=['1e-3'], help='weighting potential set(s)')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='text',
+                        help='signal output: text, raw float64 binary (tpa_signals.py) or both')
+    parser.add_argument('--workers', type=int, default=1, help='Diamond_4p --workers per job')
+    parser.add_argument('-j', '--jobs', type=int, help='concurrent jobs (default: cores / workers)')
+    parser.add_argument('--macro', type=int, default=0, help='Diamond_4p --macro (0 = every carrier)')
+    parser.add_argument('--seed', type=int, help='Diamond_4p --seed')
+    parser.add_argument('--fieldmap-dir', help='Diamond_4p --fieldmap-dir')
+    parser.add_argument('--stage-fieldmaps', action='store_true',
+                        help='run from a slimmed tmpfs copy of the field maps, refreshed when they change '
+                             '(fieldmap_bundle.py)')
+    parser.add_argument('--timeout', type=float, help='seconds before a job is killed')
+    parser.add_argument('--verify', action='store_true', help='check output checksums before skipping tasks')
+    parser.add_argument('--force-build', action='store_true')
+    parser.add_argument('--no-build', action='store_true', help='use build/Diamond_4p as it is')
+
+
+def stage_fieldmaps(source, conductivities):
+    """Stage the field maps with fieldmap_bundle.py (next to this script or one level up)."""
+    for path in (HERE, os.path.dirname(HERE)):
+        if os.path.exists(os.path.join(path, 'fieldmap_bundle.py')) and path not in sys.path:
+            sys.path.append(path)
+    import fieldmap_bundle
+    return fieldmap_bundle.stage(source or fieldmap_bundle.DEFAULT_SOURCE, conductivities)
+
+
+def prepare_run(args):
+    """Build if needed; returns ``(exe, jobs, extra_args, info)`` for ``run_sweep``."""
+    metrics = MetricsLog(os.path.join(os.path.abspath(args.out_dir), SWEEP_METRICS))
+    if args.no_build:
+        exe, digest = os.path.join(HERE, 'build', EXECUTABLE), None
+        stamp = os.path.join(HERE, 'build', '.source_hash')
+        if os.path.exists(stamp):
+            with open(stamp) as f:
+                digest = f.read().strip()
+    else:
+        with metrics.phase('build'):
+            exe, digest = build(force=args.force_build)
+    jobs = args.jobs or max(1, (os.cpu_count() or 1) // max(1, args.workers))
+    metrics.record('sweep', cpu_count=os.cpu_count(), jobs=jobs, workers=args.workers)
+    extra_args = ['--macro', str(args.macro), '--workers', str(args.workers)]
+    if args.seed is not None:
+        extra_args += ['--seed', str(args.seed)]
+    fieldmap_dir = args.fieldmap_dir
+    if args.stage_fieldmaps:
+        with metrics.phase('stage_fieldmaps'):
+            fieldmap_dir = stage_fieldmaps(fieldmap_dir, args.conductivity)
+    if fieldmap_dir:
+        extra_args += ['--fieldmap-dir', os.path.abspath(fieldmap_dir)]
+    info = {'source_hash': digest, 'extra_args': extra_args}
+    return exe, jobs, extra_args, info
+
+
+def print_status(out_dir):
+    manifest = Manifest(out_dir)
+    counts = manifest.counts()
+    print(f"{out_dir}: {len(manifest.tasks)} task(s) " +
+          ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    for record in sorted(manifest.tasks.values(), key=lambda r: r['id']):
+        if record.get('status') != 'done':
+            print(f"  {record['status']:8s} {record['id']} {record.get('error', '')}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resumable Diamond_4p (x, y, time_step, conductivity) sweep')
+    parser.add_argument('--x', type=float, nargs=3, metavar=('MIN', 'MAX', 'N'), default=[2.5, 32.5, 7],
+                        help='beam x grid [um]')
+    parser.add_argument('--y', type=float, nargs=3, metavar=('MIN', 'MAX', 'N'), default=[2.5, 32.5, 7],
+                        help='beam y grid [um]')
+    add_run_arguments(parser)
+    parser.add_argument('--status', action='store_true', help='print the manifest summary and exit')
+    parser.add_argument('--dry-run', action='store_true', help='list the tasks that would run')
+    args = parser.parse_args(argv)
+
+    out_dir = os.path.abspath(args.out_dir)
+    if args.status:
+        return print_status(out_dir)
+    tasks = expand(grid(*args.x), grid(*args.y), args.time_step, args.conductivity, args.format)
+    if args.dry_run:
+        manifest = Manifest(out_dir)
+        for task in tasks:
+            print(f"  {'done' if manifest.is_complete(task, args.verify) else 'todo'} {task['id']}")
+        return 0
+
+    exe, jobs, extra_args, info = prepare_run(args)
+    start = time.perf_counter()
+    manifest, failed = run_sweep(tasks, out_dir, exe, jobs, extra_args, args.timeout, args.verify, info)
+    print(f"Done in {time.perf_counter() - start:.0f} s: {len(tasks) - failed}/{len(tasks)} complete, "
+          f"{failed} failed -> {manifest.path}")
+    if failed:
+        print("⚠️  Rerun the same command to retry the missing points.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
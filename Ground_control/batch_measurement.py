@@ -0,0 +1,206 @@
+"""Run the Measurement.ipynb analysis over a whole campaign of .mat files.
+
+Every file is processed on a process pool: calibration files get the linear
+power calibration fit, z-scan files the chunked waveform-max reduction,
+baseline/depth correction and the TPA fit (tpa_fit.TpaSurface, loaded once
+per worker from its disk cache). One tidy CSV row is written per file;
+files whose size and mtime match an existing row are not processed again.
+
+Usage:
+    python batch_measurement.py /Volumes/T7Shield/Diamond3D_25May/Test5_CxL_ZVEscan_Z-200to200d2_backmiddia
+    python batch_measurement.py "scans/*.mat" --calibration "Calibration/*.mat" -j 8 -o results.csv
+"""
+import argparse
+import csv
+import glob
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from scipy.optimize import curve_fit
+
+from scan_io import ScanFile
+from tpa_fit import TpaSurface
+
+N_DIAMOND = 2.4582
+SIGNAL_SCALE = 0.0125
+FIT_START_UM = -100
+
+COLUMNS = ['file', 'kind', 'bias_V', 'position', 'nav', 'amplitude', 'x_offset_um', 'r_squared',
+           'slope', 'intercept', 'n_points', 'fit_seconds', 'seconds', 'size', 'mtime_ns', 'error']
+
+_surface = None
+
+
+def _init_worker():
+    global _surface
+    _surface = TpaSurface.load_or_build()
+
+
+def parse_name(path):
+    """Bias [V] and position tag from names like ``..._+10V_cent_back(+x-y18d75)_...``."""
+    name = os.path.basename(path)
+    bias = re.search(r'_([+-]?[0-9]+(?:d[0-9]+)?)V_', name)
+    position = re.search(r'\(([^)]*)\)', name)
+    return (float(bias.group(1).replace('d', '.')) if bias else None,
+            position.group(1) if position else '')
+
+
+def calibrate(path):
+    """Linear fit Power(mW) = slope * WaveformMax + intercept, as in the notebook."""
+    with ScanFile(path) as cal:
+        power_readings = cal.read('power_meter_data').flatten() / 100000
+        max_values = cal.reduce('data', (slice(None), 2, 0, slice(None), 0, 0, 0, 0)).max
+    start = time.perf_counter()
+    (slope, intercept), _ = curve_fit(lambda x, a, b: a * x + b, max_values, power_readings * 1e9)
+    return {'slope': slope, 'intercept': intercept, 'n_points': len(max_values),
+            'fit_seconds': time.perf_counter() - start}
+
+
+def zscan_profile(path, channel=0, energy=0, z_start=-200, z_step=2):
+    """Baseline-corrected waveform max vs physical depth [um] of one z-scan."""
+    with ScanFile(path) as scan:
+        shape = scan.shape('data')
+        if len(shape) >= 8:
+            index = (slice(None), channel, 0, energy) + (0,) * (len(shape) - 5) + (slice(None),)
+        else:
+            # Notebook fallback: channel on axis 1 and energy on axis 3 where
+            # they are not the last (z) axis, every other axis kept
+            index = [slice(None)] * len(shape)
+            if len(shape) >= 3:
+                index[1] = channel
+            if len(shape) >= 5:
+                index[3] = energy
+            index = tuple(index)
+        waveform_max = scan.reduce('data', index).max.flatten() * SIGNAL_SCALE
+    z_positions = z_start + z_step * np.arange(len(waveform_max))
+    baseline = np.median(waveform_max[:max(1, int(0.1 * len(waveform_max)))])
+    return z_positions * N_DIAMOND, waveform_max - baseline
+
+
+def fit_zscan(z_positions, signal, surface):
+    """TPA fit from ``FIT_START_UM`` to the signal maximum."""
+    max_position = z_positions[np.argmax(signal)]
+    mask = (z_positions >= FIT_START_UM) & (z_positions <= max_position)
+    z_fit, signal_fit = z_positions[mask], signal[mask]
+    # Start at the steepest rise with the amplitude matching the plateau
+    x_offset0 = z_fit[np.argmax(np.gradient(signal_fit))] if len(z_fit) > 1 else max_position
+    plateau = surface.model(np.array([x_offset0 + 50.0]), 0.5, 1.0, x_offset0)[0]
+    amplitude0 = signal_fit.max() / plateau if plateau > 0 else 1e-15
+    start = time.perf_counter()
+    (nav, amplitude, x_offset), _, r_squared = surface.fit(z_fit, signal_fit,
+                                                           p0=[0.5, amplitude0, x_offset0])
+    return {'nav': nav, 'amplitude': amplitude, 'x_offset_um': x_offset, 'r_squared': r_squared,
+            'n_points': len(z_fit), 'fit_seconds': time.perf_counter() - start}
+
+
+def process_file(path, kind, options):
+    start = time.perf_counter()
+    st = os.stat(path)
+    bias, position = parse_name(path)
+    row = {'file': os.path.abspath(path), 'kind': kind, 'bias_V': bias, 'position': position,
+           'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'error': ''}
+    try:
+        if kind == 'calibration':
+            row.update(calibrate(path))
+        else:
+            z_positions, signal = zscan_profile(path, **options)
+            row.update(fit_zscan(z_positions, signal, _surface))
+    except Exception as e:
+        row['error'] = f'{type(e).__name__}: {e}'
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+
+def _expand(patterns):
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.extend(sorted(glob.glob(os.path.join(pattern, '*.mat'))))
+        else:
+            files.extend(sorted(glob.glob(pattern)))
+    return files
+
+
+def read_results(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='') as f:
+        return {row['file']: row for row in csv.DictReader(f)}
+
+
+def write_results(path, rows):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in sorted(rows, key=lambda r: (r['kind'], r['file'])):
+            writer.writerow({key: row.get(key, '') for key in COLUMNS})
+    os.replace(tmp, path)
+
+
+def _is_current(row, path):
+    st = os.stat(path)
+    return (row and not row.get('error') and row.get('size') == str(st.st_size)
+            and row.get('mtime_ns') == str(st.st_mtime_ns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch calibration + z-scan TPA fits')
+    parser.add_argument('scans', nargs='+', help='z-scan .mat files, globs or directories')
+    parser.add_argument('--calibration', action='append', default=[], help='calibration .mat glob (repeatable)')
+    parser.add_argument('-o', '--out', help='results CSV (default: tpa_results.csv next to the first input)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--channel', type=int, default=0)
+    parser.add_argument('--energy', type=int, default=0)
+    parser.add_argument('--z-start', type=float, default=-200, help='optical depth of the first point [um]')
+    parser.add_argument('--z-step', type=float, default=2, help='optical depth step [um]')
+    parser.add_argument('--force', action='store_true', help='reprocess files with cached results')
+    args = parser.parse_args(argv)
+
+    calibrations = set(map(os.path.abspath, _expand(args.calibration)))
+    scans = [os.path.abspath(p) for p in _expand(args.scans) if os.path.abspath(p) not in calibrations]
+    if not scans and not calibrations:
+        print("No .mat files found.")
+        return 1
+    first = args.scans[0]
+    out = args.out or os.path.join(first if os.path.isdir(first) else os.path.dirname(first) or '.',
+                                   'tpa_results.csv')
+    results = read_results(out)
+    jobs = [(p, 'calibration') for p in sorted(calibrations)] + [(p, 'zscan') for p in scans]
+    todo = [(p, kind) for p, kind in jobs if args.force or not _is_current(results.get(p), p)]
+    print(f"{len(jobs)} file(s), {len(jobs) - len(todo)} cached, processing {len(todo)} "
+          f"with {args.jobs} worker(s)...")
+
+    if todo:
+        # Build the surface cache once before the workers load it
+        TpaSurface.load_or_build()
+    options = {'channel': args.channel, 'energy': args.energy,
+               'z_start': args.z_start, 'z_step': args.z_step}
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker) as pool:
+        futures = [pool.submit(process_file, path, kind, options) for path, kind in todo]
+        for future in as_completed(futures):
+            row = future.result()
+            results[row['file']] = row
+            # Save after every file so an interrupted campaign keeps what it computed
+            write_results(out, results.values())
+            if row['error']:
+                failed += 1
+                print(f"  ✗ {os.path.basename(row['file'])}: {row['error']}")
+            elif row['kind'] == 'calibration':
+                print(f"  ✓ {os.path.basename(row['file'])}: Power(mW) = {row['slope']:.6f} * "
+                      f"WaveformMax + {row['intercept']:.6f} ({row['seconds']:.1f} s)")
+            else:
+                print(f"  ✓ {os.path.basename(row['file'])}: NAv={row['nav']:.4f} "
+                      f"offset={row['x_offset_um']:.2f} μm R²={row['r_squared']:.4f} ({row['seconds']:.1f} s)")
+    print(f"Done in {time.perf_counter() - start:.1f} s, {failed} failed -> {out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Content-addressed push and incremental pull over SFTP for Launch.ipynb.
+
+``push`` hashes the local files (sha256), compares them with the manifest
+stored next to them on the server (``.sync_manifest.json``) and uploads only
+what changed, each file to a temporary name renamed into place, so a job
+never sees a half-written input. ``pull`` copies new or changed remote
+files (by size and mtime, remembered in a local ``.sync_state.json``) and
+skips the ``.partial`` files of running tpa_sweep jobs, so it can be called
+repeatedly while the simulation is still running.
+
+``connect`` opens the paramiko connection with transport compression
+(zlib), so everything sent over it is compressed on the fly. Any object with
+the paramiko ``SFTPClient`` methods used here works as ``sftp``;
+``LocalSFTP`` maps them to a local directory for testing without a server.
+
+Usage:
+    from remote_sync import connect, push, pull
+    ssh, sftp = connect("tcad01.hep.manchester.ac.uk", "lihuazhen")
+    push(sftp, "../Garfield_workplace", "/tmp/Garfield_satellite", files=files_to_copy)
+    pull(sftp, "/tmp/Garfield_satellite/TPA_results_sweep", "../Results/TPA_results_sweep")
+"""
+import errno
+import hashlib
+import json
+import os
+import shutil
+import stat
+import time
+from collections import namedtuple
+
+MANIFEST_NAME = '.sync_manifest.json'
+STATE_NAME = '.sync_state.json'
+SKIP_SUFFIXES = ('.partial', '.tmp')
+
+SyncResult = namedtuple('SyncResult', 'transferred skipped bytes seconds')
+
+
+def file_sha256(path, chunk_bytes=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_bytes), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_tree(root, files=None):
+    """``{relative path: {'sha256', 'size', 'mode'}}`` of ``files`` (default: everything) under ``root``."""
+    if files is None:
+        files = []
+        for dirpath, _, names in os.walk(root):
+            files.extend(os.path.relpath(os.path.join(dirpath, name), root) for name in names
+                         if name not in (MANIFEST_NAME, STATE_NAME))
+    tree = {}
+    for name in sorted(files):
+        path = os.path.join(root, name)
+        st = os.stat(path)
+        tree[name.replace(os.sep, '/')] = {'sha256': file_sha256(path), 'size': st.st_size,
+                                           'mode': stat.S_IMODE(st.st_mode)}
+    return tree
+
+
+def connect(server, username, **kwargs):
+    """SSH connection with zlib transport compression; returns ``(ssh, sftp)``."""
+    import paramiko
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(server, username=username, compress=True, **kwargs)
+    return ssh, ssh.open_sftp()
+
+
+def _join(*parts):
+    return '/'.join(p.rstrip('/') for p in parts if p)
+
+
+def _remote_makedirs(sftp, path):
+    parts = path.strip('/').split('/')
+    current = '/' if path.startswith('/') else ''
+    for part in parts:
+        current = _join(current, part) if current not in ('', '/') else current + part
+        try:
+            sftp.stat(current)
+        except IOError:
+            sftp.mkdir(current)
+
+
+def _read_json(sftp, path):
+    try:
+        with sftp.open(path, 'r') as f:
+            return json.loads(f.read())
+    except IOError:
+        return {}
+
+
+def _write_json(sftp, path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with sftp.open(tmp, 'w') as f:
+        f.write(json.dumps(data, indent=1, sort_keys=True))
+    sftp.posix_rename(tmp, path)
+
+
+def push(sftp, local_root, remote_root, files=None, verbose=True):
+    """Upload the files of ``local_root`` whose content differs from the remote manifest."""
+    start = time.perf_counter()
+    local = hash_tree(local_root, files)
+    _remote_makedirs(sftp, remote_root)
+    manifest_path = _join(remote_root, MANIFEST_NAME)
+    remote = _read_json(sftp, manifest_path)
+    transferred, skipped, nbytes = [], [], 0
+    for name, entry in local.items():
+        target = _join(remote_root, name)
+        known = remote.get(name)
+        if known and known.get('sha256') == entry['sha256']:
+            # Guard against files removed or replaced behind the manifest's back
+            try:
+                if sftp.stat(target).st_size == entry['size']:
+                    skipped.append(name)
+                    continue
+            except IOError:
+                pass
+        if '/' in name:
+            _remote_makedirs(sftp, target.rsplit('/', 1)[0])
+        tmp = f'{target}.{os.getpid()}.tmp'
+        sftp.put(os.path.join(local_root, name), tmp)
+        sftp.chmod(tmp, entry['mode'])
+        sftp.posix_rename(tmp, target)
+        remote[name] = entry
+        transferred.append(name)
+        nbytes += entry['size']
+        if verbose:
+            print(f"    ↑ {name} ({entry['size']:,} bytes)")
+        # Record progress so an interrupted push resumes where it stopped
+        _write_json(sftp, manifest_path, remote)
+    if verbose:
+        print(f"  ✓ {len(transferred)} file(s) uploaded ({nbytes:,} bytes), {len(skipped)} unchanged")
+    return SyncResult(transferred, skipped, nbytes, time.perf_counter() - start)
+
+
+def _walk_remote(sftp, root, prefix=''):
+    try:
+        entries = sftp.listdir_attr(_join(root, prefix))
+    except IOError:
+        return
+    for entry in entries:
+        name = _join(prefix, entry.filename) if prefix else entry.filename
+        if stat.S_ISDIR(entry.st_mode):
+            yield from _walk_remote(sftp, root, name)
+        else:
+            yield name, entry
+
+
+def pull(sftp, remote_root, local_root, pattern=None, verbose=True):
+    """Download remote files that are new or changed since the last ``pull`` into ``local_root``.
+
+    ``pattern`` (an ``fnmatch`` pattern on the relative path) restricts the
+    files; unfinished ``.partial``/``.tmp`` files are always skipped.
+    """
+    import fnmatch
+    start = time.perf_counter()
+    os.makedirs(local_root, exist_ok=True)
+    state_path = os.path.join(local_root, STATE_NAME)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    transferred, skipped, nbytes = [], [], 0
+    for name, entry in _walk_remote(sftp, remote_root):
+        if name.endswith(SKIP_SUFFIXES) or name in (MANIFEST_NAME, STATE_NAME):
+            continue
+        if pattern and not fnmatch.fnmatch(name, pattern):
+            continue
+        key = [entry.st_size, int(entry.st_mtime)]
+        local_path = os.path.join(local_root, *name.split('/'))
+        if state.get(name) == key and os.path.exists(local_path):
+            skipped.append(name)
+            continue
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp = f'{local_path}.{os.getpid()}.tmp'
+        sftp.get(_join(remote_root, name), tmp)
+        os.replace(tmp, local_path)
+        state[name] = key
+        transferred.append(name)
+        nbytes += entry.st_size
+    tmp = f'{state_path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, state_path)
+    if verbose and (transferred or not skipped):
+        print(f"  ✓ {len(transferred)} file(s) downloaded ({nbytes:,} bytes), {len(skipped)} up to date")
+    return SyncResult(transferred, skipped, nbytes, time.perf_counter() - start)
+
+
+class LocalSFTP:
+    """Stand-in for ``paramiko.SFTPClient`` on the local file system.
+
+    Remote paths are resolved under ``root``, so ``/tmp/Garfield_satellite``
+    becomes ``<root>/tmp/Garfield_satellite``.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        # The "server" file system itself always exists
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def open(self, path, mode='r'):
+        return open(self._path(path), mode)
+
+    def stat(self, path):
+        try:
+            return os.stat(self._path(path))
+        except FileNotFoundError as e:
+            raise IOError(errno.ENOENT, str(e))
+
+    def listdir_attr(self, path='.'):
+        try:
+            names = sorted(os.listdir(self._path(path)))
+        except FileNotFoundError as e:
+            raise IOError(errno.ENOENT, str(e))
+        attrs = []
+        for name in names:
+            st = os.stat(os.path.join(self._path(path), name))
+            attrs.append(_LocalAttributes(name, st.st_size, st.st_mtime, st.st_mode))
+        return attrs
+
+    def mkdir(self, path, mode=0o777):
+        os.mkdir(self._path(path), mode)
+
+    def put(self, localpath, remotepath):
+        shutil.copyfile(localpath, self._path(remotepath))
+        return self.stat(remotepath)
+
+    def get(self, remotepath, localpath):
+        shutil.copyfile(self._path(remotepath), localpath)
+
+    def chmod(self, path, mode):
+        os.chmod(self._path(path), mode)
+
+    def posix_rename(self, oldpath, newpath):
+        os.replace(self._path(oldpath), self._path(newpath))
+
+    def remove(self, path):
+        os.remove(self._path(path))
+
+    def close(self):
+        pass
+
+
+_LocalAttributes = namedtuple('_LocalAttributes', 'filename st_size st_mtime st_mode')
@@ -0,0 +1,118 @@
+"""Lazy reader for MATLAB v7.3 (HDF5) calibration and scan files.
+
+``load_matlab_v73`` in Measurement.ipynb reads every dataset of the file into
+memory. ``ScanFile`` only opens the HDF5 file; ``read`` pulls a single
+hyperslab and ``reduce`` streams the selected waveforms chunk by chunk along
+the sample axis, so peak memory is one chunk of samples for the selected
+channel/energy whatever the size of the scan.
+
+Shapes and indices are the h5py ones used in the notebook, e.g. a z-scan
+``data`` of shape (40000, 4, 1, 6, 1, 1, 1, 201) = (samples, channel, ...,
+energy, ..., z position).
+
+Usage:
+    from scan_io import ScanFile
+    with ScanFile('t5b2_ZEscan_....mat') as scan:
+        red = scan.reduce('data', (slice(None), 0, 0, 0, 0, 0, 0, slice(None)))
+        waveform_max = red.max * 0.0125           # one value per z position
+"""
+from collections import namedtuple
+
+import h5py
+import numpy as np
+
+# Samples per waveform read at once (rounded up to the dataset's HDF5 chunking)
+CHUNK_SAMPLES = 2048
+BASELINE_SAMPLES = 1000
+
+Reduction = namedtuple('Reduction', 'max min baseline max_bs integral integral_bs nsamples')
+
+
+def _is_full(index):
+    return isinstance(index, slice) and index == slice(None)
+
+
+class ScanFile:
+    """Read-only, lazily loaded MATLAB v7.3 file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._h5 = h5py.File(self.path, 'r')
+
+    def close(self):
+        self._h5.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def datasets(self):
+        """``{name: (shape, dtype)}`` of every dataset, without reading values."""
+        found = {}
+
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                found[name] = (obj.shape, obj.dtype)
+        self._h5.visititems(visit)
+        return found
+
+    def shape(self, name):
+        return self._h5[name].shape
+
+    def read(self, name, index=()):
+        """Read only ``dataset[index]`` (a hyperslab) as a NumPy array."""
+        return self._h5[name][index]
+
+    def reduce(self, name, index, sample_axis=0, chunk_samples=CHUNK_SAMPLES,
+               baseline_samples=BASELINE_SAMPLES, dt=1.0):
+        """Per-waveform reductions of ``dataset[index]`` along ``sample_axis``.
+
+        ``index`` selects channel/energy/... like ``data[:, 0, 0, 0, 0, 0, 0, :]``;
+        its entry at ``sample_axis`` must be ``slice(None)``. Returns a
+        ``Reduction`` whose arrays have the shape of the selection without the
+        sample axis: raw max/min, baseline (mean of the first
+        ``baseline_samples``), baseline-subtracted max and the integrals
+        (sum * ``dt``) of the raw and baseline-subtracted waveforms.
+        """
+        dataset = self._h5[name]
+        index = tuple(index) + (slice(None),) * (dataset.ndim - len(index))
+        if not _is_full(index[sample_axis]):
+            raise ValueError(f'index at the sample axis ({sample_axis}) must be slice(None)')
+        # Position of the sample axis in the selected (integer-indexed axes dropped) array
+        out_axis = sum(1 for i in index[:sample_axis] if isinstance(i, slice))
+        nsamples = dataset.shape[sample_axis]
+        if dataset.chunks:
+            step = dataset.chunks[sample_axis]
+            chunk_samples = max(step, -(-chunk_samples // step) * step)
+
+        def window(start, stop):
+            sel = list(index)
+            sel[sample_axis] = slice(start, stop)
+            return np.asarray(dataset[tuple(sel)], dtype=np.float64)
+
+        nbase = min(baseline_samples, nsamples)
+        baseline = window(0, nbase).mean(axis=out_axis) if nbase else None
+        vmax = vmin = total = None
+        for start in range(0, nsamples, chunk_samples):
+            block = window(start, min(start + chunk_samples, nsamples))
+            bmax, bmin, bsum = block.max(axis=out_axis), block.min(axis=out_axis), block.sum(axis=out_axis)
+            if vmax is None:
+                vmax, vmin, total = bmax, bmin, bsum
+            else:
+                np.maximum(vmax, bmax, out=vmax)
+                np.minimum(vmin, bmin, out=vmin)
+                total += bsum
+        if baseline is None:
+            baseline = np.zeros_like(vmax)
+        return Reduction(max=vmax, min=vmin, baseline=baseline, max_bs=vmax - baseline,
+                         integral=total * dt, integral_bs=(total - baseline * nsamples) * dt,
+                         nsamples=nsamples)
+
+
+def load_matlab_v73(filename, names=None):
+    """Drop-in for the notebook helper that reads only the ``names`` datasets."""
+    with ScanFile(filename) as scan:
+        wanted = scan.datasets() if names is None else names
+        return {name: scan.read(name) for name in wanted}
@@ -0,0 +1,105 @@
+"""Tests of remote_sync push/pull against the LocalSFTP stand-in.
+
+Usage:
+    python -m pytest Ground_control/test_remote_sync.py
+"""
+import json
+import os
+
+import pytest
+
+from remote_sync import MANIFEST_NAME, STATE_NAME, LocalSFTP, pull, push
+
+REMOTE = '/tmp/Garfield_satellite'
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.fixture
+def local(tmp_path):
+    root = tmp_path / 'local'
+    _write(str(root / 'Diamond_4p.C'), 'int main() {}\n')
+    _write(str(root / 'LUT.bin'), 'lut' * 100)
+    _write(str(root / 'scripts' / 'run.sh'), '#!/bin/bash\n')
+    return str(root)
+
+
+@pytest.fixture
+def sftp(tmp_path):
+    return LocalSFTP(str(tmp_path / 'server'))
+
+
+def test_push_new_unchanged_and_modified(local, sftp):
+    first = push(sftp, local, REMOTE, verbose=False)
+    assert sorted(first.transferred) == ['Diamond_4p.C', 'LUT.bin', 'scripts/run.sh']
+    assert _read(sftp._path(REMOTE + '/scripts/run.sh')) == '#!/bin/bash\n'
+
+    again = push(sftp, local, REMOTE, verbose=False)
+    assert again.transferred == [] and len(again.skipped) == 3
+
+    _write(os.path.join(local, 'LUT.bin'), 'new lut')
+    changed = push(sftp, local, REMOTE, verbose=False)
+    assert changed.transferred == ['LUT.bin']
+    assert _read(sftp._path(REMOTE + '/LUT.bin')) == 'new lut'
+    assert not [name for name in os.listdir(sftp._path(REMOTE)) if name.endswith('.tmp')]
+
+
+def test_push_resumes_from_manifest(local, sftp):
+    class FailingSFTP(LocalSFTP):
+        puts = 0
+
+        def put(self, localpath, remotepath):
+            FailingSFTP.puts += 1
+            if FailingSFTP.puts == 2:
+                raise IOError('connection lost')
+            return super().put(localpath, remotepath)
+
+    with pytest.raises(IOError):
+        push(FailingSFTP(sftp.root), local, REMOTE, verbose=False)
+    with open(sftp._path(REMOTE + '/' + MANIFEST_NAME)) as f:
+        assert list(json.load(f)) == ['Diamond_4p.C']
+
+    resumed = push(sftp, local, REMOTE, verbose=False)
+    assert resumed.skipped == ['Diamond_4p.C']
+    assert sorted(resumed.transferred) == ['LUT.bin', 'scripts/run.sh']
+
+
+def test_pull_skips_unfinished_files(tmp_path, sftp):
+    results = REMOTE + '/TPA_results_sweep'
+    _write(sftp._path(results + '/TPA_simulation_x1_y1.txt'), 'done\n')
+    _write(sftp._path(results + '/TPA_simulation_x1_y2.txt.partial'), 'running\n')
+    _write(sftp._path(results + '/manifest.json.123.tmp'), '{}')
+    target = str(tmp_path / 'results')
+
+    result = pull(sftp, results, target, verbose=False)
+    assert result.transferred == ['TPA_simulation_x1_y1.txt']
+    assert sorted(os.listdir(target)) == [STATE_NAME, 'TPA_simulation_x1_y1.txt']
+
+
+def test_pull_is_incremental(tmp_path, sftp):
+    results = REMOTE + '/TPA_results_sweep'
+    _write(sftp._path(results + '/a.txt'), 'a\n')
+    _write(sftp._path(results + '/logs/job_a.log'), 'log\n')
+    target = str(tmp_path / 'results')
+
+    assert sorted(pull(sftp, results, target, verbose=False).transferred) == ['a.txt', 'logs/job_a.log']
+    again = pull(sftp, results, target, verbose=False)
+    assert again.transferred == [] and len(again.skipped) == 2
+
+    _write(sftp._path(results + '/a.txt'), 'a, more data\n')
+    _write(sftp._path(results + '/b.txt'), 'b\n')
+    update = pull(sftp, results, target, verbose=False)
+    assert sorted(update.transferred) == ['a.txt', 'b.txt']
+    assert _read(os.path.join(target, 'a.txt')) == 'a, more data\n'
+
+    os.remove(os.path.join(target, 'b.txt'))
+    assert pull(sftp, results, target, verbose=False).transferred == ['b.txt']
@@ -0,0 +1,203 @@
+"""2D TPA charge lookup table charge(z, H_center) for Diamond_4p.C.
+
+Vectorized replacement for ``generate_charge_lut_csv`` of Lookup_Table.ipynb:
+the TPA/reflection/interference rate is evaluated on the whole (z, H, r)
+tensor with NumPy broadcasting, in chunks of H columns so memory stays
+bounded, and integrated over r. Besides the text ``LUT.csv``, the table is
+written as ``LUT.bin``, the fixed binary layout Diamond_4p.C memory-maps
+once per job (``LUT_BIN_HEADER``):
+
+    char     magic[8]   "TPALUT1\\0"
+    uint64   nz, nh, data_offset                    (little endian)
+    float64  z_um[nz], h_um[nh]
+    float64  charge[nh][nz]    column-major: one contiguous z column per H
+
+and as ``LUT.npy`` with the z/H axes and the generation parameters in
+``LUT.json`` for Python consumers (``load_lut``). Only ``LUT.csv`` and
+``LUT.bin`` are tracked in Garfield_workplace; ``LUT.npy``/``LUT.json`` are
+local outputs of this script, and ``load_lut`` falls back to ``LUT.bin``
+without them.
+
+Usage:
+    python tpa_lut.py -o ../Garfield_workplace                  # 500 x 601 default
+    python tpa_lut.py -o /tmp/fine --nh 6001                     # 0.1 um H steps
+
+    from tpa_lut import generate_charge_lut, write_lut
+    z, h, lut = generate_charge_lut(405e-9, 0.5, 2.4582, 1e-9, 0.0, 0.0, 18000)
+    write_lut('../Garfield_workplace', z, h, lut)
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+# Physical constants
+c = 299792458  # Speed of light in m/s
+hbar = 1.0545718e-34  # Reduced Planck constant in J⋅s
+
+TPA_TAU = 160e-15  # pulse duration in seconds
+BETA2 = 1.5e-11  # beta_2 in m/W
+
+LUT_MAGIC = b'TPALUT1\0'
+LUT_BIN_HEADER = struct.Struct('<8sQQQ')
+
+# Upper bound on the number of float64 elements of one (z, H, r) chunk
+CHUNK_ELEMENTS = 1 << 22
+
+
+def cell_centers(start, stop, n):
+    """``n`` cell centers covering [start, stop] and the cell width."""
+    step = (stop - start) / n
+    return np.linspace(start + step / 2, stop - step / 2, n), step
+
+
+def tpa_rate(r, z, h, wavelength, NAv, nr, Epulse, dcf, R):
+    """TPA + reflection + interference rate; arguments broadcast against each other."""
+    tpa_coeff = (2*np.sqrt(np.log(4)))/(2*np.pi**3.5) * (Epulse**2*BETA2/(TPA_TAU*hbar*(c/wavelength)))
+    waist0_sq = (wavelength/(np.pi*NAv))**2
+    na_over_n = NAv/nr
+    waist1_sq = waist0_sq + (na_over_n * (z - h))**2
+    waist2_sq = waist0_sq + (na_over_n * (z + h))**2
+    r_sq = r**2
+    # Primary beam
+    ntpa = tpa_coeff / waist1_sq**2 * np.exp(-4*r_sq/waist1_sq)
+    # Reflected beam before the reflectance factor
+    nrefl = tpa_coeff / waist2_sq**2 * np.exp(-4*r_sq/waist2_sq)
+    nsum = ntpa + nrefl * R**2
+    if dcf and R:
+        # Interference term
+        nsum += np.sqrt(ntpa * nrefl) * dcf * 2 * R
+    return nsum
+
+
+def generate_charge_lut(wavelength, NAv, nr, Epulse, dcf, R, Q,
+                        r_range=(0, 20e-6, 200),
+                        z_range=(0, 500e-6, 500),
+                        h_range=(-50e-6, 550e-6, 601),
+                        chunk_elements=CHUNK_ELEMENTS):
+    """Return ``(z, h_centers, lut)`` with ``lut[i, j]`` the charge in z bin i for focus j.
+
+    Same physics and normalization as the notebook: for every H the 3D
+    integral over (r, z) is normalized to ``Q``, so each column sums to Q.
+    """
+    r, dr = cell_centers(*r_range)
+    z, dz = cell_centers(*z_range)
+    h_centers = np.linspace(*h_range)
+    lut = np.empty((len(z), len(h_centers)))
+
+    per_column = len(z) * len(r)
+    chunk = max(1, chunk_elements // per_column)
+    weight = 2 * np.pi * r * dr * dz
+    for start in range(0, len(h_centers), chunk):
+        h = h_centers[start:start + chunk]
+        nsum = tpa_rate(r[None, None, :], z[:, None, None], h[None, :, None],
+                        wavelength, NAv, nr, Epulse, dcf, R)
+        # Integrate over r, then normalize each H column to the total charge Q
+        charge = nsum @ weight
+        lut[:, start:start + len(h)] = charge * (Q / charge.sum(axis=0))
+    return z, h_centers, lut
+
+
+def write_lut_bin(path, z, h_centers, lut):
+    """Write the binary LUT read by Diamond_4p.C (axes in um, see module docstring)."""
+    nz, nh = lut.shape
+    offset = LUT_BIN_HEADER.size + 8 * (nz + nh)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(LUT_BIN_HEADER.pack(LUT_MAGIC, nz, nh, offset))
+        f.write(np.round(np.asarray(z) * 1e6, 9).astype('<f8').tobytes())
+        f.write(np.round(np.asarray(h_centers) * 1e6, 9).astype('<f8').tobytes())
+        f.write(np.ascontiguousarray(lut.T, dtype='<f8').tobytes())
+    # Replace atomically so running jobs keep their mapping of the old file
+    os.replace(tmp, path)
+
+
+def read_lut_bin(path):
+    """Memory-map ``LUT.bin``; returns ``(z_um, h_um, lut)`` with ``lut`` shaped (nz, nh)."""
+    with open(path, 'rb') as f:
+        magic, nz, nh, offset = LUT_BIN_HEADER.unpack(f.read(LUT_BIN_HEADER.size))
+    if magic != LUT_MAGIC:
+        raise ValueError(f'{path}: not a binary TPA LUT')
+    axes = np.memmap(path, dtype='<f8', mode='r', offset=LUT_BIN_HEADER.size, shape=(nz + nh,))
+    columns = np.memmap(path, dtype='<f8', mode='r', offset=offset, shape=(nh, nz))
+    return axes[:nz], axes[nz:], columns.T
+
+
+def write_lut(out_dir, z, h_centers, lut, name='LUT', params=None):
+    """Write ``<name>.csv`` (text), ``<name>.bin`` (Diamond_4p.C), ``<name>.npy`` and ``<name>.json``."""
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, name)
+    with open(base + '.csv', 'w') as f:
+        f.write(f"# 2D TPA Charge Lookup Table: charge(z, H_center)\n")
+        f.write(f"# Rows: z-coordinates [μm], Columns: H-coordinates [μm]\n")
+        f.write(f"# z_range: {z[0]*1e6:.1f} to {z[-1]*1e6:.1f} μm\n")
+        f.write(f"# H_range: {h_centers[0]*1e6:.1f} to {h_centers[-1]*1e6:.1f} μm\n")
+        f.write(f"# Shape: {lut.shape[0]} × {lut.shape[1]}\n")
+        f.write("z_um," + ",".join([f"{h*1e6:.1f}" for h in h_centers]) + "\n")
+        np.savetxt(f, np.column_stack([z * 1e6, lut]),
+                   fmt=['%.1f'] + ['%.6e'] * lut.shape[1], delimiter=',')
+    write_lut_bin(base + '.bin', z, h_centers, lut)
+    np.save(base + '.npy', np.ascontiguousarray(lut))
+    with open(base + '.json', 'w') as f:
+        json.dump({'shape': list(lut.shape), 'rows': 'z', 'columns': 'H_center', 'unit': 'm',
+                   'z': z.tolist(), 'h_centers': h_centers.tolist(), 'params': params or {}},
+                  f, indent=1)
+    return base
+
+
+def load_lut(path, mmap_mode='r'):
+    """Load ``(z, h_centers, lut)`` from ``LUT.npy``/``LUT.json`` (``path`` without suffix ok).
+
+    Without them (they are not tracked) the table is read from ``LUT.bin``.
+    """
+    base = path[:-4] if path.endswith(('.npy', '.csv', '.bin')) else path
+    if not os.path.exists(base + '.npy') and os.path.exists(base + '.bin'):
+        z_um, h_um, lut = read_lut_bin(base + '.bin')
+        return np.asarray(z_um) * 1e-6, np.asarray(h_um) * 1e-6, lut
+    with open(base + '.json') as f:
+        header = json.load(f)
+    lut = np.load(base + '.npy', mmap_mode=mmap_mode)
+    return np.array(header['z']), np.array(header['h_centers']), lut
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the 2D TPA charge lookup table')
+    parser.add_argument('-o', '--out-dir', default=os.path.join('..', 'Garfield_workplace'))
+    parser.add_argument('--name', default='LUT', help='output base name')
+    parser.add_argument('--wavelength', type=float, default=405e-9)
+    parser.add_argument('--na', type=float, default=0.5, help='effective numerical aperture')
+    parser.add_argument('--nr', type=float, default=2.4582, help='refractive index')
+    parser.add_argument('--epulse', type=float, default=1e-9, help='pulse energy [J]')
+    parser.add_argument('--dcf', type=float, default=0.0)
+    parser.add_argument('--reflectance', type=float, default=0.0)
+    parser.add_argument('--q', type=float, default=18000, help='total charge [pairs]')
+    parser.add_argument('--r-max', type=float, default=20e-6)
+    parser.add_argument('--nr-bins', type=int, default=200)
+    parser.add_argument('--z-max', type=float, default=500e-6)
+    parser.add_argument('--nz', type=int, default=500)
+    parser.add_argument('--h-min', type=float, default=-50e-6)
+    parser.add_argument('--h-max', type=float, default=550e-6)
+    parser.add_argument('--nh', type=int, default=601)
+    args = parser.parse_args(argv)
+
+    params = {'wavelength': args.wavelength, 'NAv': args.na, 'nr': args.nr, 'Epulse': args.epulse,
+              'dcf': args.dcf, 'R': args.reflectance, 'Q': args.q,
+              'r_range': [0, args.r_max, args.nr_bins], 'z_range': [0, args.z_max, args.nz],
+              'h_range': [args.h_min, args.h_max, args.nh]}
+    start = time.perf_counter()
+    z, h, lut = generate_charge_lut(args.wavelength, args.na, args.nr, args.epulse, args.dcf,
+                                    args.reflectance, args.q, r_range=(0, args.r_max, args.nr_bins),
+                                    z_range=(0, args.z_max, args.nz),
+                                    h_range=(args.h_min, args.h_max, args.nh))
+    elapsed = time.perf_counter() - start
+    base = write_lut(args.out_dir, z, h, lut, args.name, params)
+    print(f"✓ {lut.shape[0]} × {lut.shape[1]} LUT computed in {elapsed:.2f} s -> {base}.csv/.bin/.npy/.json")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
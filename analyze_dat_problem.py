@@ -1,109 +1,64 @@
-import re
-import numpy as np
+import sys
+
+import wp_quality
+from dfise import DatFile
 
 # 分析DAT文件中的问题
-dat_file = '/Users/lihuazhen/Downloads/Diamond_Pipeline/Diamond_Pipeline/Data_link/DWF_Huazhen_c4/1e-3/1e-3_000010_des.dat'
+dat_file = sys.argv[1] if len(sys.argv) > 1 else '/Users/lihuazhen/Downloads/Diamond_Pipeline/Diamond_Pipeline/Data_link/DWF_Huazhen_c4/1e-3/1e-3_000010_des.dat'
 
 print("=== 分析DAT文件中的权重势问题 ===")
 print(f"文件: {dat_file}")
 
-with open(dat_file, 'r') as f:
-    content = f.read()
-
-# 先查看文件结构
-print("\n=== 文件结构预览 ===")
-lines = content.split('\n')
-for i, line in enumerate(lines[:50]):
-    if 'ElectrostaticPotential' in line or 'validity' in line or 'Values' in line:
-        print(f"行 {i+1}: {line.strip()}")
+with DatFile(dat_file) as dat:
+    # 先查看文件结构
+    print("\n=== 文件结构预览 ===")
+    for key in ('nb_vertices', 'nb_regions', 'datasets'):
+        if key in dat.info:
+            print(f"{key}: {dat.info[key]}")
 
-# 使用更宽松的正则表达式
-print("\n=== 查找ElectrostaticPotential数据段 ===")
-# 分步骤查找
-dataset_pattern = r'Dataset \("ElectrostaticPotential"\)'
-dataset_matches = re.finditer(dataset_pattern, content)
+    # 逐个读取ElectrostaticPotential数据段（单次顺序扫描，按需解析数值）
+    print("\n=== 查找ElectrostaticPotential数据段 ===")
+    blocks = [b for b in dat.blocks() if b.name == 'ElectrostaticPotential']
+    print(f"找到 {len(blocks)} 个ElectrostaticPotential数据段")
 
-dataset_positions = []
-for match in dataset_matches:
-    dataset_positions.append(match.start())
+    # 分析每个数据段
+    for i, block in enumerate(blocks):
+        print(f"\n=== 数据段 {i+1} ===")
 
-print(f"找到 {len(dataset_positions)} 个ElectrostaticPotential数据段")
+        # validity信息
+        region = block.validity
+        print(f"区域: {region if region else '未知'}")
 
-# 分析每个数据段
-for i, start_pos in enumerate(dataset_positions):
-    print(f"\n=== 数据段 {i+1} ===")
-    
-    # 找到这个数据段的结束位置
-    if i < len(dataset_positions) - 1:
-        end_pos = dataset_positions[i+1]
-    else:
-        end_pos = len(content)
-    
-    segment = content[start_pos:end_pos]
-    
-    # 查找validity信息
-    validity_match = re.search(r'validity = \[ "([^"]+)" \]', segment)
-    if validity_match:
-        region = validity_match.group(1)
-        print(f"区域: {region}")
-    else:
-        print("区域: 未知")
-    
-    # 查找Values数据
-    values_match = re.search(r'Values \(([0-9]+)\) \{(.*?)\}', segment, re.DOTALL)
-    if values_match:
-        count = int(values_match.group(1))
-        values_text = values_match.group(2)
+        count = block.count
         print(f"数值数量: {count:,}")
-        
-        # 提取前1000个数值进行分析
-        values = []
-        lines_processed = 0
-        for line in values_text.strip().split('\n'):
-            line = line.strip()
-            if line and not line.startswith('}') and lines_processed < 100:  # 只处理前100行
-                lines_processed += 1
-                nums = line.split()
-                for num in nums:
-                    try:
-                        val = float(num)
-                        values.append(val)
-                        if len(values) >= 1000:  # 最多1000个样本
-                            break
-                    except:
-                        pass
-                if len(values) >= 1000:
-                    break
-        
-        if values:
-            values = np.array(values)
-            print(f"分析样本: {len(values):,}")
-            print(f"数值范围: {np.min(values):.6e} 到 {np.max(values):.6e}")
-            print(f"平均值: {np.mean(values):.6e}")
+
+        # 全部数值流式统计（常数内存）
+        stats = wp_quality.check_block(dat, block)
+
+        if stats.n:
+            print(f"分析数值: {stats.n:,} (全部)")
+            print(f"数值范围: {stats.min:.6e} 到 {stats.max:.6e}")
+            print(f"平均值: {stats.mean:.6e}")
             
             # 分析数值分布
-            close_to_zero = np.sum(np.abs(values) < 1e-10)
-            close_to_one = np.sum((values > 0.9) & (values <= 1.1))
-            in_zero_one = np.sum((values >= 0) & (values <= 1))
-            negative_values = np.sum(values < 0)
-            
-            print(f"接近0的值 (±1e-10): {close_to_zero:,} ({100*close_to_zero/len(values):.1f}%)")
-            print(f"接近1的值 (0.9-1.1): {close_to_one:,} ({100*close_to_one/len(values):.1f}%)")
-            print(f"0-1范围内的值: {in_zero_one:,} ({100*in_zero_one/len(values):.1f}%)")
-            print(f"负值: {negative_values:,} ({100*negative_values/len(values):.1f}%)")
+            print(f"接近0的值 (±1e-10): {stats.noise:,} ({100*stats.fraction(stats.noise):.1f}%)")
+            print(f"接近1的值 (0.9-1.1): {stats.close_to_one:,} ({100*stats.fraction(stats.close_to_one):.1f}%)")
+            print(f"0-1范围内的值: {stats.in_zero_one:,} ({100*stats.fraction(stats.in_zero_one):.1f}%)")
+            print(f"负值: {stats.negative:,} ({100*stats.fraction(stats.negative):.1f}%)")
             
             # 显示样本值
-            print(f"前10个值: {values[:10]}")
+            print(f"前10个值: {stats.head[:10]}")
             
             # 判断数据类型
-            if close_to_zero > len(values) * 0.8:
+            verdict = stats.verdict()
+            if verdict == wp_quality.NOISE:
                 print("❌ 问题: 这主要是数值噪声数据！")
-                if validity_match and 'BULK' in validity_match.group(1):
+                if 'BULK' in region:
                     print("🚨 严重问题: BULK区域的权重势是数值噪声！")
-            elif close_to_one > 10 and in_zero_one > len(values) * 0.8:
+            elif verdict == wp_quality.VALID:
                 print("✅ 正常: 这是正确的权重势数据")
-            elif np.all(np.abs(values - values[0]) < 1e-10):
-                print(f"📌 常数: 所有值都是 {values[0]}")
+            elif verdict == wp_quality.CONSTANT:
+                print(f"📌 常数: 所有值都是 {stats.head[0]}")
             else:
                 print("❓ 未知: 数据分布不明确")
 
@@ -1,58 +1,43 @@
-import h5py
+import sys
+
 import numpy as np
 
+from tdr import TdrFile
+from tdr_catalog import looks_like_wp, sample_values
+
 # 打开TDR文件
-tdr_file = '/Users/lihuazhen/Downloads/Diamond_Pipeline/Diamond_Pipeline/Data_link/DWF_Huazhen_c4/1e-3/n1358_000010_des.tdr'
+tdr_file = sys.argv[1] if len(sys.argv) > 1 else '/Users/lihuazhen/Downloads/Diamond_Pipeline/Diamond_Pipeline/Data_link/DWF_Huazhen_c4/1e-3/n1358_000010_des.tdr'
 
 print("=== 分析TDR文件中的大数据集 ===")
 print(f"文件: {tdr_file}")
 
 try:
-    with h5py.File(tdr_file, 'r') as f:
-        state = f['collection/geometry_0/state_0']
-        
-        # 首先统计所有数据集的大小
+    with TdrFile(tdr_file) as tdr:
+        infos = list(tdr.datasets())
+
+        # 只读取元数据统计所有数据集的大小
         print(f"\n=== 数据集大小统计 ===")
-        dataset_sizes = []
-        
-        for i in range(26):
-            dataset_key = f'dataset_{i}'
-            if dataset_key in state:
-                dataset_group = state[dataset_key]
-                for key in dataset_group.keys():
-                    item = dataset_group[key]
-                    if isinstance(item, h5py.Dataset):
-                        size = item.size
-                        dataset_sizes.append({
-                            'path': f'{dataset_key}/{key}',
-                            'size': size,
-                            'shape': item.shape,
-                            'dtype': item.dtype
-                        })
-        
-        # 按大小排序
-        dataset_sizes.sort(key=lambda x: x['size'], reverse=True)
-        
+        dataset_sizes = sorted(infos, key=lambda ds: ds.nvalues, reverse=True)
+
         print("数据集按大小排序:")
         for i, ds in enumerate(dataset_sizes[:15]):  # 显示前15个最大的
-            print(f"{i+1:2d}. {ds['path']}: {ds['size']:,} 元素, shape={ds['shape']}, dtype={ds['dtype']}")
-        
-        # 找到最大的数据集
-        max_size = dataset_sizes[0]['size']
-        large_datasets = [ds for ds in dataset_sizes if ds['size'] == max_size]
-        
-        print(f"\n=== 最大数据集分析 (元素数: {max_size:,}) ===")
-        
-        for ds_info in large_datasets:
-            path_parts = ds_info['path'].split('/')
-            dataset_key = path_parts[0]
-            value_key = path_parts[1]
-            
-            dataset_group = state[dataset_key]
-            item = dataset_group[value_key]
-            values = item[...]
-            
-            print(f"\n📄 {ds_info['path']}:")
+            print(f"{i+1:2d}. {ds.key}/values ({ds.name}, {tdr.regions[ds.region].name}): "
+                  f"{ds.nvalues:,} 元素, shape={ds.shape}, dtype={ds.dtype}")
+
+        max_size = dataset_sizes[0].nvalues
+
+        # 先用抽样判断哪些数据集像权重势, 只完整读取这些 (没有则读取最大的)
+        candidates = [ds for ds in infos if looks_like_wp(sample_values(tdr, ds))[1]]
+        if not candidates:
+            candidates = [ds for ds in dataset_sizes if ds.nvalues == max_size]
+            print(f"\n=== 抽样未发现权重势, 分析最大数据集 (元素数: {max_size:,}) ===")
+        else:
+            print(f"\n=== 抽样判断为权重势的数据集 ({len(candidates)} 个) ===")
+
+        for ds_info in candidates:
+            values = tdr.values(ds_info).ravel()
+
+            print(f"\n📄 {ds_info.key}/values ({ds_info.name}, {tdr.regions[ds_info.region].name}):")
             print(f"  数值范围: {np.min(values):.6e} 到 {np.max(values):.6e}")
             print(f"  平均值: {np.mean(values):.6e}")
             print(f"  标准差: {np.std(values):.6e}")
@@ -91,8 +76,7 @@ try:
                     print(f"  📌 这是常数数据 (值={values[0]})")
         
         # 比较与几何信息
-        geometry = f['collection/geometry_0']
-        vertex_count = geometry['vertex'].shape[0]
+        vertex_count = tdr.nb_vertices
         print(f"\n=== 与几何信息对比 ===")
         print(f"顶点总数: {vertex_count:,}")
         print(f"最大数据集大小: {max_size:,}")
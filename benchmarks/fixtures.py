@@ -0,0 +1,236 @@
+"""Synthetic, realistically sized inputs for the benchmark suite.
+
+Fixtures imitate the real data closely enough to drive the production code
+paths unchanged:
+
+* ``wp.tdr``/``nominal.tdr``: Sentaurus TDR (HDF5) files with
+  ``collection/geometry_0/state_0/dataset_N``. The mesh is a 75 x 75 x 500
+  μm box split into tetrahedra, with two Graphite columns (``junc5BULK``,
+  ``junc1BULK``) in the Diamond ``BULK`` and the ``BIAS``/``SIGN`` contacts
+  on their ends, and the 20 vertex datasets of the DWF_Huazhen_c4 exports.
+  The ``medium`` mesh has about as many vertices/tetrahedra as the real one
+  (117,967 / 638,130).
+* ``wp.grd``/``wp.dat``/``nominal.dat``: DF-ISE files converted from those
+  with tdr_export, as Data_link/DWF_Huazhen_c4 was.
+* ``zscan.mat``: a MATLAB v7.3 z-scan ``data`` array (samples, channel, 1,
+  energy, 1, 1, 1, z) of int16 scope counts whose pulse heights follow the
+  TPA z-scan model of tpa_fit.
+
+``build`` writes them to ``<root>/<size>/`` and records the parameters in
+``fixtures.json``; fixtures are only generated again when those changed.
+
+Usage:
+    python benchmarks/fixtures.py -s small medium -o /tmp/diamond_bench
+
+    from fixtures import build
+    paths = build('/tmp/diamond_bench', 'small')      # {'dat': ..., 'tdr': ..., 'mat': ...}
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import permutations
+
+import h5py
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+for _path in (ROOT, os.path.join(ROOT, 'Ground_control')):
+    if _path not in sys.path:
+        sys.path.append(_path)
+
+FIXTURE_VERSION = 2
+DEFAULT_ROOT = os.path.join(os.environ.get('TMPDIR', '/tmp'), 'diamond_bench')
+BOX = (75.0, 75.0, 500.0)  # μm, centred on x = y = 0 like the TCAD device
+COLUMN_RADIUS = 6.0
+COLUMNS = {'junc5BULK': (-18.75, 0.0), 'junc1BULK': (18.75, 0.0)}
+# Mesh vertices per axis, scan (samples, energies, z positions),
+# LUT (nz, nh, nr bins) and TPA surface (NAv, H) grids per size
+SIZES = {
+    'small': {'mesh': (13, 13, 41), 'scan': (2000, 1, 201), 'lut': (100, 121, 50), 'surface': (41, 301)},
+    'medium': {'mesh': (25, 25, 190), 'scan': (20000, 2, 201), 'lut': (500, 601, 200), 'surface': (381, 1201)},
+    'large': {'mesh': (41, 41, 300), 'scan': (40000, 6, 201), 'lut': (500, 6001, 200), 'surface': (761, 2401)},
+}
+# Datasets of the DWF_Huazhen_c4 .dat files: (name, on Graphite columns too)
+DATASETS = [('ElectrostaticPotential', True), ('eDensity', False), ('hDensity', False),
+            ('LatticeTemperature', True), ('ElectricField', True), ('eQuasiFermiPotential', True),
+            ('hQuasiFermiPotential', True), ('QuasiFermiPotential', True)]
+MAT_HEADER = 'MATLAB 7.3 MAT-file, Platform: GLNXA64, Created on: Thu Jan  1 00:00:00 1970 HDF5 schema 1.00 .'
+SCAN_CHANNELS = 4
+SCAN_Z_STEP = 2.0  # μm, batch_measurement.zscan_profile default
+
+
+# ---- Mesh and TDR ----------------------------------------------------------
+
+def box_mesh(nx, ny, nz):
+    """Vertices (n, 3) and tetrahedra (m, 4) of the box, 6 tetrahedra per cube."""
+    axes = [np.linspace(-BOX[0] / 2, BOX[0] / 2, nx), np.linspace(-BOX[1] / 2, BOX[1] / 2, ny),
+            np.linspace(0.0, BOX[2], nz)]
+    z, y, x = np.meshgrid(axes[2], axes[1], axes[0], indexing='ij')
+    vertices = np.column_stack([x.ravel(), y.ravel(), z.ravel()])
+    k, j, i = np.meshgrid(np.arange(nz - 1), np.arange(ny - 1), np.arange(nx - 1), indexing='ij')
+    origin = ((k * ny + j) * nx + i).ravel()
+    step = np.array([1, nx, nx * ny])
+    tets = []
+    # Kuhn split: one tetrahedron per path 000 -> 111 along the three axes
+    for order in permutations(range(3)):
+        corners = [np.zeros_like(origin)]
+        for axis in order:
+            corners.append(corners[-1] + step[axis])
+        tets.append(np.column_stack([origin + c for c in corners]))
+    return vertices, np.concatenate(tets)
+
+
+def _regions(vertices, tets):
+    """``[(name, material, kind, element type, table)]`` in TDR region order."""
+    centroid = vertices[tets].mean(axis=1)
+    bulk = np.ones(len(tets), dtype=bool)
+    columns = {}
+    for name, (cx, cy) in COLUMNS.items():
+        inside = np.hypot(centroid[:, 0] - cx, centroid[:, 1] - cy) < COLUMN_RADIUS
+        columns[name] = tets[inside]
+        bulk &= ~inside
+    faces = np.array([[0, 1, 2], [0, 1, 3], [0, 2, 3], [1, 2, 3]])
+
+    def end_faces(table, z):
+        tris = table[:, faces].reshape(-1, 3)
+        return tris[np.all(vertices[tris, 2] == z, axis=1)]
+
+    return [('junc5BULK', 'Graphite', 0, 5, columns['junc5BULK']),
+            ('BULK', 'Diamond', 0, 5, tets[bulk]),
+            ('junc1BULK', 'Graphite', 0, 5, columns['junc1BULK']),
+            ('SIGN', None, 1, 2, end_faces(columns['junc1BULK'], BOX[2])),
+            ('BIAS', None, 1, 2, end_faces(columns['junc5BULK'], 0.0))]
+
+
+def _vertex_values(name, vertices, bias):
+    """Smooth synthetic values of one dataset at every vertex."""
+    r5 = np.hypot(vertices[:, 0] - COLUMNS['junc5BULK'][0], vertices[:, 1] - COLUMNS['junc5BULK'][1])
+    r1 = np.hypot(vertices[:, 0] - COLUMNS['junc1BULK'][0], vertices[:, 1] - COLUMNS['junc1BULK'][1])
+    # 1 on the readout column, 0 on the bias column, scaled by the bias
+    share = np.clip((r5 - COLUMN_RADIUS) / np.maximum(r5 + r1 - 2 * COLUMN_RADIUS, 1e-9), 0.0, 1.0)
+    if name == 'ElectrostaticPotential':
+        return share * bias
+    if name == 'ElectricField':
+        return np.abs(bias) / np.maximum(r1 + r5, 1.0) * 1e4
+    if name in ('eDensity', 'hDensity'):
+        return 1e-3 * np.exp(-share * 5.0 if name == 'eDensity' else -(1 - share) * 5.0)
+    if name == 'LatticeTemperature':
+        return np.full(len(vertices), 293.15)
+    return share * bias - 0.1 * (vertices[:, 2] / BOX[2])
+
+
+def write_tdr(path, vertices, regions, bias=1.0):
+    """Write a TDR file with the layout ``tdr.TdrFile`` reads."""
+    datasets = []
+    with h5py.File(path, 'w') as h5:
+        geometry = h5.create_group('collection/geometry_0')
+        geometry.attrs['number of regions'] = len(regions)
+        geometry.attrs['number of vertices'] = len(vertices)
+        geometry.attrs['dimension'] = 3
+        points = np.empty(len(vertices), dtype=[('x', '<f8'), ('y', '<f8'), ('z', '<f8')])
+        points['x'], points['y'], points['z'] = vertices.T
+        geometry.create_dataset('vertex', data=points)
+        for index, (name, material, kind, etype, table) in enumerate(regions):
+            group = geometry.create_group(f'region_{index}')
+            group.attrs['name'] = np.bytes_(name)
+            group.attrs['type'] = kind
+            if material:
+                group.attrs['material'] = np.bytes_(material)
+            stream = np.column_stack([np.full(len(table), etype), table]).astype(np.int32).ravel()
+            group.create_dataset('elements_0', data=stream)
+            if kind != 0:
+                continue
+            # TDR stores region values in ascending global vertex order
+            order = np.unique(table)
+            for ds_name, on_columns in DATASETS:
+                if on_columns or material == 'Diamond':
+                    datasets.append((ds_name, index, _vertex_values(ds_name, vertices, bias)[order]))
+        state = geometry.create_group('state_0')
+        state.attrs['number of datasets'] = len(datasets)
+        for i, (name, region, values) in enumerate(datasets):
+            group = state.create_group(f'dataset_{i}')
+            group.attrs['name'] = np.bytes_(name)
+            group.attrs['quantity'] = np.bytes_(name)
+            group.attrs['region'] = region
+            group.attrs['location type'] = 0
+            group.attrs['number of values'] = len(values)
+            group.attrs['conversion factor'] = 1.0
+            group.create_dataset('values', data=values)
+
+
+# ---- MATLAB v7.3 scan ------------------------------------------------------
+
+def write_mat(path, samples, energies, nz, seed=0):
+    """Write a v7.3 z-scan whose pulse maxima follow the TPA model along z."""
+    from tpa_fit import total_charge
+    rng = np.random.default_rng(seed)
+    z_um = -200.0 + SCAN_Z_STEP * np.arange(nz)
+    profile = total_charge(z_um * 2.4582 * 1e-6, 0.5)
+    profile = profile / profile.max()
+    t = np.arange(samples)
+    rise = samples // 4
+    pulse = np.where(t >= rise, np.exp(-(t - rise) / (samples / 20)), 0.0)
+    shape = (samples, SCAN_CHANNELS, 1, energies, 1, 1, 1, nz)
+    with h5py.File(path, 'w', userblock_size=512) as h5:
+        data = h5.create_dataset('data', shape=shape, dtype='<i2',
+                                 chunks=(min(samples, 4096), 1, 1, 1, 1, 1, 1, 1))
+        data.attrs['MATLAB_class'] = np.bytes_('int16')
+        for e in range(energies):
+            for ch in range(SCAN_CHANNELS):
+                amplitude = 8000.0 * (e + 1) / energies * (1.0 if ch == 0 else 0.1)
+                waves = pulse[:, None] * (amplitude * profile)[None, :] + rng.normal(0, 20, (samples, nz))
+                data[:, ch, 0, e, 0, 0, 0, :] = np.round(waves).astype('<i2')
+    header = MAT_HEADER.ljust(116).encode() + b'\0' * 8 + (0x0200).to_bytes(2, 'little') + b'IM'
+    with open(path, 'r+b') as f:
+        f.write(header.ljust(512, b'\0'))
+
+
+# ---- Fixture sets ----------------------------------------------------------
+
+def build(root=DEFAULT_ROOT, size='small', force=False, verbose=True):
+    """Generate (or reuse) the fixtures of ``size``; returns ``{kind: path}``."""
+    from tdr_export import export_file
+    params = dict(SIZES[size], version=FIXTURE_VERSION)
+    out = os.path.join(root, size)
+    paths = {'tdr': os.path.join(out, 'wp.tdr'), 'nominal_tdr': os.path.join(out, 'nominal.tdr'),
+             'grd': os.path.join(out, 'wp.grd'), 'dat': os.path.join(out, 'wp.dat'),
+             'nominal_dat': os.path.join(out, 'nominal.dat'), 'mat': os.path.join(out, 'zscan.mat')}
+    manifest = os.path.join(out, 'fixtures.json')
+    if not force and os.path.exists(manifest) and all(os.path.exists(p) for p in paths.values()):
+        with open(manifest) as f:
+            if json.load(f).get('params') == json.loads(json.dumps(params)):
+                return paths
+    os.makedirs(out, exist_ok=True)
+    start = time.perf_counter()
+    vertices, tets = box_mesh(*params['mesh'])
+    regions = _regions(vertices, tets)
+    write_tdr(paths['tdr'], vertices, regions, bias=1.0)
+    write_tdr(paths['nominal_tdr'], vertices, regions, bias=-100.0)
+    export_file(paths['tdr'], out)
+    export_file(paths['nominal_tdr'], out, write_grid=False)
+    write_mat(paths['mat'], *params['scan'])
+    sizes = {kind: os.path.getsize(p) for kind, p in paths.items()}
+    with open(manifest, 'w') as f:
+        json.dump({'params': params, 'vertices': len(vertices), 'tets': len(tets), 'bytes': sizes}, f, indent=1)
+    if verbose:
+        print(f"  ✓ {size}: {len(vertices):,} vertices, {len(tets):,} tetrahedra, "
+              f"{sum(sizes.values()) / 1e6:.0f} MB in {time.perf_counter() - start:.1f} s -> {out}")
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the synthetic benchmark fixtures')
+    parser.add_argument('-s', '--sizes', nargs='+', choices=list(SIZES), default=['small'])
+    parser.add_argument('-o', '--root', default=DEFAULT_ROOT)
+    parser.add_argument('--force', action='store_true', help='generate again even if up to date')
+    args = parser.parse_args(argv)
+    for size in args.sizes:
+        build(args.root, size, args.force)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
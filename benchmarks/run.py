@@ -0,0 +1,347 @@
+"""Time the pipeline's hot paths on synthetic fixtures and compare runs.
+
+Every (stage, size) runs in its own forked process: the fixture is built or
+reused (fixtures.py), the stage's setup runs untimed, then the stage is
+timed ``--repeat`` times. Peak memory is the process's maximum resident set
+size; ``peak_delta_mb`` is its growth over the level before the stage ran.
+Stages drive the production code (and the analysis scripts themselves,
+with the fixture paths on their command line):
+
+    dat.parse                  dfise.DatFile: every block of a .dat
+    dat.quality                wp_quality.check_file
+    dat.diff                   dat_diff.diff_files nominal.dat vs wp.dat
+    script.analyze_dat_problem / script.analyze_segment2 / script.compare_dat_files
+    grid.read                  dfise.read_grid (.grd)
+    tdr.read                   tdr.TdrFile: every dataset of a .tdr
+    tdr.export                 tdr_export.export_file (.tdr -> .grd/.dat)
+    script.analyze_tdr
+    lut.generate               tpa_lut.generate_charge_lut (Lookup_Table.ipynb)
+    fit.surface                tpa_fit.TpaSurface.build
+    scan.reduce                batch_measurement.zscan_profile (v7.3 .mat)
+    fit.zscan                  batch_measurement.fit_zscan (Measurement.ipynb)
+
+Results go to a JSON file with the commit, machine and per-stage timings,
+throughput and memory. ``--compare`` checks a run against an earlier one
+and exits with 1 when a stage got slower (or bigger) than ``--threshold``.
+
+Usage:
+    python benchmarks/run.py -s small medium -o bench_$(git rev-parse --short HEAD).json
+    python benchmarks/run.py --stages dat.parse dat.quality -s medium --repeat 5
+    python benchmarks/run.py -s medium --compare bench_main.json --threshold 1.2
+    python benchmarks/run.py --compare bench_main.json --results bench_branch.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from collections import namedtuple
+from queue import Empty
+
+import numpy as np
+
+import fixtures
+
+HERE = fixtures.HERE
+ROOT = fixtures.ROOT
+RESULT_FORMAT = 'diamond-bench-1'
+
+Stage = namedtuple('Stage', 'name run setup')
+
+
+def _megabytes(*paths):
+    return sum(os.path.getsize(p) for p in paths) / 1e6, 'MB'
+
+
+def _script(name, *args):
+    """Run an analysis script as ``python name args`` with its output discarded."""
+    argv = sys.argv
+    sys.argv = [name] + list(args)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            runpy.run_path(os.path.join(ROOT, name), run_name='__main__')
+    finally:
+        sys.argv = argv
+
+
+def dat_parse(paths, params, state):
+    from dfise import DatFile
+    with DatFile(paths['dat']) as dat:
+        for block in dat.blocks():
+            dat.values(block)
+    return _megabytes(paths['dat'])
+
+
+def dat_quality(paths, params, state):
+    import wp_quality
+    wp_quality.check_file(paths['dat'])
+    return _megabytes(paths['dat'])
+
+
+def dat_diff(paths, params, state):
+    from dat_diff import diff_files
+    diff_files(paths['nominal_dat'], paths['dat'])
+    return _megabytes(paths['nominal_dat'], paths['dat'])
+
+
+def analyze_dat_problem(paths, params, state):
+    _script('analyze_dat_problem.py', paths['dat'])
+    return _megabytes(paths['dat'])
+
+
+def analyze_segment2(paths, params, state):
+    _script('analyze_segment2.py', paths['dat'])
+    return _megabytes(paths['dat'])
+
+
+def compare_dat_files(paths, params, state):
+    _script('compare_dat_files.py', paths['nominal_dat'], paths['dat'])
+    return _megabytes(paths['nominal_dat'], paths['dat'])
+
+
+def grid_read(paths, params, state):
+    from dfise import read_grid
+    read_grid(paths['grd'])
+    return _megabytes(paths['grd'])
+
+
+def tdr_read(paths, params, state):
+    from tdr import TdrFile
+    with TdrFile(paths['tdr']) as tdr:
+        for info in tdr.datasets():
+            tdr.values(info)
+    return _megabytes(paths['tdr'])
+
+
+def tdr_export(paths, params, state):
+    from tdr_export import export_file
+    with tempfile.TemporaryDirectory() as out:
+        export_file(paths['tdr'], out)
+    return _megabytes(paths['tdr'])
+
+
+def analyze_tdr(paths, params, state):
+    _script('analyze_tdr.py', paths['tdr'])
+    return _megabytes(paths['tdr'])
+
+
+def lut_generate(paths, params, state):
+    from tpa_lut import generate_charge_lut
+    nz, nh, nr = params['lut']
+    generate_charge_lut(405e-9, 0.5, 2.4582, 1e-9, 0.0, 0.0, 18000, r_range=(0, 20e-6, nr),
+                        z_range=(0, 500e-6, nz), h_range=(-50e-6, 550e-6, nh))
+    return nz * nh * nr / 1e6, 'M cells'
+
+
+def fit_surface(paths, params, state):
+    from tpa_fit import DEFAULT_H, TpaSurface
+    nav, nh = params['surface']
+    TpaSurface.build(nav=np.linspace(0.1, 2.0, nav), h=np.linspace(DEFAULT_H[0], DEFAULT_H[1], nh))
+    return nav * nh / 1e6, 'M points'
+
+
+def scan_reduce(paths, params, state):
+    from batch_measurement import zscan_profile
+    zscan_profile(paths['mat'])
+    samples, _, nz = params['scan']
+    return samples * nz * 2 / 1e6, 'MB'
+
+
+def setup_fit_zscan(paths, params):
+    from batch_measurement import zscan_profile
+    from tpa_fit import DEFAULT_H, TpaSurface
+    nav, nh = params['surface']
+    surface = TpaSurface.build(nav=np.linspace(0.1, 2.0, nav), h=np.linspace(DEFAULT_H[0], DEFAULT_H[1], nh))
+    return surface, zscan_profile(paths['mat'])
+
+
+def fit_zscan(paths, params, state):
+    from batch_measurement import fit_zscan as fit
+    surface, (z, signal) = state
+    fit(z, signal, surface)
+    return 1, 'fits'
+
+
+STAGES = [Stage('dat.parse', dat_parse, None),
+          Stage('dat.quality', dat_quality, None),
+          Stage('dat.diff', dat_diff, None),
+          Stage('script.analyze_dat_problem', analyze_dat_problem, None),
+          Stage('script.analyze_segment2', analyze_segment2, None),
+          Stage('script.compare_dat_files', compare_dat_files, None),
+          Stage('grid.read', grid_read, None),
+          Stage('tdr.read', tdr_read, None),
+          Stage('tdr.export', tdr_export, None),
+          Stage('script.analyze_tdr', analyze_tdr, None),
+          Stage('lut.generate', lut_generate, None),
+          Stage('fit.surface', fit_surface, None),
+          Stage('scan.reduce', scan_reduce, None),
+          Stage('fit.zscan', fit_zscan, setup_fit_zscan)]
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+
+def _measure(stage, paths, params, repeat, queue):
+    """Child process: setup, then ``repeat`` timed runs of one stage."""
+    try:
+        for path in (ROOT, os.path.join(ROOT, 'Ground_control')):
+            if path not in sys.path:
+                sys.path.insert(0, path)
+        state = stage.setup(paths, params) if stage.setup else None
+        rss_before = _max_rss_mb()
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            amount, unit = stage.run(paths, params, state)
+            seconds.append(time.perf_counter() - start)
+        peak = _max_rss_mb()
+        queue.put({'seconds': seconds, 'amount': amount, 'unit': unit,
+                   'peak_rss_mb': peak, 'peak_delta_mb': peak - rss_before})
+    except Exception:
+        queue.put({'error': traceback.format_exc()})
+
+
+def run_stage(stage, paths, params, repeat=3):
+    """Measure one stage in a fresh process; returns the result dict."""
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(stage, paths, params, repeat, queue))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except Empty:
+            if process.is_alive():
+                continue
+        # The child is gone; anything it put is already in the pipe
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            result = {'error': f'{stage.name}: worker process exited with code {process.exitcode} '
+                               f'without a result (killed or crashed)'}
+        break
+    process.join()
+    if 'error' in result:
+        return result
+    seconds = result['seconds']
+    best, median = min(seconds), float(np.median(seconds))
+    result.update(best=best, median=median,
+                  throughput=result['amount'] / median if median > 0 else None,
+                  throughput_unit=f"{result['unit']}/s")
+    return result
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import h5py
+    import scipy
+    return {'commit': _git('rev-parse', 'HEAD'), 'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'h5py': h5py.__version__, 'platform': platform.platform(), 'machine': platform.machine(),
+            'cpus': os.cpu_count()}
+
+
+def run(stages, sizes, root, repeat=3):
+    """Benchmark ``stages`` at ``sizes``; returns the JSON-ready report."""
+    report = {'format': RESULT_FORMAT, 'environment': environment(), 'repeat': repeat, 'results': []}
+    for size in sizes:
+        paths = fixtures.build(root, size)
+        params = fixtures.SIZES[size]
+        for stage in stages:
+            result = run_stage(stage, paths, params, repeat)
+            result.update(stage=stage.name, size=size)
+            report['results'].append(result)
+            if 'error' in result:
+                print(f"  ✗ {stage.name:28s} {size:6s} {result['error'].strip().splitlines()[-1]}")
+                continue
+            print(f"  ✓ {stage.name:28s} {size:6s} {result['median']:9.3f} s  "
+                  f"{result['throughput']:10.2f} {result['throughput_unit']:12s} "
+                  f"peak {result['peak_rss_mb']:7.0f} MB (+{result['peak_delta_mb']:.0f})")
+    return report
+
+
+def compare(current, baseline, threshold=1.2):
+    """Print time and memory ratios of matching (stage, size); returns the regressions."""
+    before = {(r['stage'], r['size']): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    print(f"Compared with {baseline['environment'].get('commit') or 'baseline'} "
+          f"(threshold {threshold:g}x):")
+    for r in current['results']:
+        old = before.get((r['stage'], r['size']))
+        if old is None or 'error' in r:
+            continue
+        time_ratio = r['median'] / old['median'] if old['median'] > 0 else 1.0
+        memory_ratio = (r['peak_delta_mb'] / old['peak_delta_mb']
+                        if old['peak_delta_mb'] > 1 else 1.0)
+        slower = time_ratio > threshold or memory_ratio > threshold
+        if slower:
+            regressions.append((r['stage'], r['size'], time_ratio, memory_ratio))
+        print(f"  {'⚠️' if slower else '✓'} {r['stage']:28s} {r['size']:6s} time x{time_ratio:.2f}  "
+              f"memory x{memory_ratio:.2f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline on synthetic fixtures')
+    parser.add_argument('-s', '--sizes', nargs='+', choices=list(fixtures.SIZES), default=['small'])
+    parser.add_argument('--stages', nargs='+', metavar='STAGE',
+                        help=f"stages to run (default all): {' '.join(s.name for s in STAGES)}")
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage (median reported)')
+    parser.add_argument('--fixtures', default=fixtures.DEFAULT_ROOT, help='fixture directory')
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    parser.add_argument('--results', help='compare an existing results file instead of running')
+    parser.add_argument('--compare', help='baseline results JSON')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='time/memory ratio counted as a regression')
+    args = parser.parse_args(argv)
+
+    if args.results:
+        with open(args.results) as f:
+            report = json.load(f)
+    else:
+        stages = STAGES
+        if args.stages:
+            unknown = set(args.stages) - {s.name for s in STAGES}
+            if unknown:
+                parser.error(f"unknown stage(s): {' '.join(sorted(unknown))}")
+            stages = [s for s in STAGES if s.name in args.stages]
+        report = run(stages, args.sizes, args.fixtures, args.repeat)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=1)
+            print(f"Results written to {args.output}")
+    failed = any('error' in r for r in report['results'])
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        print(f"{len(regressions)} regression(s)")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""Element-wise diff of DF-ISE .dat files.
+
+Both files are memory-mapped and every matching dataset (same name and
+region) is streamed side by side chunk by chunk, so memory stays bounded
+whatever the file size. Per dataset the max absolute difference (and where
+it occurs), the RMS difference, the max difference relative to the largest
+absolute value in either dataset and the first index whose difference
+exceeds the tolerance are reported.
+
+Batch mode compares every ``*_des.dat`` slice of each folder against
+``nominal.dat`` (or against the previous slice) on a process pool; with
+``--fail-fast`` the pairs not started yet are cancelled at the first
+difference.
+
+Usage:
+    python dat_diff.py nominal.dat 1e-3/1e-3_000010_des.dat
+    python dat_diff.py --tol 1e-12 --fail-fast a.dat b.dat
+    python dat_diff.py --batch Data_link/DWF_Huazhen_c4/*/ --name ElectrostaticPotential
+    python dat_diff.py --batch --against previous -j 8 Data_link/DWF_Huazhen_c4/1e-3
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dfise import CHUNK_BYTES, DatFile
+
+DatasetDiff = namedtuple('DatasetDiff',
+                         'name region count max_abs argmax rms rel first_divergence complete')
+
+
+class DiffStats:
+    """Streaming difference counters for one pair of datasets."""
+
+    def __init__(self, tol=0.0):
+        self.tol = tol
+        self.n = 0
+        self.max_abs = 0.0
+        self.argmax = -1
+        self.sum_sq = 0.0
+        self.scale = 0.0
+        self.first_divergence = None
+
+    def update(self, a, b):
+        diff = np.abs(a - b)
+        if diff.size == 0:
+            return
+        i = int(np.argmax(diff))
+        if diff[i] > self.max_abs:
+            self.max_abs = float(diff[i])
+            self.argmax = self.n + i
+        self.sum_sq += float(np.dot(diff, diff))
+        self.scale = max(self.scale, float(np.abs(a).max()), float(np.abs(b).max()))
+        if self.first_divergence is None:
+            over = np.flatnonzero(diff > self.tol)
+            if over.size:
+                self.first_divergence = self.n + int(over[0])
+        self.n += diff.size
+
+    @property
+    def rms(self):
+        return float(np.sqrt(self.sum_sq / self.n)) if self.n else 0.0
+
+    @property
+    def rel(self):
+        return self.max_abs / self.scale if self.scale else 0.0
+
+
+def _paired_chunks(chunks_a, chunks_b):
+    """Re-cut two chunk streams so each yielded pair has the same length."""
+    buf_a = buf_b = np.empty(0)
+    it_a, it_b = iter(chunks_a), iter(chunks_b)
+    while True:
+        if buf_a.size == 0:
+            buf_a = next(it_a, None)
+        if buf_b.size == 0:
+            buf_b = next(it_b, None)
+        if buf_a is None or buf_b is None:
+            return
+        n = min(buf_a.size, buf_b.size)
+        yield buf_a[:n], buf_b[:n]
+        buf_a, buf_b = buf_a[n:], buf_b[n:]
+
+
+def diff_files(path_a, path_b, tol=0.0, names=None, regions=None, fail_fast=False,
+               chunk_bytes=CHUNK_BYTES):
+    """Compare two .dat files; returns ``(diffs, only_a, only_b, mismatched)``.
+
+    ``diffs`` is a list of ``DatasetDiff``; ``only_a``/``only_b`` list the
+    ``(name, region)`` keys present in one file only and ``mismatched`` those
+    whose value counts differ. With ``fail_fast`` streaming stops at the
+    first chunk exceeding ``tol`` (that entry has ``complete=False``).
+    """
+    diffs, mismatched = [], []
+    with DatFile(path_a) as dat_a, DatFile(path_b) as dat_b:
+        def select(dat):
+            return {(b.name, b.validity): b for b in dat.blocks()
+                    if (names is None or b.name in names)
+                    and (regions is None or b.validity in regions)}
+        blocks_a, blocks_b = select(dat_a), select(dat_b)
+        for key, block_a in blocks_a.items():
+            block_b = blocks_b.get(key)
+            if block_b is None:
+                continue
+            if block_a.count != block_b.count:
+                mismatched.append(key)
+                continue
+            stats = DiffStats(tol)
+            complete = True
+            for a, b in _paired_chunks(dat_a.chunks(block_a, chunk_bytes),
+                                       dat_b.chunks(block_b, chunk_bytes)):
+                stats.update(a, b)
+                if fail_fast and stats.first_divergence is not None:
+                    complete = stats.n == block_a.count
+                    break
+            diffs.append(DatasetDiff(key[0], key[1], block_a.count, stats.max_abs, stats.argmax,
+                                     stats.rms, stats.rel, stats.first_divergence, complete))
+            if fail_fast and stats.first_divergence is not None:
+                break
+        only_a = [k for k in blocks_a if k not in blocks_b]
+        only_b = [k for k in blocks_b if k not in blocks_a]
+    return diffs, only_a, only_b, mismatched
+
+
+def _pair_job(args):
+    path_a, path_b, kwargs = args
+    start = time.perf_counter()
+    try:
+        result = diff_files(path_a, path_b, **kwargs)
+    except Exception as e:
+        return path_a, path_b, e, time.perf_counter() - start
+    return path_a, path_b, result, time.perf_counter() - start
+
+
+def batch_pairs(folders, against='nominal', nominal=None):
+    """``(reference, slice)`` pairs for every ``*_des.dat`` in each folder."""
+    pairs = []
+    for folder in folders:
+        slices = sorted(glob.glob(os.path.join(folder, '*_des.dat')))
+        if against == 'previous':
+            pairs.extend(zip(slices[:-1], slices[1:]))
+        else:
+            reference = nominal or os.path.join(os.path.dirname(os.path.abspath(folder)), 'nominal.dat')
+            pairs.extend((reference, path) for path in slices)
+    return pairs
+
+
+def _print_result(path_a, path_b, result, tol):
+    diffs, only_a, only_b, mismatched = result
+    print(f"\n{path_a}  vs  {path_b}")
+    print(f"  {'dataset':<28} {'region':<14} {'values':>9} {'max |Δ|':>11} {'at':>9} "
+          f"{'rms':>11} {'rel':>9} {'first>tol':>9}")
+    for d in diffs:
+        mark = '✓' if d.max_abs <= tol else '✗'
+        first = '-' if d.first_divergence is None else str(d.first_divergence)
+        partial = '' if d.complete else '  (stopped early)'
+        print(f"{mark} {d.name:<28} {d.region:<14} {d.count:>9,} {d.max_abs:>11.4e} {d.argmax:>9} "
+              f"{d.rms:>11.4e} {d.rel:>9.2e} {first:>9}{partial}")
+    for label, keys in (('only in first', only_a), ('only in second', only_b),
+                        ('value count differs', mismatched)):
+        for name, region in keys:
+            print(f"⚠️  {label}: {name} ({region})")
+
+
+def _differs(result, tol):
+    diffs, only_a, only_b, mismatched = result
+    return bool(mismatched) or any(d.max_abs > tol for d in diffs)
+
+
+def _report(results, args):
+    differing = failed = 0
+    for path_a, path_b, result, seconds in results:
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"\n✗ {path_a} vs {path_b}: {result}")
+            continue
+        _print_result(path_a, path_b, result, args.tol)
+        differing += _differs(result, args.tol)
+        if args.fail_fast and differing:
+            break
+    return differing, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Element-wise diff of DF-ISE .dat files')
+    parser.add_argument('paths', nargs='+', help='two .dat files, or folders with --batch')
+    parser.add_argument('--tol', type=float, default=0.0, help='absolute tolerance (default: 0)')
+    parser.add_argument('--fail-fast', action='store_true', help='stop at the first difference above --tol')
+    parser.add_argument('--name', action='append', help='only this dataset name (repeatable)')
+    parser.add_argument('--region', action='append', help='only this region (repeatable)')
+    parser.add_argument('--batch', action='store_true', help='compare every *_des.dat slice of each folder')
+    parser.add_argument('--against', choices=('nominal', 'previous'), default='nominal',
+                        help='batch reference: nominal.dat next to the folders, or slice N-1')
+    parser.add_argument('--nominal', help='explicit reference file for --against nominal')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    args = parser.parse_args(argv)
+
+    kwargs = {'tol': args.tol, 'fail_fast': args.fail_fast,
+              'names': set(args.name) if args.name else None,
+              'regions': set(args.region) if args.region else None}
+    if args.batch:
+        pairs = batch_pairs(args.paths, args.against, args.nominal)
+    elif len(args.paths) == 2:
+        pairs = [tuple(args.paths)]
+    else:
+        parser.error('give exactly two files, or folders with --batch')
+    if not pairs:
+        print("No *_des.dat files found.")
+        return 1
+
+    start = time.perf_counter()
+    jobs = [(a, b, kwargs) for a, b in pairs]
+    if len(jobs) == 1 or args.jobs == 1:
+        differing, failed = _report(map(_pair_job, jobs), args)
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(_pair_job, job) for job in jobs]
+            differing, failed = _report((future.result() for future in futures), args)
+            # Stopped early (--fail-fast): drop the pairs that have not started
+            pool.shutdown(cancel_futures=True)
+    print(f"\n{len(pairs)} pair(s): {differing} differ, {failed} failed "
+          f"({time.perf_counter() - start:.2f} s)")
+    return 1 if differing or failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
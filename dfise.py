@@ -0,0 +1,410 @@
+"""Streaming reader (and writer) for DF-ISE text field maps written by tdx.
+
+The file is memory-mapped and tokenized in a single forward pass; each
+``Dataset`` block is located by its header and its ``Values`` are only
+converted to a float64 array when that dataset is actually requested, so
+peak memory stays close to the size of one dataset. ``read_grid`` turns a
+.grd file into tetrahedra/triangle vertex tables. ``write_dat`` and
+``write_grd`` produce files that Garfield's ComponentTcad3d can load;
+``write_subset`` copies selected datasets of a .dat file verbatim.
+
+Usage:
+    from dfise import iter_datasets
+    for ds in iter_datasets('1e-3_000010_des.dat', names={'ElectrostaticPotential'}):
+        print(ds.name, ds.validity, ds.count, ds.values.mean())
+"""
+import mmap
+import re
+from collections import namedtuple
+
+import numpy as np
+
+Dataset = namedtuple('Dataset', 'name validity count dimension values')
+Block = namedtuple('Block', 'index name validity count dimension start stop offset end')
+Grid = namedtuple('Grid', 'vertices tets tet_region triangles triangle_region regions materials')
+
+_DATASET_RE = re.compile(rb'Dataset\s*\(\s*"([^"]*)"\s*\)\s*\{')
+_VALUES_RE = re.compile(rb'Values\s*\(\s*([0-9]+)\s*\)\s*\{')
+_VALIDITY_RE = re.compile(rb'validity\s*=\s*\[([^\]]*)\]')
+_DIMENSION_RE = re.compile(rb'dimension\s*=\s*([0-9]+)')
+_INFO_LIST_RE = re.compile(rb'(\w+)\s*=\s*\[([^\]]*)\]')
+_INFO_SCALAR_RE = re.compile(rb'(\w+)\s*=\s*([^\s\[\]]+)')
+_VERTICES_RE = re.compile(rb'Vertices\s*\(\s*([0-9]+)\s*\)\s*\{')
+_REGION_RE = re.compile(rb'Region\s*\(\s*"([^"]*)"\s*\)\s*\{\s*material\s*=\s*(\S+)\s*'
+                        rb'Elements\s*\(\s*([0-9]+)\s*\)\s*\{')
+
+# DF-ISE element type -> number of edge (2D) or face (3D) references per element
+_ELEMENT_SIZES = {1: 2, 2: 3, 3: 4, 5: 4, 6: 5, 7: 5, 8: 6}
+TRIANGLE = 2
+TETRAHEDRON = 5
+
+# Default size of the text slices handed to the number parser when streaming
+CHUNK_BYTES = 1 << 22
+
+
+class DatFileError(ValueError):
+    """Raised when a file does not look like a DF-ISE dataset file."""
+
+
+def _parse_list(raw):
+    items = re.findall(rb'"([^"]*)"|(\S+)', raw)
+    return [(quoted or bare).decode() for quoted, bare in items]
+
+
+class DatFile:
+    """Memory-mapped DF-ISE .dat file.
+
+    ``blocks()`` walks the Dataset headers without converting any numbers,
+    ``values()``/``chunks()`` parse the text of one block on demand.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._fh = open(self.path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._fh.close()
+            raise DatFileError(f'{self.path}: empty file')
+        if not self._mm[:64].lstrip().startswith(b'DF-ISE'):
+            self.close()
+            raise DatFileError(f'{self.path}: not a DF-ISE file')
+        self._data_start = self._mm.find(b'Data {')
+        if self._data_start < 0:
+            self._data_start = len(self._mm)
+        self.info = self._read_info()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_info(self):
+        """Parse the ``Info { ... }`` header into a dict."""
+        start = self._mm.find(b'Info {', 0, self._data_start)
+        if start < 0:
+            return {}
+        end = self._mm.find(b'}', start, self._data_start)
+        header = self._mm[start + len(b'Info {'):end]
+        info = {}
+        for key, raw in _INFO_LIST_RE.findall(header):
+            info[key.decode()] = _parse_list(raw)
+        for key, raw in _INFO_SCALAR_RE.findall(header):
+            key = key.decode()
+            if key in info:
+                continue
+            text = raw.decode()
+            try:
+                info[key] = int(text)
+            except ValueError:
+                try:
+                    info[key] = float(text)
+                except ValueError:
+                    info[key] = text
+        return info
+
+    def blocks(self):
+        """Yield a ``Block`` per Dataset.
+
+        ``start``/``stop`` is the byte span of the Values, ``offset``/``end``
+        that of the whole ``Dataset (...) { ... }`` block.
+        """
+        mm = self._mm
+        pos = self._data_start
+        index = 0
+        while True:
+            match = _DATASET_RE.search(mm, pos)
+            if match is None:
+                return
+            values = _VALUES_RE.search(mm, match.end())
+            if values is None:
+                raise DatFileError(f'{self.path}: Dataset "{match.group(1).decode()}" has no Values')
+            header = mm[match.end():values.start()]
+            validity = _VALIDITY_RE.search(header)
+            dimension = _DIMENSION_RE.search(header)
+            stop = mm.find(b'}', values.end())
+            end = mm.find(b'}', stop + 1) if stop >= 0 else -1
+            if end < 0:
+                raise DatFileError(f'{self.path}: unterminated Values block')
+            yield Block(index=index,
+                        name=match.group(1).decode(),
+                        validity=_parse_list(validity.group(1))[0] if validity else '',
+                        count=int(values.group(1)),
+                        dimension=int(dimension.group(1)) if dimension else 1,
+                        start=values.end(),
+                        stop=stop,
+                        offset=match.start(),
+                        end=end + 1)
+            index += 1
+            pos = end + 1
+
+    def values(self, block):
+        """Return all values of ``block`` as float64 (shape (n, dim) for vectors)."""
+        values = np.fromstring(self._mm[block.start:block.stop], sep=' ')
+        if values.size != block.count:
+            raise DatFileError(f'{self.path}: Dataset "{block.name}" ({block.validity}) '
+                               f'declares {block.count} values, found {values.size}')
+        if block.dimension > 1:
+            values = values.reshape(-1, block.dimension)
+        return values
+
+    def chunks(self, block, chunk_bytes=CHUNK_BYTES):
+        """Yield the flat values of ``block`` as consecutive float64 arrays.
+
+        Slices are cut on whitespace so no number is split; memory use is
+        bounded by ``chunk_bytes`` regardless of the dataset size.
+        """
+        mm = self._mm
+        pos = block.start
+        total = 0
+        while pos < block.stop:
+            end = min(pos + chunk_bytes, block.stop)
+            if end < block.stop:
+                cut = max(mm.rfind(b'\n', pos, end), mm.rfind(b' ', pos, end))
+                if cut > pos:
+                    end = cut
+            values = np.fromstring(mm[pos:end], sep=' ')
+            total += values.size
+            if values.size:
+                yield values
+            pos = end
+        if total != block.count:
+            raise DatFileError(f'{self.path}: Dataset "{block.name}" ({block.validity}) '
+                               f'declares {block.count} values, found {total}')
+
+    def datasets(self, names=None, regions=None):
+        """Lazily yield ``Dataset`` tuples, optionally filtered by name/region."""
+        for block in self.blocks():
+            if names is not None and block.name not in names:
+                continue
+            if regions is not None and block.validity not in regions:
+                continue
+            yield Dataset(block.name, block.validity, block.count, block.dimension,
+                          self.values(block))
+
+
+def iter_datasets(path, names=None, regions=None):
+    """Yield the datasets of a DF-ISE .dat file one at a time."""
+    with DatFile(path) as dat:
+        yield from dat.datasets(names, regions)
+
+
+def read_info(path):
+    """Return the parsed ``Info`` header of a DF-ISE file."""
+    with DatFile(path) as dat:
+        return dat.info
+
+
+def read_vertices(path):
+    """Return the ``Vertices`` table of a DF-ISE .grd file as an (n, 3) array."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        match = _VERTICES_RE.search(mm)
+        if match is None:
+            raise DatFileError(f'{path}: no Vertices block')
+        count = int(match.group(1))
+        stop = mm.find(b'}', match.end())
+        values = np.fromstring(mm[match.end():stop], sep=' ')
+    if values.size != 3 * count:
+        raise DatFileError(f'{path}: Vertices declares {count} points, found {values.size / 3:g}')
+    return values.reshape(count, 3)
+
+
+def _table(mm, name, pos=0):
+    """Integers of the ``<name> (n) { ... }`` block at or after ``pos``; returns (values, n, end)."""
+    match = re.compile(name + rb'\s*\(\s*([0-9]+)\s*\)\s*\{').search(mm, pos)
+    if match is None:
+        raise DatFileError(f'no {name.decode()} block')
+    stop = mm.find(b'}', match.end())
+    return np.fromstring(mm[match.end():stop], dtype=np.int64, sep=' '), int(match.group(1)), stop + 1
+
+
+def _unsigned(refs):
+    # Negative references are reversed edges/faces: -1 - index
+    return np.where(refs < 0, -1 - refs, refs)
+
+
+def _split_elements(stream):
+    """``{type: (n, size) refs}`` and ``{type: global element indices}`` of an Elements stream."""
+    tables, indices = {}, {}
+    pos = element = 0
+    while pos < stream.size:
+        etype = int(stream[pos])
+        if etype not in _ELEMENT_SIZES:
+            raise DatFileError(f'unsupported element type {etype}')
+        width = _ELEMENT_SIZES[etype] + 1
+        # Length of the run of elements of this type starting here
+        heads = stream[pos::width]
+        run = np.flatnonzero(heads != etype)
+        run = int(run[0]) if run.size else heads.size
+        run = min(run, (stream.size - pos) // width)
+        rows = stream[pos:pos + run * width].reshape(run, width)[:, 1:]
+        tables.setdefault(etype, []).append(rows)
+        indices.setdefault(etype, []).append(np.arange(element, element + run))
+        pos += run * width
+        element += run
+    return ({t: np.concatenate(v) for t, v in tables.items()},
+            {t: np.concatenate(v) for t, v in indices.items()})
+
+
+def read_grid(path):
+    """Read a 3D DF-ISE .grd file into vertex-indexed element tables.
+
+    Returns a ``Grid``: ``tets`` (n, 4) and ``triangles`` (m, 3) vertex
+    indices, ``tet_region``/``triangle_region`` the index into ``regions``
+    (-1 for elements in no region). Only tetrahedral meshes (with triangle
+    contacts) are supported, which is what tdx and tdr_export write.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        vertices = read_vertices(path)
+        edges, nb_edges, pos = _table(mm, rb'Edges')
+        faces, nb_faces, pos = _table(mm, rb'Faces', pos)
+        stream, nb_elements, pos = _table(mm, rb'Elements', pos)
+        regions, materials, owner = [], [], np.full(nb_elements, -1)
+        for match in _REGION_RE.finditer(mm, pos):
+            stop = mm.find(b'}', match.end())
+            members = np.fromstring(mm[match.end():stop], dtype=np.int64, sep=' ')
+            owner[members] = len(regions)
+            regions.append(match.group(1).decode())
+            materials.append(match.group(2).decode())
+    edges = edges.reshape(nb_edges, 2)
+    # Faces are "<n> e0 .. e(n-1)"; a tetrahedral mesh has triangles only
+    faces = faces.reshape(nb_faces, -1)
+    if faces.shape[1] != 4 or np.any(faces[:, 0] != 3):
+        raise DatFileError(f'{path}: only triangular faces are supported')
+    tables, indices = _split_elements(stream)
+    if set(tables) - {TRIANGLE, TETRAHEDRON}:
+        raise DatFileError(f'{path}: element types {sorted(tables)}, only tetrahedra and triangles are supported')
+
+    def triangle_vertices(edge_refs):
+        # Every vertex of a triangle is shared by two of its edges
+        return np.sort(edges[_unsigned(edge_refs)].reshape(-1, 6), axis=1)[:, ::2]
+
+    face_vertices = triangle_vertices(faces[:, 1:])
+    empty = np.empty(0, dtype=np.int64)
+    tets = tables.get(TETRAHEDRON, np.empty((0, 4), np.int64))
+    # Every vertex of a tetrahedron is shared by three of its faces
+    tets = np.sort(face_vertices[_unsigned(tets)].reshape(-1, 12), axis=1)[:, ::3]
+    triangles = triangle_vertices(tables.get(TRIANGLE, np.empty((0, 3), np.int64)))
+    return Grid(vertices=vertices, tets=tets, tet_region=owner[indices.get(TETRAHEDRON, empty)],
+                triangles=triangles, triangle_region=owner[indices.get(TRIANGLE, empty)],
+                regions=regions, materials=materials)
+
+
+# ---- Writers ---------------------------------------------------------------
+
+VALUES_PER_LINE = 10
+
+
+def _quote(names):
+    return ' '.join(f'"{n}"' for n in names)
+
+
+def _write_table(f, array, fmt, per_line=None):
+    """Write a 2D table (or a flat array ``per_line`` values per line) as text."""
+    array = np.asarray(array)
+    if per_line is not None:
+        flat = array.reshape(-1)
+        full = flat.size - flat.size % per_line
+        if full:
+            np.savetxt(f, flat[:full].reshape(-1, per_line), fmt=fmt, delimiter=' ')
+        if flat.size > full:
+            np.savetxt(f, flat[full:].reshape(1, -1), fmt=fmt, delimiter=' ')
+    elif array.size:
+        np.savetxt(f, array, fmt=fmt, delimiter=' ')
+
+
+def write_dat(path, datasets, nb_vertices, regions):
+    """Write ``datasets`` (an iterable of ``Dataset``) as a DF-ISE .dat file.
+
+    ``regions`` lists all region names of the matching grid. Vertex values of
+    a region must be ordered by ascending global vertex index, which is how
+    Garfield's ComponentTcad reads them back.
+    """
+    datasets = list(datasets)
+    with open(path, 'w') as f:
+        f.write('DF-ISE text\n\nInfo {\n')
+        f.write('  version   = 1.0\n  type      = dataset\n  dimension = 3\n')
+        f.write(f'  nb_vertices = {nb_vertices}\n  nb_edges    = 0\n  nb_faces    = 0\n'
+                f'  nb_elements = 0\n  nb_regions  = {len(regions)}\n')
+        f.write(f'  datasets    = [ {_quote(ds.name for ds in datasets)} ]\n')
+        f.write(f'  functions   = [ {" ".join(ds.name for ds in datasets)} ]\n}}\n\nData {{\n')
+        for ds in datasets:
+            values = np.asarray(ds.values, dtype=np.float64)
+            kind = 'scalar' if ds.dimension == 1 else 'vector'
+            f.write(f'\n  Dataset ("{ds.name}") {{\n'
+                    f'    function  = {ds.name}\n    type      = {kind}\n'
+                    f'    dimension = {ds.dimension}\n    location  = vertex\n'
+                    f'    validity  = [ "{ds.validity}" ]\n\n    Values ({values.size}) {{\n')
+            _write_table(f, values, '%.15e', per_line=VALUES_PER_LINE)
+            f.write('    }\n  }\n')
+        f.write('\n}\n')
+
+
+def write_subset(src, path, names):
+    """Copy the datasets of ``src`` whose name is in ``names`` to ``path``.
+
+    The Dataset blocks are copied byte for byte (no number is reformatted);
+    the ``datasets``/``functions`` lists of the Info header are updated.
+    """
+    with DatFile(src) as dat:
+        blocks = [b for b in dat.blocks() if b.name in names]
+        mm = dat._mm
+        header = mm[:dat._data_start]
+        kept = [b.name for b in blocks]
+        header = re.sub(rb'datasets\s*=\s*\[[^\]]*\]',
+                        f'datasets    = [ {_quote(kept)} ]'.encode(), header, count=1)
+        header = re.sub(rb'functions\s*=\s*\[[^\]]*\]',
+                        f'functions   = [ {" ".join(kept)} ]'.encode(), header, count=1)
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.write(b'Data {\n')
+            for block in blocks:
+                f.write(b'\n  ')
+                f.write(mm[block.offset:block.end])
+                f.write(b'\n')
+            f.write(b'\n}\n')
+    return kept
+
+
+def write_grd(path, vertices, edges, faces, elements, regions):
+    """Write a 3D DF-ISE grid.
+
+    ``edges`` is (n, 2) vertex indices, ``faces`` (n, 3) edge indices and
+    ``elements`` a list of ``(type, rows)`` tables in global element order
+    (type 5 rows are 4 face indices, type 2 rows 3 edge indices).
+    ``regions`` is a list of ``(name, material, element_indices)``.
+    """
+    nb_elements = sum(len(rows) for _, rows in elements)
+    with open(path, 'w') as f:
+        f.write('DF-ISE text\n\nInfo {\n')
+        f.write('  version   = 1.0\n  type      = grid\n  dimension = 3\n')
+        f.write(f'  nb_vertices = {len(vertices)}\n  nb_edges    = {len(edges)}\n'
+                f'  nb_faces    = {len(faces)}\n  nb_elements = {nb_elements}\n'
+                f'  nb_regions  = {len(regions)}\n')
+        f.write(f'  regions   = [ {_quote(name for name, _, _ in regions)} ]\n')
+        f.write(f'  materials = [ {" ".join(material for _, material, _ in regions)} ]\n}}\n\n')
+        f.write('Data {\n  CoordSystem {\n    translate = [ 0 0 0 ]\n'
+                '    transform = [ 1 0 0 0 1 0 0 0 1 ]\n  }\n\n')
+        f.write(f'  Vertices ({len(vertices)}) {{\n')
+        _write_table(f, vertices, '%.15e')
+        f.write(f'  }}\n\n  Edges ({len(edges)}) {{\n')
+        _write_table(f, edges, '%d')
+        f.write(f'  }}\n\n  Faces ({len(faces)}) {{\n')
+        _write_table(f, np.column_stack([np.full(len(faces), 3), faces]), '%d')
+        f.write(f'  }}\n\n  Elements ({nb_elements}) {{\n')
+        for etype, rows in elements:
+            _write_table(f, np.column_stack([np.full(len(rows), etype), rows]), '%d')
+        f.write('  }\n')
+        for name, material, indices in regions:
+            f.write(f'\n  Region ("{name}") {{\n    material = {material}\n'
+                    f'    Elements ({len(indices)}) {{\n')
+            _write_table(f, indices, '%d', per_line=VALUES_PER_LINE)
+            f.write('    }\n  }\n')
+        f.write('\n}\n')
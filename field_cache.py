@@ -0,0 +1,284 @@
+"""Binary cache of parsed DF-ISE field maps.
+
+Parsing a multi-MB ASCII .dat file is done once; every dataset is then kept
+as a ``.npy`` file in a cache directory and later loaded with
+``np.load(mmap_mode='r')``. Entries are keyed on the source path, size and
+mtime (or optionally a content hash), so an edited or re-exported file gets
+a fresh entry automatically. The cache is bounded in size and evicts the
+least recently used entries first.
+
+The cache lives in ``$DIAMOND_FIELD_CACHE`` (default
+``~/.cache/diamond_pipeline/fieldmaps``).
+
+Usage:
+    from field_cache import load_dat, load_grid
+    for ds in load_dat('nominal.dat', names={'ElectrostaticPotential'}):
+        ...
+    grid = load_grid('nominal.grd')
+
+    python field_cache.py list
+    python field_cache.py warm Data_link/DWF_Huazhen_c4/1e-3/*.dat nominal.grd
+    python field_cache.py invalidate nominal.dat
+    python field_cache.py prune          # drop entries whose source changed
+    python field_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from dfise import Dataset, DatFile, Grid, read_grid
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'diamond_pipeline', 'fieldmaps')
+DEFAULT_MAX_BYTES = 2 << 30
+INDEX_NAME = 'index.json'
+FORMAT_VERSION = 1
+GRID_ARRAYS = ('vertices', 'tets', 'tet_region', 'triangles', 'triangle_region')
+
+
+def cache_dir():
+    return os.environ.get('DIAMOND_FIELD_CACHE', DEFAULT_CACHE_DIR)
+
+
+def max_bytes():
+    return int(os.environ.get('DIAMOND_FIELD_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+
+def file_identity(path, content=False):
+    """Return the identity dict of ``path`` (realpath, size, mtime[, sha256])."""
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    ident = {'path': path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if content:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        ident['sha256'] = digest.hexdigest()
+        # Content-addressed entries survive a touch or a copy of the file
+        del ident['mtime_ns']
+        del ident['path']
+    return ident
+
+
+def _key(ident, kind):
+    raw = json.dumps([FORMAT_VERSION, kind, ident], sort_keys=True).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _entries(root):
+    if not os.path.isdir(root):
+        return
+    for key in os.listdir(root):
+        index = os.path.join(root, key, INDEX_NAME)
+        if os.path.isfile(index):
+            yield key, index
+
+
+def _entry_bytes(entry_dir):
+    return sum(e.stat().st_size for e in os.scandir(entry_dir) if e.is_file())
+
+
+def _touch(index):
+    # The index mtime doubles as the LRU access time
+    try:
+        os.utime(index)
+    except OSError:
+        pass
+
+
+def evict(limit=None, root=None, keep=None):
+    """Remove least recently used entries until the cache is below ``limit`` bytes.
+
+    ``keep`` (an entry directory) is never removed, e.g. the one just built.
+    """
+    root = root or cache_dir()
+    limit = max_bytes() if limit is None else limit
+    entries = []
+    for key, index in _entries(root):
+        entry_dir = os.path.dirname(index)
+        entries.append((os.stat(index).st_mtime, _entry_bytes(entry_dir), entry_dir))
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, entry_dir in sorted(entries):
+        if total <= limit:
+            break
+        if entry_dir == keep:
+            continue
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        removed.append(entry_dir)
+    return removed
+
+
+def _lookup(path, kind, build, content=False, root=None):
+    """Return ``(meta, entry_dir)`` for ``path``, building the entry if needed.
+
+    ``build(path)`` returns ``(meta, arrays)`` where ``arrays`` maps file
+    names to ndarrays; ``meta`` must be JSON serialisable.
+    """
+    root = root or cache_dir()
+    ident = file_identity(path, content)
+    entry_dir = os.path.join(root, _key(ident, kind))
+    index = os.path.join(entry_dir, INDEX_NAME)
+    if os.path.isfile(index):
+        with open(index) as f:
+            meta = json.load(f)
+        _touch(index)
+        return meta['meta'], entry_dir
+
+    meta, arrays = build(path)
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=root)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, name), np.ascontiguousarray(array), allow_pickle=False)
+        with open(os.path.join(tmp_dir, INDEX_NAME), 'w') as f:
+            json.dump({'version': FORMAT_VERSION, 'kind': kind, 'source': os.path.realpath(path),
+                       'identity': ident, 'created': time.time(), 'meta': meta}, f, indent=1)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Another process published the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    evict(root=root, keep=entry_dir)
+    return meta, entry_dir
+
+
+def _build_dat(path):
+    meta = []
+    arrays = {}
+    with DatFile(path) as dat:
+        for block in dat.blocks():
+            filename = f'{block.index:03d}.npy'
+            arrays[filename] = dat.values(block)
+            meta.append({'file': filename, 'name': block.name, 'validity': block.validity,
+                         'count': block.count, 'dimension': block.dimension})
+    return {'info': dat.info, 'datasets': meta}, arrays
+
+
+def load_dat(path, names=None, regions=None, content=False, mmap_mode='r'):
+    """Return the datasets of a .dat file, parsing it only on a cache miss.
+
+    Values are memory-mapped read-only ``.npy`` arrays.
+    """
+    meta, entry_dir = _lookup(path, 'dat', _build_dat, content)
+    datasets = []
+    for ds in meta['datasets']:
+        if names is not None and ds['name'] not in names:
+            continue
+        if regions is not None and ds['validity'] not in regions:
+            continue
+        values = np.load(os.path.join(entry_dir, ds['file']), mmap_mode=mmap_mode)
+        datasets.append(Dataset(ds['name'], ds['validity'], ds['count'], ds['dimension'], values))
+    return datasets
+
+
+def _build_grid(path):
+    grid = read_grid(path)
+    arrays = {f'{name}.npy': getattr(grid, name) for name in GRID_ARRAYS}
+    return {'regions': grid.regions, 'materials': grid.materials}, arrays
+
+
+def load_grid(path, content=False, mmap_mode='r'):
+    """Return the ``dfise.Grid`` of a .grd file, parsing it only on a cache miss."""
+    meta, entry_dir = _lookup(path, 'grid', _build_grid, content)
+    arrays = {name: np.load(os.path.join(entry_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+              for name in GRID_ARRAYS}
+    return Grid(regions=meta['regions'], materials=meta['materials'], **arrays)
+
+
+def invalidate(paths, root=None):
+    """Drop every cache entry built from any of ``paths``."""
+    root = root or cache_dir()
+    targets = {os.path.realpath(p) for p in paths}
+    removed = []
+    for key, index in _entries(root):
+        with open(index) as f:
+            source = json.load(f).get('source')
+        if source in targets:
+            shutil.rmtree(os.path.dirname(index), ignore_errors=True)
+            removed.append(source)
+    return removed
+
+
+def prune(root=None):
+    """Drop entries whose source file is gone or no longer matches its identity."""
+    root = root or cache_dir()
+    removed = []
+    for key, index in _entries(root):
+        with open(index) as f:
+            entry = json.load(f)
+        source = entry.get('source')
+        try:
+            stale = _key(file_identity(source, 'sha256' in entry['identity']), entry['kind']) != key
+        except OSError:
+            stale = True
+        if stale:
+            shutil.rmtree(os.path.dirname(index), ignore_errors=True)
+            removed.append(source)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the binary field-map cache')
+    parser.add_argument('--cache-dir', help='override $DIAMOND_FIELD_CACHE')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='list cached files')
+    warm = sub.add_parser('warm', help='parse files into the cache')
+    warm.add_argument('paths', nargs='+')
+    warm.add_argument('--content-hash', action='store_true', help='key on sha256 instead of mtime')
+    inv = sub.add_parser('invalidate', help='drop the entries of the given source files')
+    inv.add_argument('paths', nargs='+')
+    sub.add_parser('prune', help='drop entries whose source changed or disappeared')
+    ev = sub.add_parser('evict', help='apply the LRU size limit now')
+    ev.add_argument('--max-bytes', type=int)
+    sub.add_parser('clear', help='remove the whole cache')
+    args = parser.parse_args(argv)
+
+    if args.cache_dir:
+        os.environ['DIAMOND_FIELD_CACHE'] = args.cache_dir
+    root = cache_dir()
+
+    if args.command == 'list':
+        total = 0
+        for key, index in sorted(_entries(root), key=lambda e: os.stat(e[1]).st_mtime):
+            with open(index) as f:
+                entry = json.load(f)
+            size = _entry_bytes(os.path.dirname(index))
+            total += size
+            used = time.strftime('%Y-%m-%d %H:%M', time.localtime(os.stat(index).st_mtime))
+            print(f"{key[:12]}  {size / 1e6:9.1f} MB  {used}  {entry['source']}")
+        print(f"Total: {total / 1e6:.1f} MB in {root} (limit {max_bytes() / 1e6:.0f} MB)")
+    elif args.command == 'warm':
+        for path in args.paths:
+            start = time.perf_counter()
+            load = load_grid if path.endswith('.grd') else load_dat
+            load(path, content=args.content_hash)
+            print(f"  ✓ {path} ({time.perf_counter() - start:.2f} s)")
+    elif args.command == 'invalidate':
+        for source in invalidate(args.paths):
+            print(f"  removed {source}")
+    elif args.command == 'prune':
+        for source in prune():
+            print(f"  removed {source}")
+    elif args.command == 'evict':
+        for entry_dir in evict(args.max_bytes):
+            print(f"  removed {entry_dir}")
+    elif args.command == 'clear':
+        shutil.rmtree(root, ignore_errors=True)
+        print(f"Removed {root}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
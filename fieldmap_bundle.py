@@ -0,0 +1,318 @@
+"""Pre-converted, shared field maps for Diamond_4p and the Python tools.
+
+Every Diamond_4p job parses nominal.grd/.dat, gnd.dat and the 21
+``<c>/<c>_NNNNNN_des.dat`` weighting-potential slices of one conductivity.
+``stage`` prepares a field-map directory for that once per machine:
+
+* a copy Diamond_4p reads with ``--fieldmap-dir`` (same layout as the
+  source). ComponentTcad3d only loads ASCII DF-ISE, so the weighting
+  potential files are slimmed to the ElectrostaticPotential/ElectricField
+  datasets it uses (copied byte for byte, ~4x smaller). The default target
+  is tmpfs (``/dev/shm``), so all jobs read the same cached pages; forked
+  ``--workers`` of a job share the parsed maps themselves.
+* ``<c>/bundle.bin``: the mesh vertices and the potential/field datasets
+  of nominal.dat, gnd.dat and the slices as raw float64 arrays in one file,
+  page aligned, memory-mapped by ``load`` without parsing. The Python tools
+  use it transparently: ``wp_query.Mesh.field`` (and so tpa_surrogate.py)
+  take the values of a staged .dat file from its bundle via
+  ``region_values`` instead of parsing the ASCII file:
+
+      char     magic[8]   "FMBNDL1\\0"
+      uint64   header_bytes                (multiple of 4096, little endian)
+      JSON header padded with spaces       (arrays: name -> offset, shape; sources)
+      float64  arrays...                   each starting on a 4096-byte boundary
+
+  Array names are ``vertices`` and ``<file>/<dataset>/<region>`` with
+  ``<file>`` one of ``nominal``, ``gnd`` or the slice number (``000010``).
+  Diamond_4p itself still reads the slimmed ASCII copy: ComponentTcad3d has
+  no other input.
+
+``bundle.json`` records the sha256 of every source file; ``stage`` checks
+them on each call and converts again whatever changed, so it is safe to run
+before every sweep (``tpa_sweep.py --stage-fieldmaps`` does).
+
+Usage:
+    python fieldmap_bundle.py /tmp/DWF_Huazhen_c4 -c 1e-3 1e-2     # -> /dev/shm/diamond_fieldmaps/DWF_Huazhen_c4
+    python fieldmap_bundle.py /tmp/DWF_Huazhen_c4 -c 1e-3 --check  # report stale files, convert nothing
+
+    from fieldmap_bundle import load, region_values
+    header, arrays = load('/dev/shm/diamond_fieldmaps/DWF_Huazhen_c4/1e-3/bundle.bin')
+    arrays['000010/ElectrostaticPotential/BULK']
+    region_values('/dev/shm/diamond_fieldmaps/DWF_Huazhen_c4/1e-3/1e-3_000010_des.dat')   # {region: values}
+"""
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from dfise import DatFile, read_vertices, write_subset
+
+DEFAULT_SOURCE = '/tmp/DWF_Huazhen_c4'
+SHM_ROOT = '/dev/shm'
+MANIFEST_NAME = 'bundle.json'
+BUNDLE_NAME = 'bundle.bin'
+BUNDLE_MAGIC = b'FMBNDL1\0'
+BUNDLE_HEADER = struct.Struct('<8sQ')
+ALIGN = 4096
+FORMAT_VERSION = 2
+# Datasets ComponentTcad3d reads from a weighting potential file
+WP_DATASETS = ('ElectrostaticPotential', 'ElectricField')
+
+
+def default_target(source):
+    """``/dev/shm/diamond_fieldmaps/<source name>`` (or the temp dir without tmpfs)."""
+    root = SHM_ROOT if os.path.isdir(SHM_ROOT) else tempfile.gettempdir()
+    return os.path.join(root, 'diamond_fieldmaps', os.path.basename(os.path.abspath(source).rstrip('/')))
+
+
+def file_sha256(path, chunk_bytes=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_bytes), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def slices(source, conductivity):
+    """Sorted ``<c>/<c>_NNNNNN_des.dat`` paths of one conductivity, relative to ``source``."""
+    pattern = os.path.join(source, conductivity, f'{conductivity}_*_des.dat')
+    return sorted(os.path.relpath(p, source) for p in glob.glob(pattern))
+
+
+def _slice_key(rel):
+    return os.path.basename(rel).rsplit('_', 2)[-2]
+
+
+def _atomic(path, write):
+    """Call ``write(tmp)`` and move the result to ``path``."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _read_manifest(target):
+    path = os.path.join(target, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'version': FORMAT_VERSION, 'files': {}, 'bundles': {}}
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != FORMAT_VERSION:
+        return {'version': FORMAT_VERSION, 'files': {}, 'bundles': {}}
+    return manifest
+
+
+def _write_manifest(target, manifest):
+    def write(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+    _atomic(os.path.join(target, MANIFEST_NAME), write)
+
+
+def write_bundle(path, grd, dat_files, datasets=WP_DATASETS):
+    """Write the vertices of ``grd`` and ``datasets`` of ``dat_files`` ({key: path}) as a bundle."""
+    vertices = read_vertices(grd)
+    arrays = [('vertices', vertices)]
+    for key, dat_path in dat_files.items():
+        with DatFile(dat_path) as dat:
+            for block in dat.blocks():
+                if block.name not in datasets:
+                    continue
+                arrays.append((f'{key}/{block.name}/{block.validity}', dat.values(block)))
+    entries, offset = {}, 0
+    for name, values in arrays:
+        entries[name] = {'offset': offset, 'shape': list(values.shape)}
+        offset += -(-values.nbytes // ALIGN) * ALIGN
+    header = json.dumps({'format': 'float64 little endian', 'nb_vertices': len(vertices),
+                         'arrays': entries}).encode()
+    header_bytes = -(-(BUNDLE_HEADER.size + len(header)) // ALIGN) * ALIGN
+    with open(path, 'wb') as f:
+        f.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, header_bytes))
+        f.write(header.ljust(header_bytes - BUNDLE_HEADER.size))
+        for name, values in arrays:
+            f.seek(header_bytes + entries[name]['offset'])
+            f.write(np.ascontiguousarray(values, dtype='<f8').tobytes())
+        f.truncate(header_bytes + offset)
+
+
+def load(path):
+    """Memory-map a bundle; returns ``(header, {name: read-only array})``.
+
+    All arrays are views of one shared mapping of the file, so processes
+    loading the same bundle share its pages.
+    """
+    with open(path, 'rb') as f:
+        magic, header_bytes = BUNDLE_HEADER.unpack(f.read(BUNDLE_HEADER.size))
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f'{path}: not a field-map bundle')
+        header = json.loads(f.read(header_bytes - BUNDLE_HEADER.size).decode())
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        count = int(np.prod(entry['shape']))
+        arrays[name] = np.frombuffer(mm, dtype='<f8', count=count,
+                                     offset=header_bytes + entry['offset']).reshape(entry['shape'])
+    return header, arrays
+
+
+# Bundles mapped by region_values, by path: (mtime_ns, arrays)
+_mapped = {}
+
+
+def _staged_root(path):
+    """Staged directory (with bundle.json) holding ``path`` directly or in a ``<c>/`` folder."""
+    folder = os.path.dirname(path)
+    for root in (folder, os.path.dirname(folder)):
+        if os.path.exists(os.path.join(root, MANIFEST_NAME)):
+            return root
+    return None
+
+
+def region_values(path, name='ElectrostaticPotential'):
+    """``{region: values}`` of dataset ``name`` of a staged .dat file, read from its bundle.
+
+    Returns None when ``path`` is not a staged file, its bundle is missing or
+    was built from other contents, or the dataset is not bundled; callers then
+    parse the file itself.
+    """
+    path = os.path.abspath(path)
+    root = _staged_root(path)
+    if root is None or name not in WP_DATASETS:
+        return None
+    rel = os.path.relpath(path, root)
+    manifest = _read_manifest(root)
+    known = manifest['files'].get(rel)
+    if known is None:
+        return None
+    if rel in ('nominal.dat', 'gnd.dat'):
+        key, candidates = rel[:-len('.dat')], sorted(manifest['bundles'])
+    else:
+        key, candidates = _slice_key(rel), [os.path.dirname(rel)]
+    for c in candidates:
+        if manifest['bundles'].get(c, {}).get(rel) != known['sha256']:
+            continue
+        bundle = os.path.join(root, c, BUNDLE_NAME)
+        if not os.path.exists(bundle):
+            continue
+        mtime = os.stat(bundle).st_mtime_ns
+        if _mapped.get(bundle, (None,))[0] != mtime:
+            _mapped[bundle] = (mtime, load(bundle)[1])
+        prefix = f'{key}/{name}/'
+        return {array_name[len(prefix):]: values for array_name, values in _mapped[bundle][1].items()
+                if array_name.startswith(prefix) and values.ndim == 1} or None
+    return None
+
+
+def _plan(source, conductivities):
+    """``{relative output: (source path, slim)}`` for the given conductivities."""
+    plan = {'nominal.grd': False, 'nominal.dat': False, 'gnd.dat': True}
+    for c in conductivities:
+        found = slices(source, c)
+        if not found:
+            raise FileNotFoundError(f'{source}: no {c}/{c}_*_des.dat weighting potentials')
+        plan.update({rel: True for rel in found})
+    missing = [rel for rel in plan if not os.path.exists(os.path.join(source, rel))]
+    if missing:
+        raise FileNotFoundError(f'{source}: missing {", ".join(missing)}')
+    return plan
+
+
+def stale_files(source, target, conductivities, manifest=None):
+    """Relative paths whose staged copy is missing or whose source checksum changed."""
+    manifest = manifest or _read_manifest(target)
+    stale = []
+    for rel in _plan(source, conductivities):
+        known = manifest['files'].get(rel)
+        if (not known or not os.path.exists(os.path.join(target, rel))
+                or known['sha256'] != file_sha256(os.path.join(source, rel))):
+            stale.append(rel)
+    return stale
+
+
+def stage(source=DEFAULT_SOURCE, conductivities=('1e-3',), target=None, force=False, verbose=True):
+    """Bring ``target`` up to date with ``source``; returns ``target``.
+
+    Only files whose source sha256 differs from ``bundle.json`` are
+    converted again; a conductivity's ``bundle.bin`` is rewritten when any
+    of its files was.
+    """
+    source = os.path.abspath(source)
+    target = os.path.abspath(target or default_target(source))
+    manifest = _read_manifest(target)
+    plan = _plan(source, conductivities)
+    start = time.perf_counter()
+    changed = set()
+    for rel, slim in plan.items():
+        src = os.path.join(source, rel)
+        digest = file_sha256(src)
+        known = manifest['files'].get(rel)
+        if not force and known and known['sha256'] == digest and os.path.exists(os.path.join(target, rel)):
+            continue
+        if slim:
+            _atomic(os.path.join(target, rel), lambda tmp: write_subset(src, tmp, WP_DATASETS))
+        else:
+            _atomic(os.path.join(target, rel), lambda tmp: shutil.copyfile(src, tmp))
+        manifest['files'][rel] = {'source': src, 'sha256': digest, 'size': os.path.getsize(src),
+                                  'staged_size': os.path.getsize(os.path.join(target, rel))}
+        changed.add(rel)
+        _write_manifest(target, manifest)
+        if verbose:
+            print(f"  ✓ {rel} ({manifest['files'][rel]['size'] / 1e6:.1f} -> "
+                  f"{manifest['files'][rel]['staged_size'] / 1e6:.1f} MB)")
+
+    for c in conductivities:
+        members = ['nominal.grd', 'nominal.dat', 'gnd.dat'] + slices(source, c)
+        sources = {rel: manifest['files'][rel]['sha256'] for rel in members}
+        path = os.path.join(target, c, BUNDLE_NAME)
+        if not force and manifest['bundles'].get(c) == sources and os.path.exists(path):
+            continue
+        dat_files = {'nominal': os.path.join(target, 'nominal.dat'), 'gnd': os.path.join(target, 'gnd.dat')}
+        dat_files.update((_slice_key(rel), os.path.join(target, rel)) for rel in slices(source, c))
+        _atomic(path, lambda tmp: write_bundle(tmp, os.path.join(target, 'nominal.grd'), dat_files))
+        manifest['bundles'][c] = sources
+        _write_manifest(target, manifest)
+        if verbose:
+            print(f"  ✓ {c}/{BUNDLE_NAME} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    if verbose:
+        print(f"{target}: {len(changed)} file(s) converted, {len(plan) - len(changed)} up to date "
+              f"({time.perf_counter() - start:.1f} s)")
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stage field maps for Diamond_4p and build mmap bundles')
+    parser.add_argument('source', nargs='?', default=DEFAULT_SOURCE,
+                        help=f'directory with nominal.grd/.dat, gnd.dat and <c>/ maps (default {DEFAULT_SOURCE})')
+    parser.add_argument('-c', '--conductivity', nargs='+', default=['1e-3'])
+    parser.add_argument('-o', '--target', help='staged directory (default /dev/shm/diamond_fieldmaps/<source name>)')
+    parser.add_argument('--check', action='store_true', help='list stale files and exit (1 if any)')
+    parser.add_argument('--force', action='store_true', help='convert everything again')
+    args = parser.parse_args(argv)
+
+    target = args.target or default_target(args.source)
+    if args.check:
+        stale = stale_files(args.source, target, args.conductivity)
+        for rel in stale:
+            print(f"  ✗ {rel}")
+        print(f"{target}: {len(stale)} stale file(s)")
+        return 1 if stale else 0
+    stage(args.source, args.conductivity, target, args.force)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
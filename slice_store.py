@@ -0,0 +1,398 @@
+"""Delta-compressed HDF5 store for the time slices of one conductivity folder.
+
+The ``*_NNNNNN_des`` slices of a folder (``.tdr`` as in Data_link, or DF-ISE
+``.dat`` from tdr_export/tdx) share one mesh and change only slightly from
+one slice to the next. ``convert`` keeps the mesh once and every vertex
+dataset (per name and region) as integers quantized to a tolerance:
+keyframe slices hold the quantized values, the slices in between their
+difference to the previous slice, in the smallest integer type that fits,
+gzip compressed with shuffle. Mostly-zero deltas compress far better than
+the float64 values themselves.
+
+    /mesh/{vertices, regions/<i>}           from a .tdr: element vertex lists per region
+    /mesh/grd                               or the raw .grd given with --grd
+    /slices                                 slice numbers, in file order
+    /data/<dataset>/<region>/<NNNNNN>       attrs: kind = key|delta
+
+Each ``/data/<dataset>/<region>`` group has ``peak`` (the largest |value|
+over all slices, found in a first pass), ``step`` (quantization step,
+``2 * tolerance * peak``, so every value is within ``tolerance * peak`` of
+the original; a dataset that is zero in every slice uses ``2 * tolerance``),
+``dimension`` and ``keyframe``. Any slice is rebuilt from its keyframe plus at most
+``keyframe - 1`` deltas; ``verify`` compares every slice with the
+original files.
+
+Usage:
+    python slice_store.py convert Data_link/DWF_Huazhen_c4/1e-3 -o 1e-3.h5 --tolerance 1e-6
+    python slice_store.py verify 1e-3.h5                    # against the folder it was built from
+    python slice_store.py export 1e-3.h5 000010 -o 1e-3_000010_des.dat [--grd nominal.grd]
+    python slice_store.py info 1e-3.h5
+
+    from slice_store import SliceStore
+    with SliceStore('1e-3.h5') as store:
+        wp = store.read('000010', 'ElectrostaticPotential', 'BULK')
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+import h5py
+import numpy as np
+
+from dfise import Dataset, DatFile, write_dat, write_grd
+
+DEFAULT_TOLERANCE = 1e-6
+DEFAULT_KEYFRAME = 5
+FORMAT_VERSION = 1
+
+_SLICE_RE = re.compile(r'_([0-9]{6})_des\.(tdr|dat)$')
+
+
+def find_slices(folder):
+    """``[(slice number, path)]`` of the ``*_NNNNNN_des.tdr|dat`` files in ``folder``.
+
+    A folder holding both kinds uses the ``.tdr`` files.
+    """
+    found = {}
+    for path in sorted(glob.glob(os.path.join(folder, '*_des.*'))):
+        match = _SLICE_RE.search(path)
+        if match and (match.group(2) == 'tdr' or match.group(1) not in found):
+            found[match.group(1)] = path
+    return sorted(found.items())
+
+
+def read_slice(path, names=None):
+    """Vertex datasets of one slice file, values in DF-ISE (ascending vertex) order."""
+    if path.endswith('.tdr'):
+        from tdr import REGION_BULK, REGION_CONTACT, TdrFile
+        from tdr_export import vertex_datasets
+        with TdrFile(path) as tdr:
+            regions = {r.index for r in tdr.regions if r.kind in (REGION_BULK, REGION_CONTACT)}
+            return [ds for ds in vertex_datasets(tdr, regions) if names is None or ds.name in names]
+    with DatFile(path) as dat:
+        return list(dat.datasets(names))
+
+
+def _original_values(path, names):
+    """``{(name, region): values}`` of one slice as stored in the file, for ``verify``.
+
+    TDR values are taken straight from ``TdrFile.values`` (ascending vertex
+    order, as in DF-ISE), not through the ``read_slice`` export path.
+    """
+    if path.endswith('.tdr'):
+        from tdr import LOCATION_VERTEX, REGION_BULK, REGION_CONTACT, TdrFile
+        with TdrFile(path) as tdr:
+            return {(info.name, tdr.regions[info.region].name): tdr.values(info)
+                    for info in tdr.datasets()
+                    if info.location == LOCATION_VERTEX and info.name in names
+                    and tdr.regions[info.region].kind in (REGION_BULK, REGION_CONTACT)}
+    with DatFile(path) as dat:
+        return {(ds.name, ds.validity): ds.values for ds in dat.datasets(names)}
+
+
+def _narrow(values):
+    """``values`` in the smallest signed integer type that holds them."""
+    lo, hi = values.min(initial=0), values.max(initial=0)
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _write_mesh(h5, tdr_path):
+    """Store the vertices and the element vertex lists of the exported regions.
+
+    The DF-ISE edge/face tables are derived again on export, they are twice
+    the size of the element lists.
+    """
+    from tdr import REGION_BULK, REGION_CONTACT, TETRAHEDRON, TRIANGLE, TdrFile
+    opts = {'compression': 'gzip', 'shuffle': True}
+    mesh = h5.create_group('mesh')
+    with TdrFile(tdr_path) as tdr:
+        vertices = tdr.vertices()
+        mesh.create_dataset('vertices', data=vertices, **opts)
+        index = 0
+        for kind, etype in ((REGION_BULK, TETRAHEDRON), (REGION_CONTACT, TRIANGLE)):
+            for region in tdr.regions:
+                elements = tdr.elements(region.index) if region.kind == kind else {}
+                if etype not in elements:
+                    continue
+                table = mesh.create_dataset(f'regions/{index}', data=_narrow(elements[etype]), **opts)
+                table.attrs.update(name=region.name, material=region.material)
+                index += 1
+    return vertices
+
+
+def _peaks(slices, names=None):
+    """Largest |value| of every dataset over all slices; checks the slices agree."""
+    peaks, counts = {}, {}
+    for number, path in slices:
+        datasets = read_slice(path, names)
+        keys = {(ds.name, ds.validity) for ds in datasets}
+        if peaks and keys != set(peaks):
+            raise ValueError(f'{path}: datasets differ from the first slice')
+        for ds in datasets:
+            key = (ds.name, ds.validity)
+            values = np.asarray(ds.values, dtype=np.float64).reshape(-1)
+            if not np.all(np.isfinite(values)):
+                raise ValueError(f'{path}: {ds.name} ({ds.validity}) has non-finite values')
+            if counts.setdefault(key, values.size) != values.size:
+                raise ValueError(f'{path}: {ds.name} ({ds.validity}) has {values.size} values, '
+                                 f'the first slice {counts[key]}')
+            peaks[key] = max(peaks.get(key, 0.0), float(np.abs(values).max(initial=0.0)))
+    return peaks
+
+
+def convert(folder, out, tolerance=DEFAULT_TOLERANCE, keyframe=DEFAULT_KEYFRAME, names=None,
+            grd=None, level=6, verbose=True):
+    """Convert the slices of ``folder`` into the store ``out``; returns (source bytes, store bytes)."""
+    slices = find_slices(folder)
+    if not slices:
+        raise FileNotFoundError(f'{folder}: no *_NNNNNN_des.tdr/.dat slices')
+    tmp = f'{out}.{os.getpid()}.tmp'
+    start = time.perf_counter()
+    try:
+        with h5py.File(tmp, 'w') as h5:
+            h5.attrs.update(version=FORMAT_VERSION, source=os.path.abspath(folder),
+                            tolerance=tolerance, keyframe=keyframe)
+            h5.create_dataset('slices', data=[number for number, _ in slices], dtype=h5py.string_dtype())
+            h5.create_dataset('sources', data=[os.path.basename(p) for _, p in slices],
+                              dtype=h5py.string_dtype())
+            vertices = None
+            if slices[0][1].endswith('.tdr'):
+                vertices = _write_mesh(h5, slices[0][1])
+            if grd:
+                with open(grd, 'rb') as f:
+                    h5.create_dataset('mesh/grd', data=np.frombuffer(f.read(), dtype=np.uint8),
+                                      compression='gzip', compression_opts=level, shuffle=True)
+            peaks = _peaks(slices, names)
+            previous = {}
+            for i, (number, path) in enumerate(slices):
+                datasets = read_slice(path, names)
+                for ds in datasets:
+                    name = f'data/{ds.name}/{ds.validity}'
+                    values = np.asarray(ds.values, dtype=np.float64).reshape(-1)
+                    if name not in h5:
+                        peak = peaks[(ds.name, ds.validity)]
+                        group = h5.create_group(name)
+                        group.attrs.update(peak=peak, step=2 * tolerance * (peak or 1.0),
+                                           dimension=ds.dimension, count=ds.count, keyframe=keyframe)
+                    group = h5[name]
+                    q = np.rint(values / group.attrs['step']).astype(np.int64)
+                    kind = 'key' if i % keyframe == 0 else 'delta'
+                    data = q if kind == 'key' else q - previous[(ds.name, ds.validity)]
+                    stored = group.create_dataset(number, data=_narrow(data), compression='gzip',
+                                                  compression_opts=level, shuffle=True)
+                    stored.attrs['kind'] = kind
+                    previous[(ds.name, ds.validity)] = q
+                if verbose:
+                    print(f"  ✓ {number} {os.path.basename(path)} ({len(datasets)} datasets)")
+            if vertices is None and not grd:
+                print("  ⚠️  no mesh stored: .dat slices carry none, pass --grd to include it")
+        os.replace(tmp, out)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    source_bytes = sum(os.path.getsize(p) for _, p in slices) + (os.path.getsize(grd) if grd else 0)
+    store_bytes = os.path.getsize(out)
+    if verbose:
+        print(f"{out}: {len(slices)} slices, {source_bytes / 1e6:.1f} MB -> {store_bytes / 1e6:.1f} MB "
+              f"({source_bytes / store_bytes:.1f}x) in {time.perf_counter() - start:.1f} s")
+    return source_bytes, store_bytes
+
+
+class SliceStore:
+    """Read access to a store; the last rebuilt slice of each dataset is kept
+    so walking the slices in order costs one delta per step."""
+
+    def __init__(self, path):
+        self.path = path
+        self._h5 = h5py.File(path, 'r')
+        self.slices = list(self._h5['slices'].asstr()[:])
+        self._last = {}
+
+    def close(self):
+        self._h5.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def attrs(self):
+        return dict(self._h5.attrs)
+
+    def keys(self):
+        """``[(dataset name, region)]`` stored for every slice."""
+        return [(name, region) for name in self._h5['data'] for region in self._h5['data'][name]]
+
+    def _quantized(self, group, index):
+        keyframe = int(group.attrs['keyframe'])
+        start = index - index % keyframe
+        cached = self._last.get(group.name)
+        if cached is not None and start <= cached[0] <= index:
+            start, q = cached[0], cached[1].copy()
+        else:
+            q = group[self.slices[start]][...].astype(np.int64)
+        for i in range(start + 1, index + 1):
+            q += group[self.slices[i]][...]
+        self._last[group.name] = (index, q)
+        return q
+
+    def read(self, slice_number, name, region):
+        """Values of one dataset at ``slice_number`` ('000010' or its index)."""
+        index = slice_number if isinstance(slice_number, (int, np.integer)) else self.slices.index(slice_number)
+        group = self._h5[f'data/{name}/{region}']
+        values = self._quantized(group, index) * group.attrs['step']
+        dimension = int(group.attrs['dimension'])
+        return values.reshape(-1, dimension) if dimension > 1 else values
+
+    def datasets(self, slice_number, names=None):
+        """All datasets of one slice as ``dfise.Dataset`` tuples."""
+        out = []
+        for name, region in self.keys():
+            if names is not None and name not in names:
+                continue
+            values = self.read(slice_number, name, region)
+            group = self._h5[f'data/{name}/{region}']
+            out.append(Dataset(name, region, int(group.attrs['count']), int(group.attrs['dimension']), values))
+        return out
+
+    def mesh(self):
+        """``(vertices, edges, faces, elements, regions)`` as taken by ``dfise.write_grd``."""
+        from tdr_export import mesh_tables
+        mesh = self._h5['mesh']
+        tets, tris = [], []
+        for _, table in sorted(mesh['regions'].items(), key=lambda item: int(item[0])):
+            (tets if table.shape[1] == 4 else tris).append(
+                (table.attrs['name'], table.attrs['material'], table[...].astype(np.int64)))
+        return mesh_tables(mesh['vertices'][...], tets, tris)
+
+    def export(self, slice_number, path, grd=None):
+        """Write one slice as a DF-ISE .dat file (and the mesh as ``grd``)."""
+        region_names, nb_vertices = None, None
+        if 'mesh' in self._h5 and 'vertices' in self._h5['mesh']:
+            vertices, edges, faces, elements, regions = self.mesh()
+            region_names, nb_vertices = [name for name, _, _ in regions], len(vertices)
+            if grd:
+                write_grd(grd, vertices, edges, faces, elements, regions)
+        elif grd:
+            if 'mesh/grd' not in self._h5:
+                raise KeyError(f'{self.path}: no mesh stored')
+            with open(grd, 'wb') as f:
+                f.write(self._h5['mesh/grd'][...].tobytes())
+        datasets = self.datasets(slice_number)
+        if region_names is None:
+            region_names = list(dict.fromkeys(ds.validity for ds in datasets))
+            nb_vertices = max(ds.count // ds.dimension for ds in datasets)
+        write_dat(path, datasets, nb_vertices, region_names)
+
+
+def verify(store_path, folder=None, verbose=True):
+    """Compare every slice of the store with the original files; returns the number of failures."""
+    failed = 0
+    with SliceStore(store_path) as store:
+        folder = folder or store.attrs['source']
+        originals = dict(find_slices(folder))
+        for number in store.slices:
+            if number not in originals:
+                print(f"  ✗ {number}: no original in {folder}")
+                failed += 1
+                continue
+            worst = 0.0
+            ok = True
+            stored = set(store.keys())
+            originals_values = _original_values(originals[number], {name for name, _ in stored})
+            for name, region in sorted(stored - set(originals_values)):
+                ok = False
+                print(f"  ✗ {number} {name} ({region}): not in {os.path.basename(originals[number])}")
+            for (name, region), values in originals_values.items():
+                if (name, region) not in stored:
+                    ok = False
+                    print(f"  ✗ {number} {name} ({region}): missing from the store")
+                    continue
+                group = store._h5[f'data/{name}/{region}']
+                rebuilt = store.read(number, name, region).reshape(-1)
+                values = np.asarray(values).reshape(-1)
+                if rebuilt.size != values.size:
+                    ok = False
+                    print(f"  ✗ {number} {name} ({region}): {rebuilt.size} values, original {values.size}")
+                    continue
+                error = np.abs(rebuilt - values).max(initial=0.0)
+                bound = group.attrs['step'] / 2
+                worst = max(worst, error / bound if bound else 0.0)
+                # Allow for the rounding of the float64 rebuild
+                if error > bound * (1 + 1e-9):
+                    ok = False
+                    print(f"  ✗ {number} {name} ({region}): max error {error:.3g} > {bound:.3g}")
+            failed += not ok
+            if verbose and ok:
+                print(f"  ✓ {number}: max error {worst:.2f} x tolerance")
+    print(f"{store_path}: {len(store.slices) - failed}/{len(store.slices)} slices within tolerance")
+    return failed
+
+
+def print_info(store_path):
+    with SliceStore(store_path) as store:
+        attrs = store.attrs
+        print(f"{store_path}: {len(store.slices)} slices from {attrs['source']}")
+        print(f"  tolerance {attrs['tolerance']:g} x peak, keyframe every {attrs['keyframe']} slices, "
+              f"mesh: {'yes' if 'mesh' in store._h5 else 'no'}")
+        for name, region in store.keys():
+            group = store._h5[f'data/{name}/{region}']
+            nbytes = sum(d.id.get_storage_size() for d in group.values())
+            print(f"  {name:28s} {region:12s} {group.attrs['count']:9d} values  "
+                  f"peak {group.attrs.get('peak', float('nan')):.3g}  max error {group.attrs['step'] / 2:.3g}  "
+                  f"{nbytes / 1e3:9.1f} kB")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Delta-compressed store of weighting potential slices')
+    sub = parser.add_subparsers(dest='command', required=True)
+    conv = sub.add_parser('convert', help='build a store from a conductivity folder')
+    conv.add_argument('folder')
+    conv.add_argument('-o', '--out', help='store path (default <folder name>.h5)')
+    conv.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                      help='max error relative to the peak |value| of each dataset over all slices')
+    conv.add_argument('--keyframe', type=int, default=DEFAULT_KEYFRAME,
+                      help='slices between full (non-delta) copies; bounds the cost of random access')
+    conv.add_argument('--names', nargs='+', help='only these datasets (default all)')
+    conv.add_argument('--grd', help='.grd file stored as the mesh of .dat slices')
+    conv.add_argument('--level', type=int, default=6, help='gzip level')
+    ver = sub.add_parser('verify', help='compare the store with the original slices')
+    ver.add_argument('store')
+    ver.add_argument('folder', nargs='?', help='original folder (default the one it was built from)')
+    exp = sub.add_parser('export', help='write one slice as a DF-ISE .dat file')
+    exp.add_argument('store')
+    exp.add_argument('slice', help='slice number, e.g. 000010')
+    exp.add_argument('-o', '--out', required=True)
+    exp.add_argument('--grd', help='also write the mesh here')
+    info = sub.add_parser('info', help='print the contents of a store')
+    info.add_argument('store')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        out = args.out or os.path.basename(os.path.abspath(args.folder)) + '.h5'
+        convert(args.folder, out, args.tolerance, args.keyframe,
+                set(args.names) if args.names else None, args.grd, args.level)
+    elif args.command == 'verify':
+        return 1 if verify(args.store, args.folder) else 0
+    elif args.command == 'export':
+        with SliceStore(args.store) as store:
+            store.export(args.slice, args.out, args.grd)
+        print(f"  ✓ {args.slice} -> {args.out}")
+    elif args.command == 'info':
+        return print_info(args.store)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
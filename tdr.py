@@ -0,0 +1,151 @@
+"""Lazy access to Sentaurus TDR (HDF5) files.
+
+Only metadata is touched until values are explicitly requested, so listing
+the datasets of a file never materializes the 100k+ element arrays.
+
+Usage:
+    from tdr import TdrFile
+    with TdrFile('n1358_000010_des.tdr') as tdr:
+        for ds in tdr.datasets():
+            print(ds.index, ds.name, tdr.regions[ds.region].name, ds.shape)
+"""
+from collections import namedtuple
+
+import h5py
+import numpy as np
+
+GEOMETRY = 'collection/geometry_0'
+STATE = GEOMETRY + '/state_0'
+
+# TDR region types
+REGION_BULK = 0
+REGION_CONTACT = 1
+REGION_INTERFACE = 2
+
+# TDR element type -> number of vertices
+ELEMENT_VERTICES = {0: 1, 1: 2, 2: 3, 3: 4, 5: 4, 6: 5, 7: 6, 8: 8}
+TETRAHEDRON = 5
+TRIANGLE = 2
+
+# TDR "location type" of a dataset
+LOCATION_VERTEX = 0
+
+Region = namedtuple('Region', 'index name material kind')
+DatasetInfo = namedtuple('DatasetInfo', 'index key name quantity region location nvalues shape dtype unit')
+
+
+def _text(value):
+    if isinstance(value, (bytes, np.bytes_)):
+        return value.decode(errors='replace')
+    return str(value)
+
+
+class TdrFile:
+    """Read-only view of the first geometry/state of a TDR file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._h5 = h5py.File(self.path, 'r')
+        self.geometry = self._h5[GEOMETRY]
+        self.state = self._h5[STATE]
+        self.regions = self._read_regions()
+
+    def close(self):
+        self._h5.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_regions(self):
+        regions = []
+        for i in range(int(self.geometry.attrs['number of regions'])):
+            attrs = self.geometry[f'region_{i}'].attrs
+            kind = int(attrs.get('type', REGION_BULK))
+            material = _text(attrs['material']) if 'material' in attrs else (
+                'Contact' if kind == REGION_CONTACT else 'Interface')
+            regions.append(Region(i, _text(attrs['name']), material, kind))
+        return regions
+
+    @property
+    def nb_vertices(self):
+        return int(self.geometry.attrs['number of vertices'])
+
+    def vertices(self):
+        """Vertex coordinates as an (n, 3) float64 array."""
+        raw = self.geometry['vertex'][...]
+        if raw.dtype.names:
+            return np.stack([raw[name] for name in raw.dtype.names], axis=1).astype(np.float64)
+        return np.asarray(raw, dtype=np.float64).reshape(-1, 3)
+
+    def raw_elements(self, region):
+        """The flat ``[type, v0, v1, ..., type, ...]`` element stream of a region."""
+        group = self.geometry[f'region_{region}']
+        parts = [group[key][...] for key in sorted(group) if key.startswith('elements_')]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+
+    def elements(self, region):
+        """Return ``{element_type: (n, nv) vertex-index array}`` for a bulk/contact region."""
+        raw = self.raw_elements(region)
+        if raw.size == 0:
+            return {}
+        etype = int(raw[0])
+        nv = ELEMENT_VERTICES.get(etype)
+        # Fast path: a region made of a single element type
+        if nv is not None and raw.size % (nv + 1) == 0:
+            table = raw.reshape(-1, nv + 1)
+            if np.all(table[:, 0] == etype):
+                return {etype: table[:, 1:].astype(np.int64)}
+        grouped = {}
+        pos = 0
+        while pos < raw.size:
+            etype = int(raw[pos])
+            nv = ELEMENT_VERTICES[etype]
+            grouped.setdefault(etype, []).append(raw[pos + 1:pos + 1 + nv])
+            pos += nv + 1
+        return {etype: np.array(rows, dtype=np.int64) for etype, rows in grouped.items()}
+
+    def region_vertices(self, region):
+        """Sorted global vertex indices of a region: the order of its vertex values.
+
+        TDR stores the vertex values of a region in ascending global vertex
+        order, the same order DF-ISE .dat files use.
+        """
+        flat = np.concatenate([e.ravel() for e in self.elements(region).values()])
+        return np.unique(flat)
+
+    def datasets(self):
+        """Yield ``DatasetInfo`` for every dataset of the state (metadata only)."""
+        count = int(self.state.attrs.get('number of datasets', 0))
+        for i in range(count):
+            key = f'dataset_{i}'
+            if key not in self.state:
+                continue
+            group = self.state[key]
+            attrs = group.attrs
+            values = group['values']
+            yield DatasetInfo(index=i, key=key,
+                              name=_text(attrs['name']),
+                              quantity=_text(attrs.get('quantity', attrs['name'])),
+                              region=int(attrs['region']),
+                              location=int(attrs.get('location type', LOCATION_VERTEX)),
+                              nvalues=int(attrs.get('number of values', values.shape[0])),
+                              shape=values.shape,
+                              dtype=values.dtype,
+                              unit=_text(attrs.get('unit:name', '')))
+
+    def dataset(self, info):
+        """The h5py dataset (not yet read) holding the values of ``info``."""
+        return self.state[info.key]['values']
+
+    def values(self, info):
+        """Read all values of a dataset, scaled by its conversion factor."""
+        group = self.state[info.key]
+        values = group['values'][...]
+        factor = float(group.attrs.get('conversion factor', 1.0))
+        if values.dtype.names:
+            values = np.stack([values[name] for name in values.dtype.names], axis=1)
+        values = np.asarray(values, dtype=np.float64)
+        return values * factor if factor != 1.0 else values
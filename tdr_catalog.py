@@ -0,0 +1,186 @@
+"""SQLite catalog of every dataset in the Data_link TDR tree.
+
+Only HDF5 metadata and a strided sample (about ``SAMPLE_SIZE`` values) of
+each dataset are read, so indexing never materializes a full field. Files
+whose size and mtime are unchanged since the last run are skipped.
+
+Usage:
+    python tdr_catalog.py build                       # Data_link/*/*/*.tdr
+    python tdr_catalog.py query --wp --conductivity 5e-2
+    python tdr_catalog.py query --name ElectrostaticPotential --region BULK
+    python tdr_catalog.py sql "SELECT conductivity, COUNT(*) FROM files GROUP BY 1"
+"""
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+import wp_quality
+from tdr import TdrFile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROOT = os.path.join(HERE, 'Data_link')
+DEFAULT_DB = os.path.join(DEFAULT_ROOT, 'tdr_catalog.sqlite')
+SAMPLE_SIZE = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    conductivity TEXT,
+    slice INTEGER,
+    nb_vertices INTEGER,
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS datasets (
+    path TEXT REFERENCES files(path) ON DELETE CASCADE,
+    idx INTEGER,
+    key TEXT,
+    name TEXT,
+    region TEXT,
+    region_kind INTEGER,
+    location INTEGER,
+    nvalues INTEGER,
+    shape TEXT,
+    dtype TEXT,
+    matches_vertices INTEGER,
+    sample_min REAL,
+    sample_max REAL,
+    sample_mean REAL,
+    looks_like_wp INTEGER,
+    PRIMARY KEY (path, idx)
+);
+CREATE INDEX IF NOT EXISTS datasets_name ON datasets(name, region);
+"""
+
+_SLICE_RE = re.compile(r'_([0-9]+)_des\.tdr$')
+
+
+def connect(db_path=DEFAULT_DB):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def sample_values(tdr, info, size=SAMPLE_SIZE):
+    """Strided sample (about ``size`` values) of a TDR dataset, scaled like ``TdrFile.values``."""
+    dataset = tdr.dataset(info)
+    step = max(dataset.shape[0] // size, 1) if dataset.shape else 1
+    values = np.asarray(dataset[::step] if dataset.shape else dataset[()])
+    if values.dtype.names:
+        values = np.stack([values[name] for name in values.dtype.names], axis=1)
+    factor = float(tdr.state[info.key].attrs.get('conversion factor', 1.0))
+    return values.astype(np.float64).ravel() * factor
+
+
+def looks_like_wp(sample):
+    stats = wp_quality.QualityStats()
+    stats.update(sample)
+    return stats, sample.size > 1 and stats.verdict() == wp_quality.VALID
+
+
+def index_file(conn, path):
+    """(Re)index one TDR file inside the current transaction."""
+    st = os.stat(path)
+    match = _SLICE_RE.search(path)
+    rows = []
+    with TdrFile(path) as tdr:
+        nb_vertices = tdr.nb_vertices
+        for info in tdr.datasets():
+            stats, wp = looks_like_wp(sample_values(tdr, info))
+            region = tdr.regions[info.region]
+            rows.append((path, info.index, info.key, info.name, region.name, region.kind,
+                         info.location, info.nvalues, repr(tuple(info.shape)), str(info.dtype),
+                         int(info.nvalues == nb_vertices),
+                         float(stats.min), float(stats.max), float(stats.mean),
+                         int(wp)))
+    conn.execute('DELETE FROM files WHERE path = ?', (path,))
+    conn.execute('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                 (path, st.st_size, st.st_mtime_ns, os.path.basename(os.path.dirname(path)),
+                  int(match.group(1)) if match else None, nb_vertices, time.time()))
+    conn.executemany('INSERT INTO datasets VALUES (' + ', '.join('?' * 15) + ')', rows)
+    return len(rows)
+
+
+def build(conn, root=DEFAULT_ROOT, pattern='*/*/*.tdr', force=False):
+    """Index new or changed files below ``root``; drop files that disappeared."""
+    paths = sorted(os.path.abspath(p) for p in glob.glob(os.path.join(root, pattern)))
+    known = {path: (size, mtime) for path, size, mtime in
+             conn.execute('SELECT path, size, mtime_ns FROM files')}
+    indexed = skipped = 0
+    for path in paths:
+        st = os.stat(path)
+        if not force and known.get(path) == (st.st_size, st.st_mtime_ns):
+            skipped += 1
+            continue
+        with conn:
+            count = index_file(conn, path)
+        indexed += 1
+        print(f"  ✓ {os.path.relpath(path, root)} ({count} datasets)")
+    gone = [p for p in known if p not in set(paths) and p.startswith(os.path.abspath(root))]
+    with conn:
+        conn.executemany('DELETE FROM files WHERE path = ?', [(p,) for p in gone])
+    return indexed, skipped, len(gone)
+
+
+def query(conn, name=None, region=None, conductivity=None, wp=False):
+    sql = ('SELECT f.conductivity, f.slice, d.key, d.name, d.region, d.nvalues, '
+           'd.sample_min, d.sample_max, d.sample_mean, d.looks_like_wp, f.path '
+           'FROM datasets d JOIN files f USING (path) WHERE 1 = 1')
+    params = []
+    for column, value in (('d.name', name), ('d.region', region), ('f.conductivity', conductivity)):
+        if value is not None:
+            sql += f' AND {column} = ?'
+            params.append(value)
+    if wp:
+        sql += ' AND d.looks_like_wp = 1'
+    sql += ' ORDER BY f.conductivity, f.slice, d.idx'
+    return conn.execute(sql, params).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Catalog of TDR datasets')
+    parser.add_argument('--db', default=DEFAULT_DB, help='SQLite index file')
+    sub = parser.add_subparsers(dest='command', required=True)
+    b = sub.add_parser('build', help='index new/changed files')
+    b.add_argument('root', nargs='?', default=DEFAULT_ROOT)
+    b.add_argument('--pattern', default='*/*/*.tdr')
+    b.add_argument('--force', action='store_true', help='re-index unchanged files too')
+    q = sub.add_parser('query', help='list matching datasets')
+    q.add_argument('--name')
+    q.add_argument('--region')
+    q.add_argument('--conductivity')
+    q.add_argument('--wp', action='store_true', help='only datasets that look like a 0-1 weighting potential')
+    s = sub.add_parser('sql', help='run raw SQL against the index')
+    s.add_argument('statement')
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    if args.command == 'build':
+        start = time.perf_counter()
+        indexed, skipped, removed = build(conn, args.root, args.pattern, args.force)
+        print(f"Indexed {indexed}, unchanged {skipped}, removed {removed} "
+              f"in {time.perf_counter() - start:.2f} s -> {args.db}")
+    elif args.command == 'query':
+        rows = query(conn, args.name, args.region, args.conductivity, args.wp)
+        print(f"{'cond':<6} {'slice':>5} {'key':<11} {'name':<26} {'region':<12} {'values':>8} "
+              f"{'min':>10} {'max':>10} {'mean':>10}  wp")
+        for cond, slc, key, name, region, n, lo, hi, mean, wp, _ in rows:
+            print(f"{cond:<6} {slc if slc is not None else '-':>5} {key:<11} {name:<26} {region:<12} "
+                  f"{n:>8,} {lo:>10.3g} {hi:>10.3g} {mean:>10.3g}  {'★' if wp else ''}")
+        print(f"{len(rows)} dataset(s)")
+    elif args.command == 'sql':
+        for row in conn.execute(args.statement):
+            print(*row, sep='\t')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Convert Sentaurus TDR files to the DF-ISE .grd/.dat pair Garfield reads.
+
+Replaces the serial ``tdx -dd`` loop of process_tdr_files_safe.sh: the TDR
+is read directly with h5py and many files are converted concurrently on a
+process pool. Each vertex dataset is written to the region it belongs to in
+the TDR, so the BULK ElectrostaticPotential is the 0-1 weighting potential
+(dataset_1) rather than numerical noise; the BULK potential of every
+exported file is checked with wp_quality and reported.
+
+Only bulk (tetrahedra) and contact (triangle) regions are exported;
+interface regions carry no vertex data and are not needed by
+ComponentTcad3d.
+
+Usage:
+    python tdr_export.py Data_link/DWF_Huazhen_c4                 # all *.tdr below
+    python tdr_export.py --rename --dat-only -j 8 Data_link/DWF_Huazhen_c4/1e-3
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import wp_quality
+from dfise import Dataset, write_dat, write_grd
+from tdr import (LOCATION_VERTEX, REGION_BULK, REGION_CONTACT, TETRAHEDRON, TRIANGLE,
+                 TdrFile)
+
+# Vertex triplets of the four faces of a tetrahedron
+_TET_FACES = np.array([[0, 1, 2], [0, 1, 3], [0, 2, 3], [1, 2, 3]])
+# Vertex pairs of the three edges of a (sorted) triangle
+_TRI_EDGES = np.array([[0, 1], [0, 2], [1, 2]])
+
+
+def build_mesh(tdr):
+    """Derive the DF-ISE edge/face/element tables from the TDR element lists.
+
+    Returns ``(vertices, edges, faces, elements, regions, exported)`` where
+    ``exported`` is the list of TDR region indices written to the grid.
+    """
+    tets, tris = [], []
+    for region in tdr.regions:
+        elements = tdr.elements(region.index) if region.kind in (REGION_BULK, REGION_CONTACT) else {}
+        if region.kind == REGION_BULK and TETRAHEDRON in elements:
+            tets.append((region, elements[TETRAHEDRON]))
+        elif region.kind == REGION_CONTACT and TRIANGLE in elements:
+            tris.append((region, elements[TRIANGLE]))
+    exported = [region.index for region, _ in tets + tris]
+    return mesh_tables(tdr.vertices(),
+                       [(r.name, r.material, table) for r, table in tets],
+                       [(r.name, r.material, table) for r, table in tris]) + (exported,)
+
+
+def mesh_tables(vertices, tets, tris):
+    """DF-ISE tables from per-region element lists.
+
+    ``tets``/``tris`` are ``(name, material, (n, 4|3) vertex indices)`` of
+    the bulk and contact regions. Returns ``(vertices, edges, faces,
+    elements, regions)`` as taken by ``dfise.write_grd``.
+    """
+    n = np.int64(len(vertices))
+    all_tets = np.concatenate([t for _, _, t in tets]) if tets else np.empty((0, 4), np.int64)
+    all_tris = np.concatenate([t for _, _, t in tris]) if tris else np.empty((0, 3), np.int64)
+
+    # Unique faces via a single int64 key per sorted vertex triplet
+    tet_faces = np.sort(all_tets[:, _TET_FACES], axis=2).reshape(-1, 3)
+    keys = (tet_faces[:, 0] * n + tet_faces[:, 1]) * n + tet_faces[:, 2]
+    face_keys, tet_face_idx = np.unique(keys, return_inverse=True)
+    faces_v = np.column_stack([face_keys // (n * n), face_keys // n % n, face_keys % n])
+
+    # Unique edges of all faces and contact triangles
+    tri_sorted = np.sort(all_tris, axis=1)
+    pairs = np.concatenate([faces_v[:, _TRI_EDGES].reshape(-1, 2),
+                            tri_sorted[:, _TRI_EDGES].reshape(-1, 2)])
+    edge_keys, edge_idx = np.unique(pairs[:, 0] * n + pairs[:, 1], return_inverse=True)
+    edges = np.column_stack([edge_keys // n, edge_keys % n])
+    face_edges = edge_idx[:len(faces_v) * 3].reshape(-1, 3)
+    tri_edges = edge_idx[len(faces_v) * 3:].reshape(-1, 3)
+
+    elements = [(TETRAHEDRON, tet_face_idx.reshape(-1, 4)), (TRIANGLE, tri_edges)]
+    regions = []
+    start = 0
+    for name, material, table in tets + tris:
+        regions.append((name, material, np.arange(start, start + len(table))))
+        start += len(table)
+    return vertices, edges, face_edges, elements, regions
+
+
+def vertex_datasets(tdr, regions):
+    """Yield ``Dataset`` tuples for the vertex datasets of the given TDR regions.
+
+    TDR and DF-ISE both store region values in ascending global vertex
+    index, so the values are written as stored.
+    """
+    counts = {}
+    for info in tdr.datasets():
+        if info.location != LOCATION_VERTEX or info.region not in regions:
+            continue
+        if info.region not in counts:
+            counts[info.region] = len(tdr.region_vertices(info.region))
+        values = tdr.values(info)
+        if len(values) != counts[info.region]:
+            print(f"  ! {os.path.basename(tdr.path)}: {info.key} ({info.name}) has {len(values)} "
+                  f"values for {counts[info.region]} region vertices, skipped")
+            continue
+        dimension = values.shape[1] if values.ndim == 2 else 1
+        yield Dataset(info.name, tdr.regions[info.region].name, values.size, dimension, values)
+
+
+def output_stem(tdr_path, rename=False):
+    """``n1358_000010_des`` or, with ``rename``, ``1e-3_000010_des`` (as rename_files.sh)."""
+    stem = os.path.splitext(os.path.basename(tdr_path))[0]
+    if rename:
+        folder = os.path.basename(os.path.dirname(os.path.abspath(tdr_path)))
+        match = re.match(r'^n[0-9]+_(.+)$', stem)
+        if match:
+            stem = f'{folder}_{match.group(1)}'
+    return stem
+
+
+def export_file(tdr_path, out_dir=None, write_grid=True, rename=False):
+    """Convert one TDR file; returns a small summary dict."""
+    start = time.perf_counter()
+    out_dir = out_dir or os.path.dirname(os.path.abspath(tdr_path))
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, output_stem(tdr_path, rename))
+    with TdrFile(tdr_path) as tdr:
+        vertices, edges, faces, elements, regions, exported = build_mesh(tdr)
+        if write_grid:
+            write_grd(stem + '.grd', vertices, edges, faces, elements, regions)
+        region_names = [name for name, _, _ in regions]
+        datasets = list(vertex_datasets(tdr, set(exported)))
+        write_dat(stem + '.dat', datasets, len(vertices), region_names)
+
+    verdict = None
+    for ds in datasets:
+        if ds.name == 'ElectrostaticPotential' and ds.validity == 'BULK':
+            stats = wp_quality.QualityStats(ds.count)
+            stats.update(ds.values)
+            verdict = stats.verdict()
+    return {'tdr': tdr_path, 'stem': stem, 'datasets': len(datasets),
+            'bulk_potential': verdict, 'seconds': time.perf_counter() - start}
+
+
+def _expand(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '**', '*.tdr'), recursive=True)))
+        else:
+            files.append(path)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert TDR files to DF-ISE .grd/.dat')
+    parser.add_argument('paths', nargs='+', help='.tdr files or directories to search')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='worker processes (default: all cores)')
+    parser.add_argument('-o', '--out-dir', help='write outputs here instead of next to each .tdr')
+    parser.add_argument('--dat-only', action='store_true', help='do not write the .grd (mesh is shared)')
+    parser.add_argument('--rename', action='store_true',
+                        help='name outputs <folder>_<suffix> like rename_files.sh')
+    args = parser.parse_args(argv)
+
+    files = _expand(args.paths)
+    if not files:
+        print("No .tdr files found.")
+        return 1
+    print(f"Converting {len(files)} .tdr file(s) with {args.jobs} worker(s)...")
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(export_file, path, args.out_dir, not args.dat_only, args.rename): path
+                   for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  ✗ {path}: {e}")
+                continue
+            mark = '✓' if result['bulk_potential'] != wp_quality.NOISE else '⚠️ '
+            print(f"  {mark} {path} -> {result['stem']}.dat ({result['datasets']} datasets, "
+                  f"BULK potential: {result['bulk_potential']}, {result['seconds']:.1f} s)")
+    print(f"Done: {len(files) - failed}/{len(files)} converted in {time.perf_counter() - start:.1f} s")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
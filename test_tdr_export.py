@@ -0,0 +1,62 @@
+"""Tests of the TDR vertex-value order used by tdr_export.
+
+Region values must be read in ascending global vertex order: a vertex on an
+interface then has the same potential in both regions.
+
+Usage:
+    python -m pytest test_tdr_export.py
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from tdr import TdrFile
+from tdr_export import vertex_datasets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, 'benchmarks'))
+import fixtures  # noqa: E402
+
+REAL_TDR = os.path.join(HERE, 'Data_link', 'DWF_Huazhen_c4', '1e-3', 'n1358_000000_des.tdr')
+
+
+def _potentials(path):
+    with TdrFile(path) as tdr:
+        bulk = [r.index for r in tdr.regions if r.kind == 0]
+        names = {r.index: r.name for r in tdr.regions}
+        vertices = {names[r]: tdr.region_vertices(r) for r in bulk}
+        values = {ds.validity: ds.values for ds in vertex_datasets(tdr, set(bulk))
+                  if ds.name == 'ElectrostaticPotential'}
+    return vertices, values
+
+
+def _interface(vertices, values, column):
+    """Potential of ``column`` on its BULK interface and inside, and BULK's on the interface."""
+    shared, ic, ib = np.intersect1d(vertices[column], vertices['BULK'], return_indices=True)
+    inside = np.delete(values[column], ic)
+    return values[column][ic], inside, values['BULK'][ib]
+
+
+@pytest.mark.skipif(not os.path.exists(REAL_TDR), reason='Data_link TDR not available')
+@pytest.mark.parametrize('column', ['junc5BULK', 'junc1BULK'])
+def test_real_tdr_interface_and_interior(column):
+    vertices, values = _potentials(REAL_TDR)
+    interface, inside, bulk = _interface(vertices, values, column)
+    np.testing.assert_array_equal(interface, bulk)
+    np.testing.assert_allclose(interface, 0.0, atol=1e-6)
+    np.testing.assert_allclose(inside, -0.2316, atol=1e-4)
+
+
+def test_fixture_values_continuous_across_interfaces(tmp_path):
+    vertices, tets = fixtures.box_mesh(9, 9, 11)
+    path = str(tmp_path / 'wp.tdr')
+    fixtures.write_tdr(path, vertices, fixtures._regions(vertices, tets), bias=-10.0)
+    region_vertices, values = _potentials(path)
+    for column in fixtures.COLUMNS:
+        interface, _, bulk = _interface(region_vertices, values, column)
+        assert len(interface)
+        np.testing.assert_array_equal(interface, bulk)
+    expected = fixtures._vertex_values('ElectrostaticPotential', vertices[region_vertices['BULK']], -10.0)
+    np.testing.assert_array_equal(values['BULK'], expected)
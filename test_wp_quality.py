@@ -0,0 +1,35 @@
+"""Tests of the wp_quality verdict on full datasets.
+
+Usage:
+    python -m pytest test_wp_quality.py
+"""
+import numpy as np
+
+import wp_quality
+
+
+def _stats(values):
+    stats = wp_quality.QualityStats(len(values))
+    stats.update(np.asarray(values, dtype=np.float64))
+    return stats
+
+
+def test_near_one_threshold_scales_with_size():
+    # 11 values near one: enough in a 1000-value sample, not in 10^5 values
+    small = np.r_[np.full(11, 1.0), np.full(989, 0.5)]
+    large = np.r_[np.full(11, 1.0), np.full(99989, 0.5)]
+    assert _stats(small).verdict() == wp_quality.VALID
+    assert _stats(large).verdict() == wp_quality.UNKNOWN
+    assert _stats(np.r_[np.full(1001, 1.0), np.full(98999, 0.5)]).verdict() == wp_quality.VALID
+
+
+def test_compare_criteria():
+    values = np.r_[np.full(30, 1.0), np.linspace(0.0, 0.8, 970)]
+    stats = _stats(values)
+    assert stats.verdict(min_near_one=0.05) == wp_quality.UNKNOWN
+    assert stats.verdict(min_near_one=0.05, min_std=0.1) == wp_quality.VALID
+
+
+def test_noise_and_constant():
+    assert _stats(np.full(1000, 1e-12)).verdict() == wp_quality.NOISE
+    assert _stats(np.full(1000, 5.0)).verdict() == wp_quality.CONSTANT
@@ -0,0 +1,192 @@
+"""Full-dataset quality check for weighting potentials in DF-ISE .dat files.
+
+Every value of a dataset is streamed through ``QualityStats`` chunk by chunk
+(see ``dfise.DatFile.chunks``), so bin counts, the 0-1 histogram and mean/std
+cover the whole BULK region with constant memory instead of the first
+1000 values.
+
+Usage:
+    python wp_quality.py Data_link/DWF_Huazhen_c4/1e-3          # all *_des.dat slices
+    python wp_quality.py nominal.dat 1e-3_000010_des.dat
+    python wp_quality.py --cache Data_link/DWF_Huazhen_c4/1e-3   # via field_cache
+"""
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+import field_cache
+from dfise import CHUNK_BYTES, DatFile
+
+NOISE_LEVEL = 1e-10
+# Values per update when streaming from an already-binary (cached) array
+CHUNK_VALUES = 1 << 18
+HIST_EDGES = np.linspace(0.0, 1.0, 11)
+
+NOISE = 'noise'
+VALID = 'valid weighting potential'
+CONSTANT = 'constant'
+UNKNOWN = 'unknown'
+
+
+class QualityStats:
+    """Streaming counters for one dataset.
+
+    ``update`` may be called with consecutive chunks of any size; ``count``
+    (if known up front) is only used to capture a sample around the middle.
+    """
+
+    def __init__(self, count=None, sample=20):
+        self.sample = sample
+        self.middle_index = count // 2 if count else None
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.noise = 0
+        self.very_small = 0
+        self.small = 0
+        self.mid = 0
+        self.near_one = 0
+        self.close_to_one = 0
+        self.above_one = 0
+        self.negative = 0
+        self.in_zero_one = 0
+        self.hist = np.zeros(len(HIST_EDGES) - 1, dtype=np.int64)
+        self.head = np.empty(0)
+        self.middle = np.empty(0)
+        self.tail = np.empty(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        n_b = values.size
+        if n_b == 0:
+            return
+        # Samples for printing
+        if self.head.size < self.sample:
+            self.head = np.concatenate([self.head, values[:self.sample - self.head.size]])
+        if self.middle_index is not None and self.middle.size < self.sample:
+            lo = max(self.middle_index + self.middle.size - self.n, 0)
+            if lo < n_b:
+                self.middle = np.concatenate([self.middle, values[lo:lo + self.sample - self.middle.size]])
+        self.tail = np.concatenate([self.tail, values[-self.sample:]])[-self.sample:]
+
+        # Chan et al. pairwise update of mean and M2
+        mean_b = values.mean()
+        m2_b = np.square(values - mean_b).sum()
+        n_a = self.n
+        delta = mean_b - self.mean
+        self.n = n_a + n_b
+        self.mean += delta * n_b / self.n
+        self._m2 += m2_b + delta * delta * n_a * n_b / self.n
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        absval = np.abs(values)
+        self.noise += np.count_nonzero(absval < NOISE_LEVEL)
+        self.very_small += np.count_nonzero((absval >= NOISE_LEVEL) & (absval < 1e-6))
+        self.small += np.count_nonzero((values >= 1e-6) & (values < 0.1))
+        self.mid += np.count_nonzero((values >= 0.1) & (values < 0.9))
+        self.near_one += np.count_nonzero((values >= 0.9) & (values <= 1.1))
+        # (0.9, 1.1], as counted by analyze_dat_problem/compare_dat_files
+        self.close_to_one += np.count_nonzero((values > 0.9) & (values <= 1.1))
+        self.above_one += np.count_nonzero(values > 1.1)
+        self.negative += np.count_nonzero(values < 0)
+        self.in_zero_one += np.count_nonzero((values >= 0) & (values <= 1))
+        self.hist += np.histogram(values[values >= 0], bins=HIST_EDGES)[0]
+
+    @property
+    def std(self):
+        return float(np.sqrt(self._m2 / self.n)) if self.n else 0.0
+
+    def fraction(self, count):
+        return count / self.n if self.n else 0.0
+
+    def verdict(self, min_near_one=0.01, min_std=None):
+        """Classify the dataset the same way the analysis scripts do.
+
+        VALID needs more than a ``min_near_one`` fraction of the values in
+        (0.9, 1.1]: the scripts asked for more than 10 (analyze_dat_problem)
+        or 50 (compare_dat_files) of their 1000-value sample. With
+        ``min_std`` a spread above it is also enough (compare_dat_files).
+        """
+        if self.n == 0:
+            return UNKNOWN
+        if self.noise > 0.8 * self.n:
+            return NOISE
+        if self.in_zero_one > 0.8 * self.n and self.close_to_one > min_near_one * self.n:
+            return VALID
+        if min_std is not None and self.in_zero_one > 0.8 * self.n and self.std > min_std:
+            return VALID
+        if self.max - self.min < NOISE_LEVEL:
+            return CONSTANT
+        return UNKNOWN
+
+
+def check_block(dat, block, chunk_bytes=CHUNK_BYTES):
+    """Stream all values of one ``dfise.Block`` through ``QualityStats``."""
+    stats = QualityStats(block.count)
+    for chunk in dat.chunks(block, chunk_bytes):
+        stats.update(chunk)
+    return stats
+
+
+def check_file(path, name='ElectrostaticPotential', regions=None, cache=False):
+    """Return ``[(block, stats), ...]`` for every ``name`` dataset in ``path``.
+
+    With ``cache=True`` the values come from the binary field-map cache
+    (``field_cache.load_dat``) and the returned items are ``Dataset`` tuples.
+    """
+    results = []
+    if cache:
+        for ds in field_cache.load_dat(path, names={name}, regions=regions):
+            stats = QualityStats(ds.count)
+            flat = ds.values.reshape(-1)
+            for start in range(0, flat.size, CHUNK_VALUES):
+                stats.update(flat[start:start + CHUNK_VALUES])
+            results.append((ds, stats))
+        return results
+    with DatFile(path) as dat:
+        for block in dat.blocks():
+            if block.name != name or (regions is not None and block.validity not in regions):
+                continue
+            results.append((block, check_block(dat, block)))
+    return results
+
+
+def _expand(args):
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths.extend(sorted(glob.glob(os.path.join(arg, '*_des.dat'))))
+        else:
+            paths.append(arg)
+    return paths
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else list(argv)
+    cache = '--cache' in args
+    paths = _expand([a for a in args if a != '--cache'])
+    if not paths:
+        print(__doc__)
+        return 1
+    print(f"{'file':<28} {'region':<18} {'values':>9} {'mean':>10} {'std':>10} "
+          f"{'noise%':>7} {'mid%':>6} {'~1%':>6} {'neg%':>6}  verdict")
+    start = time.perf_counter()
+    for path in paths:
+        for block, stats in check_file(path, cache=cache):
+            print(f"{os.path.basename(path):<28} {block.validity:<18} {stats.n:>9,} "
+                  f"{stats.mean:>10.4g} {stats.std:>10.4g} "
+                  f"{100 * stats.fraction(stats.noise):>7.1f} {100 * stats.fraction(stats.mid):>6.1f} "
+                  f"{100 * stats.fraction(stats.near_one):>6.1f} {100 * stats.fraction(stats.negative):>6.1f}  "
+                  f"{stats.verdict()}")
+    print(f"\nChecked {len(paths)} file(s) in {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""Vectorized weighting potential queries on the TCAD mesh, without Garfield.
+
+The .grd mesh is read once (``dfise.read_grid``, cached by field_cache) and
+its tetrahedra are binned on a uniform grid of cells; a batch of points is
+located by testing the tetrahedra of each point's cell, all points at once.
+Values are interpolated linearly within the tetrahedron (barycentric
+weights), as ComponentTcad3d does, so the gradient is constant per element.
+A located batch can be reused for every time slice of the same mesh.
+Datasets of a field map staged by fieldmap_bundle.py are mapped from its
+bundle instead of being parsed.
+
+Like ``SetWeightingField(gnd.dat, wp.dat, ...)`` the potential is the
+difference to ``--reference`` when one is given. Coordinates are μm as in
+the .grd file (Garfield takes cm), gradients are 1/μm; points outside the
+mesh or in regions without the dataset give NaN.
+
+Usage:
+    python wp_query.py points nominal.grd 1e-3/1e-3_000010_des.dat --reference gnd.dat
+    python wp_query.py profile nominal.grd 1e-3/1e-3_000010_des.dat --from 0 0 0 --to 0 0 500 -o profile.csv
+    python wp_query.py map nominal.grd 1e-3/1e-3_000010_des.dat --plane y=0 -o map.png
+    python wp_query.py qa nominal.grd 1e-3/*_des.dat --reference gnd.dat -o qa.json
+
+    from wp_query import Mesh
+    mesh = Mesh.load('nominal.grd')
+    wp = mesh.field('1e-3/1e-3_000010_des.dat', reference='gnd.dat')
+    phi, grad = wp.evaluate(points)      # points: (n, 3) μm
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from dfise import iter_datasets, read_grid
+
+# Points of test_static_weighting.cpp, in μm
+DEFAULT_POINTS = [(0.0, 0.0, 0.0), (0.0, 0.0, 50.0), (0.0, 0.0, -50.0), (10.0, 0.0, 0.0), (0.0, 10.0, 0.0)]
+CHUNK_POINTS = 1 << 18
+# Barycentric slack so points on a shared face are found in either element
+INSIDE_EPS = 1e-9
+
+
+class Mesh:
+    """Tetrahedra of a DF-ISE grid with a uniform-cell spatial index."""
+
+    def __init__(self, grid, tets_per_cell=2.0):
+        self.grid = grid
+        self.vertices = np.asarray(grid.vertices, dtype=np.float64)
+        self.tets = np.asarray(grid.tets, dtype=np.int64)
+        self.tet_region = np.asarray(grid.tet_region)
+        corners = self.vertices[self.tets]
+        self._origin = corners[:, 0]
+        # p - p0 = M @ (l1, l2, l3) with the edge vectors as columns of M
+        edges = np.transpose(corners[:, 1:] - corners[:, :1], (0, 2, 1))
+        self._inverse = np.full_like(edges, np.nan)
+        scale = np.abs(edges).max(axis=(1, 2))
+        ok = np.abs(np.linalg.det(edges)) > 1e-12 * scale ** 3
+        self._inverse[ok] = np.linalg.inv(edges[ok])
+        self._build_index(corners, tets_per_cell)
+
+    @classmethod
+    def load(cls, path, cache=True, **kwargs):
+        """Mesh of a .grd file; ``cache`` keeps the parsed grid in field_cache."""
+        if cache:
+            from field_cache import load_grid
+            return cls(load_grid(path), **kwargs)
+        return cls(read_grid(path), **kwargs)
+
+    def _build_index(self, corners, tets_per_cell):
+        lo, hi = self.vertices.min(axis=0), self.vertices.max(axis=0)
+        extent = np.maximum(hi - lo, 1e-12)
+        cells = max(1.0, len(self.tets) / tets_per_cell)
+        step = (np.prod(extent) / cells) ** (1 / 3)
+        self._dims = np.maximum(1, np.ceil(extent / step)).astype(np.int64)
+        self._lo, self._cell = lo, extent / self._dims
+        first = self._cell_coords(corners.min(axis=1))
+        last = self._cell_coords(corners.max(axis=1))
+        span = last - first + 1
+        counts = span.prod(axis=1)
+        # Expand every tetrahedron to all cells its bounding box touches
+        owner = np.repeat(np.arange(len(self.tets)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        sx, sy = span[owner, 0], span[owner, 1]
+        ix = first[owner, 0] + local % sx
+        iy = first[owner, 1] + local // sx % sy
+        iz = first[owner, 2] + local // (sx * sy)
+        cell = (iz * self._dims[1] + iy) * self._dims[0] + ix
+        order = np.argsort(cell, kind='stable')
+        self._cell_tets = owner[order]
+        self._cell_count = np.bincount(cell, minlength=int(self._dims.prod()))
+        self._cell_start = np.cumsum(self._cell_count) - self._cell_count
+
+    def _cell_coords(self, points):
+        return np.clip(np.floor((points - self._lo) / self._cell).astype(np.int64), 0, self._dims - 1)
+
+    def _barycentric(self, tets, points):
+        """Weights of vertices 1-3 of ``tets`` at ``points`` (vertex 0 gets 1 - their sum)."""
+        return np.einsum('nij,nj->ni', self._inverse[tets], points - self._origin[tets])
+
+    def locate(self, points):
+        """``(element, weights)``: containing tetrahedron (-1 if none) and barycentric weights."""
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        element = np.full(len(points), -1, dtype=np.int64)
+        weights = np.zeros((len(points), 4))
+        for begin in range(0, len(points), CHUNK_POINTS):
+            chunk = points[begin:begin + CHUNK_POINTS]
+            inside_box = np.all((chunk >= self._lo) & (chunk <= self._lo + self._cell * self._dims), axis=1)
+            coords = self._cell_coords(chunk)
+            cell = (coords[:, 2] * self._dims[1] + coords[:, 1]) * self._dims[0] + coords[:, 0]
+            start, count = self._cell_start[cell], np.where(inside_box, self._cell_count[cell], 0)
+            pending = np.flatnonzero(count > 0)
+            k = 0
+            while pending.size:
+                candidates = self._cell_tets[start[pending] + k]
+                inner = self._barycentric(candidates, chunk[pending])
+                rest = 1.0 - inner.sum(axis=1)
+                found = (rest >= -INSIDE_EPS) & np.all(inner >= -INSIDE_EPS, axis=1)
+                element[begin + pending[found]] = candidates[found]
+                weights[begin + pending[found], 0] = rest[found]
+                weights[begin + pending[found], 1:] = inner[found]
+                k += 1
+                pending = pending[~found & (count[pending] > k)]
+        return element, weights
+
+    def region_vertices(self, region):
+        """Sorted global vertex indices of a region: the order of its DF-ISE values."""
+        index = self.grid.regions.index(region)
+        tets = self.tets[self.tet_region == index]
+        if len(tets):
+            return np.unique(tets)
+        return np.unique(np.asarray(self.grid.triangles)[np.asarray(self.grid.triangle_region) == index])
+
+    def field(self, dat, name='ElectrostaticPotential', reference=None, cache=True):
+        """``Field`` of dataset ``name`` of ``dat`` (minus that of ``reference``)."""
+        values = _region_values(dat, name, cache)
+        if reference is not None:
+            ref = _region_values(reference, name, cache)
+            values = {region: v - ref[region] for region, v in values.items() if region in ref}
+        tet_values = np.full(self.tets.shape, np.nan)
+        for region, v in values.items():
+            if region not in self.grid.regions:
+                continue
+            index = self.grid.regions.index(region)
+            mask = self.tet_region == index
+            if not mask.any():
+                continue
+            vertices = self.region_vertices(region)
+            if len(v) != len(vertices):
+                raise ValueError(f'{dat}: {name} ({region}) has {len(v)} values for {len(vertices)} vertices')
+            tet_values[mask] = v[np.searchsorted(vertices, self.tets[mask])]
+        return Field(self, tet_values)
+
+    def region_bounds(self, region):
+        """``(lo, hi)`` corners of the bounding box of a region."""
+        vertices = self.vertices[self.region_vertices(region)]
+        return vertices.min(axis=0), vertices.max(axis=0)
+
+
+def _region_values(path, name, cache):
+    if cache:
+        # A staged field map (fieldmap_bundle.py) is read from its mmap bundle
+        from fieldmap_bundle import region_values
+        values = region_values(path, name)
+        if values is not None:
+            return values
+        from field_cache import load_dat
+        datasets = load_dat(path, names={name})
+    else:
+        datasets = iter_datasets(path, names={name})
+    return {ds.validity: np.asarray(ds.values, dtype=np.float64) for ds in datasets if ds.dimension == 1}
+
+
+class Field:
+    """A scalar vertex dataset interpolated linearly on the mesh."""
+
+    def __init__(self, mesh, tet_values):
+        self.mesh = mesh
+        self.tet_values = tet_values
+        delta = tet_values[:, 1:] - tet_values[:, :1]
+        # grad phi = M^-T (phi_i - phi_0): constant within each tetrahedron
+        self.tet_gradient = np.einsum('nji,nj->ni', mesh._inverse, delta)
+
+    def at(self, element, weights):
+        """``(phi, grad)`` at points already located with ``Mesh.locate``."""
+        found = element >= 0
+        phi = np.full(len(element), np.nan)
+        grad = np.full((len(element), 3), np.nan)
+        phi[found] = np.einsum('ni,ni->n', self.tet_values[element[found]], weights[found])
+        grad[found] = self.tet_gradient[element[found]]
+        return phi, grad
+
+    def evaluate(self, points):
+        """``(phi, grad)`` at ``points`` (n, 3) in μm."""
+        return self.at(*self.mesh.locate(points))
+
+
+# ---- QA helpers ------------------------------------------------------------
+
+def line(start, stop, n):
+    """``n`` points from ``start`` to ``stop`` and their distance along the line."""
+    start, stop = np.asarray(start, dtype=np.float64), np.asarray(stop, dtype=np.float64)
+    s = np.linspace(0.0, 1.0, n)
+    return start + s[:, None] * (stop - start), s * np.linalg.norm(stop - start)
+
+
+def plane(mesh, spec, n, bounds=None):
+    """Points of an ``n`` x ``n`` map on the plane ``spec`` ('y=0', 'z=250', ...).
+
+    Returns ``(points, u, v, axes)`` with ``u``/``v`` the coordinates along
+    the two in-plane axes; ``bounds`` defaults to the mesh extent.
+    """
+    axis, value = spec.split('=')
+    fixed = 'xyz'.index(axis.strip())
+    free = [i for i in range(3) if i != fixed]
+    lo, hi = bounds or (mesh.vertices.min(axis=0), mesh.vertices.max(axis=0))
+    u = np.linspace(lo[free[0]], hi[free[0]], n)
+    v = np.linspace(lo[free[1]], hi[free[1]], n)
+    uu, vv = np.meshgrid(u, v, indexing='ij')
+    points = np.empty((n * n, 3))
+    points[:, fixed] = float(value)
+    points[:, free[0]], points[:, free[1]] = uu.ravel(), vv.ravel()
+    return points, u, v, ['xyz'[i] for i in free]
+
+
+def columns(mesh, material='Graphite'):
+    """``[(region, x, y, zmin, zmax)]`` of the electrode columns (regions of ``material``)."""
+    found = []
+    for region, mat in zip(mesh.grid.regions, mesh.grid.materials):
+        if mat == material and (mesh.tet_region == mesh.grid.regions.index(region)).any():
+            lo, hi = mesh.region_bounds(region)
+            found.append((region, (lo[0] + hi[0]) / 2, (lo[1] + hi[1]) / 2, lo[2], hi[2]))
+    return found
+
+
+def zero_gradient(grad, relative=1e-3):
+    """Mask of points whose |grad| is below ``relative`` x the median |grad| (NaN excluded)."""
+    magnitude = np.linalg.norm(grad, axis=1)
+    valid = np.isfinite(magnitude)
+    median = np.median(magnitude[valid]) if valid.any() else 0.0
+    return valid & (magnitude <= relative * median)
+
+
+def qa(mesh, dat_paths, reference=None, region='BULK', n=48, relative=1e-3, profile_points=200):
+    """Per-file QA of a weighting potential over the volume of ``region``.
+
+    A regular ``n``^3 grid over the region's bounding box is located once
+    and reused for every file. Returns one dict per file: potential range,
+    fraction of points with a vanishing gradient and the potential along
+    the axis of each electrode column.
+    """
+    lo, hi = mesh.region_bounds(region)
+    axes = [np.linspace(lo[i], hi[i], n) for i in range(3)]
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+    element, weights = mesh.locate(grid)
+    index = mesh.grid.regions.index(region)
+    in_region = (element >= 0) & (mesh.tet_region[np.maximum(element, 0)] == index)
+    profiles = []
+    for name, x, y, _, _ in columns(mesh):
+        points, s = line((x, y, lo[2]), (x, y, hi[2]), profile_points)
+        profiles.append((name, s + lo[2], mesh.locate(points)))
+
+    results = []
+    for path in dat_paths:
+        start = time.perf_counter()
+        field = mesh.field(path, reference=reference)
+        phi, grad = field.at(element[in_region], weights[in_region])
+        valid = np.isfinite(phi)
+        zero = zero_gradient(grad, relative)
+        result = {'file': path, 'points': int(in_region.sum()), 'valid': int(valid.sum()),
+                  'phi_min': float(np.nanmin(phi)) if valid.any() else None,
+                  'phi_max': float(np.nanmax(phi)) if valid.any() else None,
+                  'zero_gradient_fraction': float(zero.sum() / max(1, valid.sum())),
+                  'columns': {}}
+        if zero.any():
+            points = grid[in_region][zero]
+            result['zero_gradient_box'] = [points.min(axis=0).tolist(), points.max(axis=0).tolist()]
+        for name, z, located in profiles:
+            column_phi, _ = field.at(*located)
+            result['columns'][name] = {'z': z.tolist(), 'phi': np.where(np.isfinite(column_phi),
+                                                                       column_phi, None).tolist()}
+        result['seconds'] = time.perf_counter() - start
+        results.append(result)
+    return results
+
+
+def _write_table(path, header, columns_):
+    np.savetxt(path, np.column_stack(columns_), header=' '.join(header), comments='', delimiter=',', fmt='%.9g')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query TCAD weighting potentials on the .grd mesh')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def common(p, many=False):
+        p.add_argument('grd')
+        p.add_argument('dat', nargs='+' if many else None)
+        p.add_argument('--reference', help='subtract this file (e.g. gnd.dat), like SetWeightingField')
+        p.add_argument('--dataset', default='ElectrostaticPotential')
+        p.add_argument('--no-cache', action='store_true', help='parse the files instead of using field_cache or a staged bundle')
+
+    pts = sub.add_parser('points', help='potential and gradient at given points')
+    common(pts)
+    pts.add_argument('-p', '--point', nargs=3, type=float, action='append', metavar=('X', 'Y', 'Z'),
+                     help='point in μm (repeatable; default: the points of test_static_weighting)')
+    prof = sub.add_parser('profile', help='potential along a line')
+    common(prof)
+    prof.add_argument('--from', dest='start', nargs=3, type=float, required=True)
+    prof.add_argument('--to', dest='stop', nargs=3, type=float, required=True)
+    prof.add_argument('-n', type=int, default=500)
+    prof.add_argument('-o', '--out', help='.csv output (default: print)')
+    mp = sub.add_parser('map', help='potential on a plane')
+    common(mp)
+    mp.add_argument('--plane', default='y=0', help="'x=..', 'y=..' or 'z=..' in μm")
+    mp.add_argument('-n', type=int, default=400)
+    mp.add_argument('-o', '--out', required=True, help='.png image or .npz arrays')
+    q = sub.add_parser('qa', help='volume QA of every file: range, zero gradient, column profiles')
+    common(q, many=True)
+    q.add_argument('--region', default='BULK')
+    q.add_argument('-n', type=int, default=48, help='sample points per axis')
+    q.add_argument('--relative', type=float, default=1e-3,
+                   help='|grad| below this fraction of the median counts as zero')
+    q.add_argument('-o', '--out', help='write the full report (with column profiles) as JSON')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    mesh = Mesh.load(args.grd, cache=not args.no_cache)
+    print(f"Mesh: {len(mesh.vertices)} vertices, {len(mesh.tets)} tetrahedra "
+          f"({time.perf_counter() - start:.1f} s)")
+
+    if args.command == 'qa':
+        results = qa(mesh, args.dat, args.reference, args.region, args.n, args.relative)
+        for r in results:
+            mark = '✓' if r['valid'] and r['zero_gradient_fraction'] < 0.01 else '⚠️ '
+            phi = f"phi [{r['phi_min']:.4g}, {r['phi_max']:.4g}]" if r['valid'] else 'no values'
+            print(f"  {mark} {os.path.basename(r['file'])}: {phi}, "
+                  f"zero gradient {100 * r['zero_gradient_fraction']:.1f}% of {r['valid']} points "
+                  f"({r['seconds']:.2f} s)")
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(results, f, indent=1)
+            print(f"Report written to {args.out}")
+        return 0 if all(r['valid'] for r in results) else 1
+
+    field = mesh.field(args.dat, args.dataset, args.reference, cache=not args.no_cache)
+    if args.command == 'points':
+        points = np.array(args.point or DEFAULT_POINTS)
+        phi, grad = field.evaluate(points)
+        for p, value, g in zip(points, phi, grad):
+            print(f"  ({p[0]:g}, {p[1]:g}, {p[2]:g}) μm: phi = {value:.6g}, "
+                  f"grad = ({g[0]:.4g}, {g[1]:.4g}, {g[2]:.4g}) /μm")
+    elif args.command == 'profile':
+        points, s = line(args.start, args.stop, args.n)
+        phi, grad = field.evaluate(points)
+        columns_ = [s, points[:, 0], points[:, 1], points[:, 2], phi, grad[:, 0], grad[:, 1], grad[:, 2]]
+        header = ['s', 'x', 'y', 'z', 'phi', 'dphi_dx', 'dphi_dy', 'dphi_dz']
+        if args.out:
+            _write_table(args.out, header, columns_)
+            print(f"Profile written to {args.out}")
+        else:
+            _write_table(sys.stdout, header, columns_)
+    elif args.command == 'map':
+        points, u, v, axes = plane(mesh, args.plane, args.n)
+        start = time.perf_counter()
+        phi, _ = field.evaluate(points)
+        phi = phi.reshape(len(u), len(v))
+        print(f"  {len(points)} points in {time.perf_counter() - start:.2f} s")
+        if args.out.endswith('.npz'):
+            np.savez_compressed(args.out, **{axes[0]: u, axes[1]: v, 'phi': phi})
+        else:
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            fig, ax = plt.subplots(figsize=(6, 6))
+            image = ax.pcolormesh(u, v, phi.T, shading='auto')
+            fig.colorbar(image, ax=ax, label=args.dataset)
+            ax.set_xlabel(f'{axes[0]} [μm]')
+            ax.set_ylabel(f'{axes[1]} [μm]')
+            ax.set_title(f'{os.path.basename(args.dat)} at {args.plane} μm')
+            fig.savefig(args.out, dpi=150, bbox_inches='tight')
+        print(f"Map written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())